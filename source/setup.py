@@ -7,12 +7,12 @@ from setuptools.command.install import install
 
 setup(
 	name='todocli',
-	version='5.0.0',
+	version='5.1.0',
 	python_requires='>=3.8',
 	packages=['todo', 'todo.bash_completion'],
 	entry_points={
 		'console_scripts': [
-			'todo = todo.todo:main'
+			'todo = todo.client:main'
 		]
 	},
 	include_package_data=True,
@@ -0,0 +1,15 @@
+""" Benchmarks, ran with `./test.py --bench`. Each benchmark module defines a
+`run()` function printing its measurements. """
+
+import time
+
+
+def measure(label, function, *args, repeat=1):
+	""" Call `function` with `args` `repeat` times and print the average
+	duration of a call. Return the result of the last call. """
+	start = time.perf_counter()
+	for _ in range(repeat):
+		result = function(*args)
+	duration = (time.perf_counter() - start) / repeat
+	print('  {:<50} {:>10.3f} ms'.format(label, duration * 1000))
+	return result
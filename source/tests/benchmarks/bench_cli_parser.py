@@ -0,0 +1,40 @@
+""" Parsing a command line as a new process does, building the parser of its
+subcommand only, against building the whole tree of parsers, and as the
+daemon does, with the parsers built for previous commands. """
+
+from todo import cli_parser
+from . import measure
+
+
+REPEAT = 200
+
+ARGV = ['add', 'Task', '-c', 'work.project', '-d', '2w', '-p', '3']
+
+
+def parse_with_full_tree(argv):
+	return vars(cli_parser._make_full_parser().parse_args(argv))
+
+
+def parse_uncached(argv):
+	cli_parser._get_command_parser.cache_clear()
+	cli_parser._get_root_parser.cache_clear()
+	return cli_parser.parse_cli(argv)
+
+
+def run():
+	measure(
+		'Whole tree of parsers',
+		parse_with_full_tree, ARGV, repeat=REPEAT,
+	)
+	measure(
+		'Parser of the subcommand only',
+		parse_uncached, ARGV, repeat=REPEAT,
+	)
+	measure(
+		'Parser of the subcommand, cached',
+		cli_parser.parse_cli, ARGV, repeat=REPEAT,
+	)
+
+
+if __name__ == '__main__':
+	run()
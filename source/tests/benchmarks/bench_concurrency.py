@@ -0,0 +1,68 @@
+""" Throughput of CLI processes hitting the same database concurrently, in
+each journal mode (selected by a .toduhrc in a temporary home directory), and
+number of commands failing because the database was locked. """
+
+import os, subprocess, sys, tempfile
+import os.path as op
+from concurrent.futures import ThreadPoolExecutor
+
+from . import measure
+
+
+PROCESSES = 8
+COMMANDS_PER_PROCESS = 10
+
+TODO = op.abspath('todo.py')
+
+
+def run_cli(home, *args):
+	env = dict(os.environ, HOME=home)
+	result = subprocess.run(
+		[sys.executable, TODO] + list(args),
+		env=env,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.PIPE,
+		universal_newlines=True,
+	)
+	return result.returncode == 0 and result.stderr == ''
+
+
+def worker(home, number):
+	""" Alternate writes and listings, as scripts and interactive use do.
+	Return the number of failed commands."""
+	failures = 0
+	for i in range(COMMANDS_PER_PROCESS):
+		if i % 2 == 0:
+			ok = run_cli(home, 'add', 'Task {}-{}'.format(number, i))
+		else:
+			ok = run_cli(home)
+		failures += not ok
+	return failures
+
+
+def run_concurrently(home):
+	with ThreadPoolExecutor(PROCESSES) as executor:
+		return sum(executor.map(
+			worker, [home] * PROCESSES, range(PROCESSES)
+		))
+
+
+def run():
+	for journal_mode in ['delete', 'wal']:
+		with tempfile.TemporaryDirectory() as home:
+			with open(op.join(home, '.toduhrc'), 'w') as config:
+				config.write(
+					'[Storage]\njournal_mode = {}\n'.format(journal_mode)
+				)
+			run_cli(home, 'add', 'Setup')
+			failures = measure(
+				'{} processes x {} commands, {} mode'.format(
+					PROCESSES, COMMANDS_PER_PROCESS, journal_mode
+				),
+				run_concurrently, home,
+			)
+			print('  {:<50} {:>10}'.format('failed commands', failures))
+
+
+if __name__ == '__main__':
+	run()
@@ -0,0 +1,63 @@
+""" Adding tasks in bulk into deep contexts, which are looked up in the cache
+of context IDs once created, and saving a new context into the contexts file
+of many contexts. """
+
+import tempfile
+from itertools import count
+
+from ..test_data_access import get_memory_data_access
+from . import measure
+
+
+TASKS = 1000
+DEPTH = 8
+CONTEXTS = 10000
+
+
+def add_tasks(daccess, paths):
+	for path in paths:
+		daccess.add_task('Task', None, context=path)
+
+
+def save_new_context(daccess, names):
+	daccess.get_or_create_context('.{}'.format(next(names)))
+	daccess.save()
+
+
+def run():
+	deep = ''.join('.level{}'.format(i) for i in range(DEPTH))
+	daccess = get_memory_data_access()
+	measure(
+		'{} tasks into the same context of depth {}'.format(TASKS, DEPTH),
+		add_tasks, daccess, [deep] * TASKS,
+	)
+	measure(
+		'{} tasks into new contexts of depth {}'.format(TASKS, DEPTH + 1),
+		add_tasks, daccess,
+		['{}.new{}'.format(deep, i) for i in range(TASKS)],
+	)
+	daccess.context_ids.clear()
+	measure(
+		'{} tasks into uncached contexts of depth {}'.format(TASKS, DEPTH + 1),
+		add_tasks, daccess,
+		['{}.new{}'.format(deep, i) for i in range(TASKS)],
+	)
+
+	daccess = get_memory_data_access()
+	for i in range(CONTEXTS):
+		daccess.get_or_create_context('.project{}'.format(i))
+	with tempfile.TemporaryDirectory() as directory:
+		daccess.data_dir = directory
+		measure(
+			'Contexts file of {} contexts'.format(CONTEXTS),
+			daccess.save,
+		)
+		measure(
+			'Saving a new context among {}'.format(CONTEXTS),
+			save_new_context, daccess, ('saved{}'.format(i) for i in count()),
+			repeat=100,
+		)
+
+
+if __name__ == '__main__':
+	run()
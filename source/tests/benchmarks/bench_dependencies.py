@@ -0,0 +1,86 @@
+""" Setting dependencies and checking them for cycles in a dependency graph of
+tens of thousands of edges, and listing the dependencies of a task along a
+long chain of dependencies. """
+
+import random
+
+from ..test_data_access import get_memory_data_access
+from . import measure
+
+
+TASKS = 10000
+EDGES = 30000
+CHAIN_LENGTH = 10000
+
+
+def get_graph_data_access():
+	""" Return an in-memory data access whose tasks form a random acyclic
+	dependency graph: each task depends on tasks of lesser ID."""
+	daccess = get_memory_data_access()
+	rand = random.Random(0)
+	daccess.connection.executemany(
+		"INSERT INTO Task (title, context) VALUES (?, 1)",
+		[('Task {}'.format(i),) for i in range(TASKS)],
+	)
+	edges = set()
+	while len(edges) < EDGES:
+		task_id = rand.randrange(2, TASKS + 1)
+		edges.add((task_id, rand.randrange(1, task_id)))
+	daccess.connection.executemany("""
+		INSERT INTO TaskDependency (task_id, dependency_id) VALUES (?, ?)
+	""", sorted(edges))
+	return daccess
+
+
+def get_chain_data_access():
+	""" Return an in-memory data access whose tasks form a single chain: each
+	task depends on the previous one."""
+	daccess = get_memory_data_access()
+	daccess.connection.executemany(
+		"INSERT INTO Task (title, context) VALUES (?, 1)",
+		[('Task {}'.format(i),) for i in range(CHAIN_LENGTH)],
+	)
+	daccess.connection.executemany("""
+		INSERT INTO TaskDependency (task_id, dependency_id) VALUES (?, ?)
+	""", [(i + 1, i) for i in range(1, CHAIN_LENGTH)])
+	return daccess
+
+
+def run():
+	daccess = get_graph_data_access()
+	# The first task is depended on by most of the graph
+	cycle = measure(
+		'cycle check reaching the whole graph',
+		daccess.find_dependency_cycle, 1, [TASKS],
+	)
+	assert cycle is not None and cycle[0] == cycle[-1] == 1
+	assert measure(
+		'cycle check of the last task',
+		daccess.find_dependency_cycle, TASKS, [1], repeat=100,
+	) is None
+	dependencies = list(range(1, 1001)) + [TASKS + 1]
+	unexisting = measure(
+		'setting 1000 dependencies', daccess.set_task_dependencies,
+		TASKS, dependencies, repeat=10,
+	)
+	assert unexisting == [TASKS + 1]
+
+	daccess = get_chain_data_access()
+	chain = measure(
+		'upstream of the end of a {} chain'.format(CHAIN_LENGTH),
+		daccess.get_dependency_chain, CHAIN_LENGTH,
+	)
+	assert len(chain) == CHAIN_LENGTH - 1
+	chain = measure(
+		'downstream of the start of a {} chain'.format(CHAIN_LENGTH),
+		daccess.get_dependency_chain, 1, True,
+	)
+	assert chain[-1]['depth'] == CHAIN_LENGTH - 1
+	measure(
+		'upstream of the end of the chain, depth 10',
+		daccess.get_dependency_chain, CHAIN_LENGTH, False, 10,
+	)
+
+
+if __name__ == '__main__':
+	run()
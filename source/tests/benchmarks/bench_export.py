@@ -0,0 +1,57 @@
+""" Exporting 100k tasks, with dependencies and done histories, to a file in
+each format of `todo export`, and the peak memory allocated by the export,
+which doesn't grow with the number of tasks. """
+
+import io, os, random, sqlite3, tempfile, tracemalloc
+
+from todo import transfer
+from todo.data_access import DataAccess
+
+from . import measure
+from .bench_import import create_database, get_jsonl
+
+
+TASKS = 100000
+
+
+def export_file(daccess, file_format, count):
+	with open(os.devnull, 'w') as file:
+		transfer.WRITERS[file_format](
+			(record for _, record in zip(range(count), daccess.export_tasks())),
+			file,
+		)
+
+
+def get_peak_memory(daccess, count):
+	tracemalloc.start()
+	try:
+		export_file(daccess, 'jsonl', count)
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+
+def run():
+	text = get_jsonl(random.Random(0))
+	with tempfile.TemporaryDirectory() as directory:
+		connection = sqlite3.connect(
+			create_database(directory, 'export.sqlite')
+		)
+		daccess = DataAccess(connection)
+		daccess.import_tasks(transfer.read_jsonl(io.StringIO(text)))
+		connection.commit()
+		for file_format in sorted(transfer.WRITERS):
+			measure(
+				'{} tasks to {}'.format(TASKS, file_format),
+				export_file, daccess, file_format, TASKS,
+			)
+		for count in [TASKS // 100, TASKS]:
+			print('  {:<50} {:>10.1f} kB'.format(
+				'Peak memory for {} tasks'.format(count),
+				get_peak_memory(daccess, count) / 1000,
+			))
+		connection.close()
+
+
+if __name__ == '__main__':
+	run()
@@ -0,0 +1,88 @@
+""" Importing 100k tasks from a JSONL file into a database file, with
+contexts and dependencies, as `todo import` does, compared to adding them one
+at a time. """
+
+import io, json, random, sqlite3, tempfile
+import os.path as op
+
+from todo import init_db, transfer
+from todo.data_access import DataAccess, dbfy_context
+
+from . import measure
+
+
+TASKS = 100000
+CONTEXTS = 200
+
+
+def get_jsonl(rand):
+	lines = []
+	for i in range(TASKS):
+		record = {
+			'id': i,
+			'title': 'Task {}'.format(i),
+			'context': 'project{}.part{}'.format(
+				rand.randrange(CONTEXTS), rand.randrange(5)
+			),
+			'created': '2024-01-01T10:00:00Z',
+			'priority': rand.randrange(1, 4),
+		}
+		if i > 0 and rand.random() < 0.3:
+			record['depends_on'] = [rand.randrange(i)]
+		if rand.random() < 0.5:
+			record['done'] = True
+		lines.append(json.dumps(record))
+	return '\n'.join(lines) + '\n'
+
+
+def import_file(path, text):
+	connection = sqlite3.connect(path)
+	daccess = DataAccess(connection)
+	report = daccess.import_tasks(transfer.read_jsonl(io.StringIO(text)))
+	connection.commit()
+	connection.close()
+	return report
+
+
+def add_one_at_a_time(path, text, count):
+	""" Add the first `count` tasks with `add_task`, as `todo add` does (within
+	a single process and transaction, which spares it much of the cost of
+	`todo add`)."""
+	connection = sqlite3.connect(path)
+	daccess = DataAccess(connection)
+	records = transfer.read_jsonl(io.StringIO(text))
+	for _, record in zip(range(count), records):
+		daccess.add_task(
+			record['title'], None, dbfy_context(record['context']),
+			[('priority', record['priority'])],
+		)
+	connection.commit()
+	connection.close()
+
+
+def create_database(directory, name):
+	path = op.join(directory, name)
+	connection = sqlite3.connect(path, isolation_level=None)
+	for stmt in init_db.INIT_DB:
+		connection.execute(stmt)
+	connection.close()
+	return path
+
+
+def run():
+	text = get_jsonl(random.Random(0))
+	with tempfile.TemporaryDirectory() as directory:
+		report = measure(
+			'{} tasks from JSONL'.format(TASKS),
+			import_file, create_database(directory, 'import.sqlite'), text,
+		)
+		assert report['count'] == TASKS and report['cycle'] is None
+		measure(
+			'{} tasks one at a time'.format(TASKS // 10),
+			add_one_at_a_time, create_database(directory, 'add.sqlite'), text,
+			TASKS // 10,
+		)
+
+
+if __name__ == '__main__':
+	run()
@@ -0,0 +1,55 @@
+""" Migrating a v2 JSON datafile of 100k tasks to a database, as the first
+command after upgrading from todo 2.x does. """
+
+import json, random, tempfile
+import os.path as op
+
+from todo.data_access import open_database
+
+from . import measure
+
+
+TASKS = 100000
+CONTEXTS = 200
+
+
+def get_datafile(rand):
+	return {
+		'contexts': {
+			'project{}'.format(i): {'p': rand.randrange(1, 4)}
+			for i in range(0, CONTEXTS, 10)
+		},
+		'tasks': [
+			{
+				'content': 'Task {}'.format(i),
+				'context': 'project{}.part{}'.format(
+					rand.randrange(CONTEXTS), rand.randrange(5)
+				),
+				'created': '2016-01-01T10:00:00',
+				'priority': rand.randrange(1, 4),
+				'done': rand.random() < 0.5,
+			}
+			for i in range(TASKS)
+		],
+	}
+
+
+def run():
+	with tempfile.TemporaryDirectory() as directory:
+		json_path = op.join(directory, 'data.json')
+		with open(json_path, 'w') as datafile:
+			json.dump(get_datafile(random.Random(0)), datafile)
+		connection = measure(
+			'{} tasks from a v2 datafile'.format(TASKS),
+			open_database, directory,
+		)
+		connection.close()
+		connection = measure(
+			'Opening the migrated database', open_database, directory,
+			repeat=100,
+		)
+		connection.close()
+
+
+if __name__ == '__main__':
+	run()
@@ -0,0 +1,59 @@
+""" Moving a subtree of 1000 contexts with `todo mv`, to a new destination
+and back onto the existing one, and renaming it with `todo ctx --name`. """
+
+from ..test_data_access import get_memory_data_access
+from . import measure
+
+
+BRANCHING = 10
+DEPTH = 3
+TASKS_PER_CONTEXT = 5
+
+
+def get_subtree_data_access():
+	""" Return an in-memory data access with a `.project` context having
+	`BRANCHING` subcontexts on each of `DEPTH` levels (1110 contexts in
+	total), each holding tasks."""
+	daccess = get_memory_data_access()
+	paths = ['.project']
+	level = ['.project']
+	for _ in range(DEPTH):
+		level = [
+			'{}.c{}'.format(path, i) for path in level for i in range(BRANCHING)
+		]
+		paths.extend(level)
+	for path in paths:
+		for i in range(TASKS_PER_CONTEXT):
+			daccess.add_task('Task {}'.format(i), None, context=path)
+	return daccess, len(paths)
+
+
+def move_all_per_context(daccess, ctx1, ctx2):
+	""" The former implementation, moving the tasks of each context of the
+	subtree one context at a time. """
+	for ctx in list(daccess.get_descendants(ctx1)):
+		daccess.move(ctx['path'], ctx2 + ctx['path'][len(ctx1):])
+
+
+def run():
+	daccess, count = get_subtree_data_access()
+	label = 'subtree of {} contexts'.format(count)
+	measure(label + ' to a new context', daccess.move_all, '.project', '.new')
+	measure(
+		label + ' to an existing context',
+		daccess.move_all, '.new', '.project',
+	)
+
+	daccess, _ = get_subtree_data_access()
+	measure(
+		label + ' to a new context (per context)',
+		move_all_per_context, daccess, '.project', '.new',
+	)
+
+	measure(
+		'renaming a ' + label, daccess.rename_context, '.project', 'renamed',
+	)
+
+
+if __name__ == '__main__':
+	run()
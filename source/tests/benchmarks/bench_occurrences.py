@@ -0,0 +1,55 @@
+import random
+from datetime import datetime, timedelta
+
+from todo.core import get_occurrences
+
+from . import measure
+
+
+NOW = datetime(2025, 11, 20, 12, 0, 30)
+
+# (label, start, period) covering extreme start/period ratios
+EXTREMES = [
+	('1s period started 10 years ago', NOW - timedelta(days=3653), 1),
+	('1m period started 2 years ago', NOW - timedelta(days=730), 60),
+	('1y period started yesterday', NOW - timedelta(days=1), 365*24*3600),
+	('1d period starting next year', NOW + timedelta(days=365), 24*3600),
+	('6m period started 0001-01-01', datetime(1, 1, 1), 6*30.5*24*3600),
+]
+
+
+def iterate_occurrences(start, period, now):
+	""" The former implementation, stepping from the start one period at a
+	time. """
+	next_occurrence = start
+	while next_occurrence <= now:
+		next_occurrence += timedelta(seconds=period)
+	return next_occurrence - timedelta(seconds=period), next_occurrence
+
+
+def run():
+	for label, start, period in EXTREMES:
+		last, next_ = measure(
+			label, get_occurrences, [(start, period)], NOW, repeat=1000,
+		)[0]
+		# The iterative version is only measured where it completes in
+		# reasonable time.
+		if (NOW - start).total_seconds() / period <= 2*10**6:
+			former = measure(
+				label + ' (iterative)', iterate_occurrences, start, period, NOW,
+			)
+			assert former == (last, next_)
+
+	rand = random.Random(0)
+	schedules = [
+		(
+			NOW - timedelta(seconds=rand.randrange(10**9)),
+			rand.choice([60, 3600, 24*3600, 7*24*3600, 30.5*24*3600]),
+		)
+		for _ in range(10000)
+	]
+	measure('batch of 10000 schedules', get_occurrences, schedules, NOW)
+
+
+if __name__ == '__main__':
+	run()
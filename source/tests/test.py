@@ -1,16 +1,20 @@
 #! /usr/bin/env python3
 
-import unittest, sys, os, functools, argparse
+import unittest, sys, os, functools, argparse, importlib
 import os.path as op
 
 from . import utils
 from . import (
 	test_cli_parser,
+	test_client,
+	test_daemon,
+	test_data_access,
 	test_get_neighbourhood_occurrences,
 	test_todo,
 	test_utils,
 	test_rainbow,
 	test_text_wrap,
+	test_transfer,
 )
 from .test_bash_completion import test_installation
 
@@ -18,7 +22,7 @@ sys.path.insert(0, op.abspath('.'))
 
 import todo.todo as todo
 import todo.cli_parser as cli_parser
-from todo.data_access import DB_PATH as DATA_LOCATION
+from todo.utils import DB_PATH as DATA_LOCATION
 from todo.todo import CONFIG_FILE
 from todo.utils import NOW, VERSION_PATH
 
@@ -26,14 +30,30 @@ from todo.utils import NOW, VERSION_PATH
 TEST_CONFIG = 'tests/.toduhrc'
 
 UNIT_TESTS = [
+	'tests.test_client',
+	'tests.test_data_access',
+	'tests.test_daemon',
 	'tests.test_get_neighbourhood_occurrences',
 	'tests.test_todo',
 	'tests.test_utils',
 	'tests.test_rainbow',
 	'tests.test_text_wrap',
+	'tests.test_transfer',
 	'tests.test_bash_completion.test_installation',
 ]
 
+BENCHMARKS = [
+	'tests.benchmarks.bench_occurrences',
+	'tests.benchmarks.bench_concurrency',
+	'tests.benchmarks.bench_dependencies',
+	'tests.benchmarks.bench_move',
+	'tests.benchmarks.bench_contexts',
+	'tests.benchmarks.bench_import',
+	'tests.benchmarks.bench_export',
+	'tests.benchmarks.bench_migration',
+	'tests.benchmarks.bench_cli_parser',
+]
+
 TRACES_DIR = 'tests/traces'
 
 TEST_REPLACEMENTS = [
@@ -94,8 +114,18 @@ def main():
 	parser.add_argument('-p', '--perf', action='store_true',
 		help="For functional tests, print per-command execution time."
 	)
+	parser.add_argument('-B', '--bench', action='store_true',
+		help="Run only benchmarks"
+	)
 	args = parser.parse_args()
 
+	if args.bench:
+		print('* Benchmarks')
+		for module in BENCHMARKS:
+			print('[{}]'.format(module.split('.')[-1]))
+			importlib.import_module(module).run()
+		sys.exit(0)
+
 	if args.build is not None:
 		out = args.build
 		if args.out is not None:
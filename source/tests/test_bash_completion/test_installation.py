@@ -9,6 +9,7 @@ from pyfakefs.fake_filesystem_unittest import TestCase
 
 sys.path.insert(1, op.abspath('./todo'))
 
+import todo.cli_parser
 from todo.bash_completion import installation
 from todo.bash_completion.installation import TODO_AUTOCOMPLETION_MARK
 
@@ -92,3 +93,19 @@ class TestInstallAutocompletionNoConfigFile(BaseTestInstallAutocompletion):
 			"No appropriate config file was found",
 			mocked_print.mock_calls[0][1][0]
 		)
+
+
+class TestAutocompletionPayload(unittest.TestCase):
+
+	def test_commands(self):
+		payload = installation.get_autocompletion_payload()
+		match = installation.COMMANDS_DEFINITION_RE.search(payload)
+		commands = match.group(0).split('=', 1)[1].strip('"').split()
+		self.assertEqual(set(commands), todo.cli_parser.COMMANDS)
+
+	def test_shipped_script_is_up_to_date(self):
+		filename = pkg_resources.resource_filename(
+			'todo.bash_completion', 'toduh.sh'
+		)
+		with open(filename) as f:
+			self.assertEqual(f.read(), installation.get_autocompletion_payload())
@@ -0,0 +1,111 @@
+import os
+import os.path as op
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+SOURCE_DIR = op.dirname(op.dirname(op.abspath(__file__)))
+
+RUN_TODO = 'from todo.client import main; main()'
+
+# Modules only some commands need, which the bare `todo` must not import
+LAZY_MODULES = [
+    'fcntl',
+    'json',
+    'socket',
+    'todo.bash_completion.installation',
+    'todo.daemon',
+    'todo.transfer',
+]
+
+# Modules dealing with tasks, which the root options not dealing with them
+# must not import
+TASK_MODULES = [
+    'sqlite3',
+    'todo.core',
+    'todo.data_access',
+    'todo.rainbow',
+]
+
+# Modules of the in-process program, which the client itself must not import
+# so that commands forwarded to a daemon don't pay for them
+PROGRAM_MODULES = TASK_MODULES + [
+    'todo.cli_parser',
+    'todo.todo',
+]
+
+
+class TestImportTime(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # A home directory of its own, so that the data directory and the
+        # config are the default ones, and the database already exists
+        cls.home = tempfile.mkdtemp()
+        cls.get_import_times()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.home)
+
+    @classmethod
+    def get_import_times(cls, *argv, code=RUN_TODO):
+        """ Run the Python `code` (by default `todo`) with the arguments
+        `argv` and return a dictionary mapping the name of each module it
+        imports to its cumulative import time in seconds, as reported by
+        `python -X importtime`, and whether it was imported at the top level
+        rather than by another module."""
+        env = dict(os.environ, HOME=cls.home)
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [SOURCE_DIR, env.get('PYTHONPATH')])
+        )
+        process = subprocess.run(
+            [
+                sys.executable, '-X', 'importtime',
+                '-c', code,
+                *argv
+            ],
+            cwd=cls.home,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+        times = {}
+        for line in process.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line.split('|')
+            if not cumulative.strip().isdigit():
+                continue
+            # Modules imported by the interpreter itself, up to site, are
+            # left out
+            if name.strip() == 'site':
+                times = {}
+                continue
+            times[name.strip()] = (int(cumulative) / 1e6, name[1] != ' ')
+        return times
+
+    def test_client_module(self):
+        times = self.get_import_times(code='import todo.client')
+        self.assertIn('todo.client', times)
+        for module in LAZY_MODULES + PROGRAM_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, times)
+
+    def test_lazy_modules(self):
+        times = self.get_import_times()
+        for module in LAZY_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, times)
+
+    def test_root_options(self):
+        for option in ['--version', '--location']:
+            times = self.get_import_times(option)
+            for module in TASK_MODULES:
+                with self.subTest(option=option, module=module):
+                    self.assertNotIn(module, times)
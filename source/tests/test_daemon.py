@@ -0,0 +1,73 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+from todo import daemon, todo, utils
+
+from .test_data_access import get_memory_data_access
+
+
+class TestHandle(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.argv = sys.argv
+        self.environ = {
+            name: os.environ.get(name) for name in ['COLUMNS', 'LINES', 'TZ']
+        }
+
+    def tearDown(self):
+        sys.argv = self.argv
+        utils.TERMINAL_WIDTH = None
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def handle(self, *argv, encoding='utf-8'):
+        request = {
+            'argv': ['todo'] + list(argv),
+            'cwd': os.getcwd(),
+            'width': 60,
+            'environ': self.environ,
+            'encoding': encoding,
+            'errors': 'strict',
+        }
+        return daemon.handle(request, self.daccess, todo.serve_request)
+
+    def test_same_output_as_in_process(self):
+        self.handle('add', 'Water the plants ☘', '--deadline', '2d')
+        response = self.handle()
+        self.assertFalse(response['fallback'])
+        self.assertEqual(response['status'], 0)
+        utils.TERMINAL_WIDTH = 60
+        output = io.StringIO()
+        with redirect_stdout(output):
+            todo.run(todo.cli_parser.parse_cli([]), self.daccess)
+        self.assertEqual(response['stdout'], output.getvalue())
+        self.assertIn('Water the plants ☘', response['stdout'])
+
+    def test_encoding(self):
+        self.handle('add', 'Water the plants', '--deadline', '2d')
+        self.assertIn('⌛', self.handle()['stdout'])
+        response = self.handle(encoding='ascii')
+        self.assertEqual(response['status'], 0)
+        self.assertNotIn('⌛', response['stdout'])
+        self.assertIn('~', response['stdout'])
+
+    def test_errors(self):
+        response = self.handle('task', '1', '--priority', 'high')
+        self.assertEqual(response['status'], 2)
+        self.assertEqual(response['stdout'], '')
+        self.assertIn('invalid int value', response['stderr'])
+        response = self.handle('task', 'xyz')
+        self.assertEqual(response['status'], 1)
+        self.assertEqual(response['stdout'], 'Invalid task ID: xyz\n')
+
+    def test_fallback(self):
+        for argv in [['--version'], ['edit', '1'], ['purge'], ['add', '-h']]:
+            response = self.handle(*argv)
+            self.assertTrue(response['fallback'], argv)
@@ -0,0 +1,1361 @@
+import json
+import os
+import os.path as op
+import re
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from todo import init_db, todo, utils
+from todo.data_access import DataAccess, open_database, update_contexts_file
+
+
+def get_memory_data_access():
+    connection = sqlite3.connect(':memory:', isolation_level=None)
+    for stmt in init_db.INIT_DB:
+        connection.execute(stmt)
+    connection.isolation_level = ''
+    return DataAccess(connection)
+
+
+def assert_consistent(test, daccess):
+    """ The closure table and the tallies are the ones computed from scratch
+    by the migrations."""
+    connection = daccess.connection
+    closure = set(connection.execute("SELECT * FROM ContextClosure"))
+    tallies = set(connection.execute("""
+        SELECT path, own_tasks, total_tasks, visible_tasks FROM Context
+    """))
+    for stmt in init_db.INIT_DB:
+        if stmt.lstrip().startswith('INSERT INTO `ContextClosure`'):
+            connection.execute("DELETE FROM ContextClosure")
+            connection.execute(stmt)
+        elif stmt.lstrip().startswith('UPDATE Context SET'):
+            connection.execute(stmt)
+    test.assertEqual(
+        set(connection.execute("SELECT * FROM ContextClosure")), closure
+    )
+    test.assertEqual(set(connection.execute("""
+        SELECT path, own_tasks, total_tasks, visible_tasks FROM Context
+    """)), tallies)
+
+
+class TestFullTextSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.plants = self.daccess.add_task(
+            'Water the plants',
+            'The cactus only needs a little water once a month.',
+        )
+        self.garden = self.daccess.add_task('Build a cactus garden', None)
+
+    def search(self, term, **kwargs):
+        return self.daccess.full_text_search(term, markers=('<', '>'), **kwargs)
+
+    def test_title_and_content(self):
+        tasks = self.search('cactus')
+        self.assertEqual(
+            {task['id']: task['excerpt'] for task in tasks},
+            {
+                self.plants: (
+                    'The <cactus> only needs a little water once a month.'
+                ),
+                self.garden: None,
+            },
+        )
+
+    def test_title_is_more_relevant(self):
+        tasks = self.search('water')
+        self.assertEqual(tasks[0]['id'], self.plants)
+        self.daccess.add_task('Buy a watering can', 'To water the plants.')
+        tasks = self.search('water')
+        self.assertEqual(len(tasks), 2)
+        self.assertEqual(tasks[0]['id'], self.plants)
+
+    def test_index_follows_updates(self):
+        self.daccess.update_task(self.plants, options=[
+            ('content', 'Twice a week.')
+        ])
+        self.assertEqual(
+            [task['id'] for task in self.search('cactus')], [self.garden]
+        )
+        self.daccess.remove(self.garden)
+        self.assertEqual(self.search('cactus'), [])
+        self.assertEqual(
+            [task['id'] for task in self.search('twice week')], [self.plants]
+        )
+
+    def test_without_fts5(self):
+        """ The full-text index is left out of the schema of databases
+        created with an SQLite library lacking FTS5, which work otherwise."""
+        connection = sqlite3.connect(':memory:')
+        with mock.patch('todo.init_db.has_fts5', return_value=False):
+            init_db.update_database(connection, 0)
+        connection.commit()
+        daccess = DataAccess(connection)
+        self.assertFalse(daccess.has_full_text_index())
+        tid = daccess.add_task('Water the plants', None)
+        daccess.update_task(tid, options=[('title', 'Water the cactus')])
+        daccess.remove(tid)
+        args = {
+            'term': 'cactus', 'done': False, 'undone': False, 'context': None,
+            'save': None, 'full_text': True, 'case': False,
+        }
+        self.assertEqual(todo.search(args, daccess), ('full_text_unavailable',))
+
+    def test_has_fts5(self):
+        self.assertTrue(init_db.has_fts5(self.daccess.connection))
+        self.assertTrue(self.daccess.has_full_text_index())
+
+
+class TestSavedSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.first = self.daccess.add_task(
+            'Fix the bike', None, context='.home'
+        )
+        self.second = self.daccess.add_task(
+            'Bike to work', None, context='.work'
+        )
+
+    def saved_ids(self, name):
+        return [
+            task['id'] for task in self.daccess.get_saved_search_tasks(name)
+        ]
+
+    def test_results_follow_tasks(self):
+        count = self.daccess.save_search('bikes', 'bike', ctx='.home')
+        self.assertEqual(count, 1)
+        third = self.daccess.add_task(
+            'BIKE lights', None, context='.home.shed'
+        )
+        self.assertEqual(self.saved_ids('bikes'), [self.first, third])
+        self.daccess.update_task(self.second, context='.home')
+        self.daccess.update_task(self.first, options=[('title', 'Fix car')])
+        self.assertEqual(self.saved_ids('bikes'), [self.second, third])
+        self.daccess.remove(third)
+        self.assertEqual(self.saved_ids('bikes'), [self.second])
+
+    def test_done_filter(self):
+        self.daccess.save_search('undone', 'bike', done=False)
+        self.daccess.set_done(self.first)
+        self.assertEqual(self.saved_ids('undone'), [self.second])
+        self.daccess.set_undone(self.first)
+        self.assertEqual(self.saved_ids('undone'), [self.first, self.second])
+
+    def test_same_as_search(self):
+        self.daccess.add_task('Lights', 'For the BIKE', context='.home')
+        self.daccess.add_task('Helmet', 'bike or scooter', context='.work')
+        trip = self.daccess.add_task('Trip', None)
+        for case in [False, True]:
+            with self.subTest(case=case):
+                self.daccess.save_search('bikes', 'bike', case=case)
+                self.daccess.add_task('Pump', 'Bike pump', context='.home')
+                self.daccess.update_task(trip, options=[
+                    ('content', 'By bike' if case else 'By BIKE')
+                ])
+                self.assertEqual(
+                    self.saved_ids('bikes'),
+                    [
+                        task['id']
+                        for task in self.daccess.search('bike', case=case)
+                    ],
+                )
+
+    def test_removed_context(self):
+        self.assertIsNone(
+            self.daccess.save_search('nope', 'bike', ctx='.nope')
+        )
+        self.daccess.save_search('work', 'bike', ctx='.work')
+        self.daccess.remove_context('.work')
+        self.assertIsNone(self.daccess.get_saved_search('work'))
+
+
+class TestMultipleIds(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.ids = [
+            self.daccess.add_task('Task {}'.format(i), None) for i in range(3)
+        ]
+
+    def get_column(self, column):
+        return [
+            self.daccess.get_task(tid)[column] for tid in self.ids
+        ]
+
+    def test_get_tasks(self):
+        tasks = self.daccess.get_tasks(self.ids[:2] + [self.ids[0], 42])
+        self.assertEqual(
+            sorted(task['id'] for task in tasks), self.ids[:2]
+        )
+
+    def test_done_and_undone(self):
+        self.daccess.set_done_many(self.ids[:2])
+        done = self.get_column('done')
+        self.assertIsNotNone(done[0])
+        self.assertIsNone(done[2])
+        missing = self.daccess.set_undone_many(
+            [self.ids[0], 42, self.ids[2], self.ids[0]]
+        )
+        self.assertEqual(missing, [42, self.ids[2], self.ids[0]])
+        self.assertEqual(self.get_column('done'), [None, done[1], None])
+
+    def test_remove(self):
+        missing = self.daccess.remove_many([self.ids[1], 42, self.ids[1]])
+        self.assertEqual(missing, [42, self.ids[1]])
+        self.assertIsNone(self.daccess.get_task(self.ids[1]))
+        self.assertIsNotNone(self.daccess.get_task(self.ids[0]))
+
+    def test_ping(self):
+        missing = self.daccess.ping_many(
+            [self.ids[0], 42, self.ids[1], self.ids[0]]
+        )
+        self.assertEqual(missing, [42])
+        self.assertEqual(self.get_column('ping'), [2, 1, 0])
+
+    def test_many_ids(self):
+        ids = [
+            self.daccess.add_task('Task', None) for _ in range(2000)
+        ]
+        self.daccess.set_done_many(ids)
+        self.assertEqual(self.daccess.set_undone_many(ids + [42]), [42])
+
+
+class TestDependencies(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.ids = [
+            self.daccess.add_task('Task {}'.format(i), None) for i in range(6)
+        ]
+        # 0 -> 1 -> 2 -> 3, and 4 -> 3
+        for task_id, dependency_id in [(0, 1), (1, 2), (2, 3), (4, 3)]:
+            self.daccess.set_task_dependencies(
+                self.ids[task_id], [self.ids[dependency_id]]
+            )
+
+    def test_set_dependencies(self):
+        unexisting = self.daccess.set_task_dependencies(
+            self.ids[5], [self.ids[0], 42, self.ids[4], self.ids[0]]
+        )
+        self.assertEqual(unexisting, [42])
+        rows = self.daccess.connection.execute("""
+            SELECT dependency_id FROM TaskDependency WHERE task_id = ?
+        """, (self.ids[5],))
+        self.assertEqual(
+            sorted(row[0] for row in rows), [self.ids[0], self.ids[4]]
+        )
+        task = self.daccess.get_task(self.ids[5])
+        self.assertEqual(task['open_dependencies'], 2)
+
+    def test_no_cycle(self):
+        for tid, dependencies in [(3, [5]), (4, [0, 2]), (5, [0, 4])]:
+            self.assertIsNone(self.daccess.find_dependency_cycle(
+                self.ids[tid], [self.ids[i] for i in dependencies]
+            ))
+
+    def test_cycle(self):
+        cycle = self.daccess.find_dependency_cycle(
+            self.ids[3], [self.ids[5], self.ids[4], self.ids[1]]
+        )
+        self.assertEqual(cycle, [self.ids[i] for i in [3, 4, 3]])
+        cycle = self.daccess.find_dependency_cycle(self.ids[2], [self.ids[0]])
+        self.assertEqual(cycle, [self.ids[i] for i in [2, 0, 1, 2]])
+
+    def get_chain(self, tid, **kwargs):
+        chain = self.daccess.get_dependency_chain(self.ids[tid], **kwargs)
+        return [(self.ids.index(task['id']), task['depth']) for task in chain]
+
+    def test_dependency_chain(self):
+        self.assertEqual(self.get_chain(0), [(1, 1), (2, 2), (3, 3)])
+        self.assertEqual(self.get_chain(0, max_depth=2), [(1, 1), (2, 2)])
+        self.assertEqual(
+            self.get_chain(3, downstream=True), [(2, 1), (4, 1), (1, 2), (0, 3)]
+        )
+        self.assertEqual(self.get_chain(5), [])
+
+    def test_dependency_chain_with_cycle(self):
+        # Cycles can't be created anymore but may exist in older databases
+        self.daccess.connection.execute("""
+            INSERT INTO TaskDependency (task_id, dependency_id) VALUES (?, ?)
+        """, (self.ids[3], self.ids[0]))
+        self.assertEqual(self.get_chain(1), [(2, 1), (3, 2), (0, 3)])
+        self.assertEqual(
+            self.get_chain(1, max_depth=5), [(2, 1), (3, 2), (0, 3)]
+        )
+
+    def test_self_dependency(self):
+        cycle = self.daccess.find_dependency_cycle(self.ids[5], [self.ids[5]])
+        self.assertEqual(cycle, [self.ids[5], self.ids[5]])
+
+
+class TestOpenDependencies(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.a, self.b, self.c, self.task = [
+            self.daccess.add_task(title, None) for title in 'ABCD'
+        ]
+        self.daccess.set_done(self.c)
+        self.daccess.set_task_dependencies(self.task, [self.a, self.b, self.c])
+
+    def get_open_dependencies(self):
+        return self.daccess.get_task(self.task)['open_dependencies']
+
+    def test_insert(self):
+        # The done dependency doesn't count
+        self.assertEqual(self.get_open_dependencies(), 2)
+
+    def test_done_and_undone(self):
+        self.daccess.set_done_many([self.a, self.b])
+        self.assertEqual(self.get_open_dependencies(), 0)
+        self.daccess.set_undone(self.a)
+        self.daccess.set_undone(self.c)
+        self.assertEqual(self.get_open_dependencies(), 2)
+
+    def test_remove(self):
+        self.daccess.remove(self.a)
+        self.assertEqual(self.get_open_dependencies(), 1)
+        # Removing a done dependency changes nothing
+        self.daccess.remove(self.c)
+        self.assertEqual(self.get_open_dependencies(), 1)
+        self.daccess.set_task_dependencies(self.task, [])
+        self.assertEqual(self.get_open_dependencies(), 0)
+
+
+class TestMoveAll(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        for ctx in ['.a', '.a.b', '.a.b.c', '.a.d', '.x', '.x.b']:
+            self.daccess.add_task('Task in ' + ctx, None, context=ctx)
+        self.daccess.set_context('.a.b.c', [('visibility', 'hidden')])
+
+    def get_task_paths(self):
+        return sorted(
+            (row[0], row[1]) for row in self.daccess.connection.execute("""
+                SELECT t.title, c.path
+                FROM Task t JOIN Context c ON t.context = c.id
+            """)
+        )
+
+    def test_move_to_new_context(self):
+        self.daccess.move_all('.a', '.y.z')
+        self.assertEqual(self.get_task_paths(), [
+            ('Task in .a', '.y.z'),
+            ('Task in .a.b', '.y.z.b'),
+            ('Task in .a.b.c', '.y.z.b.c'),
+            ('Task in .a.d', '.y.z.d'),
+            ('Task in .x', '.x'),
+            ('Task in .x.b', '.x.b'),
+        ])
+        assert_consistent(self, self.daccess)
+
+    def test_move_to_existing_context(self):
+        self.daccess.move_all('.a', '.x')
+        self.assertEqual(self.get_task_paths(), [
+            ('Task in .a', '.x'),
+            ('Task in .a.b', '.x.b'),
+            ('Task in .a.b.c', '.x.b.c'),
+            ('Task in .a.d', '.x.d'),
+            ('Task in .x', '.x'),
+            ('Task in .x.b', '.x.b'),
+        ])
+        assert_consistent(self, self.daccess)
+
+    def test_move_into_own_subtree(self):
+        self.daccess.move_all('.a', '.a.b')
+        self.assertEqual(self.get_task_paths()[:4], [
+            ('Task in .a', '.a.b'),
+            ('Task in .a.b', '.a.b.b'),
+            ('Task in .a.b.c', '.a.b.b.c'),
+            ('Task in .a.d', '.a.b.d'),
+        ])
+        assert_consistent(self, self.daccess)
+
+    def test_move_to_root(self):
+        self.daccess.move_all('.x', '')
+        self.assertEqual(self.get_task_paths()[-2:], [
+            ('Task in .x', ''),
+            ('Task in .x.b', '.b'),
+        ])
+        assert_consistent(self, self.daccess)
+
+
+class TestRenameContext(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        for ctx in ['.work.work', '.work.a.b', '.workshop.c', '.home']:
+            self.daccess.get_or_create_context(ctx)
+
+    def get_paths(self):
+        return sorted(
+            row[0] for row in self.daccess.connection.execute(
+                "SELECT path FROM Context"
+            )
+        )
+
+    def test_rename_subtree(self):
+        self.assertEqual(self.daccess.rename_context('.work', 'job'), 4)
+        self.assertEqual(self.get_paths(), [
+            '', '.home', '.job', '.job.a', '.job.a.b', '.job.work',
+            '.workshop', '.workshop.c',
+        ])
+
+    def test_rename_leaf(self):
+        self.assertEqual(self.daccess.rename_context('.work.a.b', 'c'), 1)
+        self.assertIn('.work.a.c', self.get_paths())
+
+    def test_existing_name(self):
+        self.assertIsNone(self.daccess.rename_context('.work', 'home'))
+        self.assertIn('.work.a.b', self.get_paths())
+
+
+class TestContextClosure(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.daccess.get_or_create_context('.a.b')
+        self.daccess.get_or_create_context('.ab')
+
+    def get_closure(self):
+        """ Return the rows of the closure table, with paths instead of
+        IDs (which must all be the ones of existing contexts)."""
+        rows = self.daccess.connection.execute("""
+            SELECT a.path, d.path, cl.depth
+            FROM ContextClosure cl
+            LEFT JOIN Context a ON a.id = cl.ancestor
+            LEFT JOIN Context d ON d.id = cl.descendant
+        """)
+        return sorted(tuple(row) for row in rows)
+
+    def test_create(self):
+        self.assertEqual(self.get_closure(), [
+            ('', '', 0), ('', '.a', 1), ('', '.a.b', 2), ('', '.ab', 1),
+            ('.a', '.a', 0), ('.a', '.a.b', 1),
+            ('.a.b', '.a.b', 0),
+            ('.ab', '.ab', 0),
+        ])
+
+    def test_rename(self):
+        self.daccess.rename_context('.a', 'c')
+        self.assertEqual(self.get_closure(), [
+            ('', '', 0), ('', '.ab', 1), ('', '.c', 1), ('', '.c.b', 2),
+            ('.ab', '.ab', 0),
+            ('.c', '.c', 0), ('.c', '.c.b', 1),
+            ('.c.b', '.c.b', 0),
+        ])
+        self.daccess.get_or_create_context('.c.b.d')
+        self.assertIn(('.c', '.c.b.d', 2), self.get_closure())
+
+    def test_remove(self):
+        self.daccess.remove_context('.a')
+        self.assertEqual(
+            self.get_closure(), [('', '', 0), ('', '.ab', 1), ('.ab', '.ab', 0)]
+        )
+        self.daccess.get_or_create_context('.a.b')
+        self.assertIn(('.a', '.a.b', 1), self.get_closure())
+
+
+class TestContextTallies(unittest.TestCase):
+    """ The numbers of undone started tasks of contexts: own, total (in the
+    subtree) and visible (in the non-hidden contexts of the subtree)."""
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.daccess.set_context('.h', [('visibility', 'hidden')])
+        self.task = self.daccess.add_task('A', None, context='.a.b')
+
+    def get_tallies(self):
+        rows = self.daccess.connection.execute("""
+            SELECT path, own_tasks, total_tasks, visible_tasks FROM Context
+        """)
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def assertTallies(self, expected):
+        tallies = self.get_tallies()
+        self.assertEqual(
+            {path: tallies[path] for path in expected}, expected
+        )
+        assert_consistent(self, self.daccess)
+
+    def test_add(self):
+        self.assertTallies({
+            '': (0, 1, 1), '.a': (0, 1, 1), '.a.b': (1, 1, 1), '.h': (0, 0, 0),
+        })
+        self.daccess.add_task('Later', None, context='.a', options=[
+            ('start', '2999-01-01 00:00:00')
+        ])
+        self.assertTallies({'': (0, 1, 1), '.a': (0, 1, 1)})
+
+    def test_done_and_undone(self):
+        self.daccess.set_done(self.task)
+        self.assertTallies({'': (0, 0, 0), '.a': (0, 0, 0), '.a.b': (0, 0, 0)})
+        self.daccess.set_undone(self.task)
+        self.assertTallies({'': (0, 1, 1), '.a': (0, 1, 1), '.a.b': (1, 1, 1)})
+
+    def test_move_and_visibility(self):
+        self.daccess.update_task(self.task, context='.h')
+        self.assertTallies({
+            '': (0, 1, 0), '.a': (0, 0, 0), '.a.b': (0, 0, 0), '.h': (1, 1, 0),
+        })
+        self.daccess.set_context('.h', [('visibility', 'normal')])
+        self.assertTallies({'': (0, 1, 1), '.h': (1, 1, 1)})
+
+    def test_start(self):
+        self.daccess.update_task(
+            self.task, options=[('start', '2999-01-01 00:00:00')]
+        )
+        self.assertTallies({'': (0, 0, 0), '.a': (0, 0, 0), '.a.b': (0, 0, 0)})
+
+    def test_remove(self):
+        self.daccess.remove(self.task)
+        self.assertTallies({'': (0, 0, 0), '.a': (0, 0, 0), '.a.b': (0, 0, 0)})
+
+
+class TestLastDone(unittest.TestCase):
+
+    def get_last_done(self, connection):
+        return [
+            row[0] for row in connection.execute(
+                "SELECT last_done FROM Task ORDER BY id"
+            )
+        ]
+
+    def test_backfill(self):
+        """ The column is filled from the history of existing tasks."""
+        index = next(
+            i for i, stmt in enumerate(init_db.INIT_DB)
+            if 'ADD COLUMN `last_done`' in stmt
+        )
+        connection = sqlite3.connect(':memory:')
+        for stmt in init_db.INIT_DB[:index]:
+            connection.execute(stmt)
+        connection.executemany(
+            "INSERT INTO Task (title, context) VALUES (?, 1)", [('A',), ('B',)]
+        )
+        connection.executemany("""
+            INSERT INTO TaskDoneHistory (task_id, done_datetime)
+            VALUES (1, ?)
+        """, [('2024-01-02 10:00:00',), ('2024-01-01 10:00:00',)])
+        for stmt in init_db.INIT_DB[index:]:
+            connection.execute(stmt)
+        self.assertEqual(
+            self.get_last_done(connection), ['2024-01-02 10:00:00', None]
+        )
+
+    def test_trigger(self):
+        """ The column follows the latest datetime of the history."""
+        daccess = get_memory_data_access()
+        tid = daccess.add_task('A', None, options=[('period', 86400)])
+        daccess.add_done_occurrences([tid])
+        last_done = self.get_last_done(daccess.connection)[0]
+        self.assertIsNotNone(last_done)
+        daccess.connection.execute("""
+            INSERT INTO TaskDoneHistory (task_id, done_datetime)
+            VALUES (?, '2000-01-01 00:00:00')
+        """, (tid,))
+        self.assertEqual(self.get_last_done(daccess.connection), [last_done])
+        daccess.connection.execute("""
+            INSERT INTO TaskDoneHistory (task_id, done_datetime)
+            VALUES (?, '2999-01-01 00:00:00')
+        """, (tid,))
+        self.assertEqual(
+            self.get_last_done(daccess.connection), ['2999-01-01 00:00:00']
+        )
+
+
+class TestOccurrences(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.tid = self.daccess.add_task('A', None, options=[
+            ('start', '2024-01-01 00:00:00'), ('period', 86400)
+        ])
+
+    def get_occurrences(self):
+        return tuple(self.daccess.connection.execute("""
+            SELECT last_occurrence, next_occurrence FROM Task WHERE id = ?
+        """, (self.tid,)).fetchone())
+
+    def assertCaughtUp(self, start, period):
+        """ The boundaries are missing until a listing computes them."""
+        self.assertEqual(self.get_occurrences(), (None, None))
+        self.daccess.todo()
+        last, next_ = self.get_occurrences()
+        self.assertEqual(
+            (last[11:], next_[11:]), (start[11:], start[11:])
+        )
+        self.assertEqual(
+            (
+                utils.sqlite_date_to_timestamp(next_)
+                - utils.sqlite_date_to_timestamp(last)
+            ),
+            period,
+        )
+
+    def test_new_task(self):
+        self.assertCaughtUp('2024-01-01 00:00:00', 86400)
+
+    def test_update_start(self):
+        self.daccess.todo()
+        self.daccess.update_task(self.tid, options=[
+            ('start', '2024-01-01 12:00:00')
+        ])
+        self.assertCaughtUp('2024-01-01 12:00:00', 86400)
+
+    def test_update_period(self):
+        self.daccess.todo()
+        self.daccess.update_task(self.tid, options=[('period', 2 * 86400)])
+        self.assertCaughtUp('2024-01-01 00:00:00', 2 * 86400)
+
+
+class TestContextCreation(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+
+    def get_statements(self, function, *args):
+        statements = []
+        self.daccess.connection.set_trace_callback(statements.append)
+        function(*args)
+        self.daccess.connection.set_trace_callback(None)
+        return ' '.join(statements)
+
+    def test_create_chain(self):
+        self.daccess.get_or_create_context('.a.b')
+        cid = self.daccess.get_or_create_context(
+            '.a.b.c.d', [('priority', 3)]
+        )
+        self.assertEqual(self.daccess.get_or_create_context('.a.b.c.d'), cid)
+        context = self.daccess.connection.execute(
+            "SELECT path, priority FROM Context WHERE id = ?", (cid,)
+        ).fetchone()
+        self.assertEqual(tuple(context), ('.a.b.c.d', 3))
+        for i in range(3):
+            self.daccess.add_task('Task', None, context='.a.b.c')
+        assert_consistent(self, self.daccess)
+
+    def test_cached_context(self):
+        self.daccess.get_or_create_context('.a.b.c.d.e.f')
+        statements = self.get_statements(
+            self.daccess.add_task, 'Task', None, '.a.b.c.d.e.f'
+        )
+        self.assertNotIn('INTO Context', statements)
+        self.assertNotIn('FROM Context', statements)
+
+    def test_rollback(self):
+        self.daccess.connection.commit()
+        self.daccess.get_or_create_context('.a')
+        self.daccess.rollback()
+        self.assertFalse(self.daccess.context_exists('.a'))
+        self.daccess.get_or_create_context('.a')
+        self.assertTrue(self.daccess.context_exists('.a'))
+
+    def test_rename_and_remove(self):
+        self.daccess.get_or_create_context('.a.b')
+        self.daccess.rename_context('.a', 'c')
+        self.assertFalse(self.daccess.context_exists('.a.b'))
+        self.assertTrue(self.daccess.context_exists('.c.b'))
+        self.daccess.remove_context('.c')
+        self.assertFalse(self.daccess.context_exists('.c.b'))
+
+    def test_changes_from_other_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = op.join(directory, 'todo.sqlite')
+            connection = sqlite3.connect(path, isolation_level=None)
+            for stmt in init_db.INIT_DB:
+                connection.execute(stmt)
+            connection.close()
+            first = DataAccess(sqlite3.connect(path))
+            second = DataAccess(sqlite3.connect(path))
+            cid = first.get_or_create_context('.a')
+            first.connection.commit()
+            second.rename_context('.a', 'b')
+            second.connection.commit()
+            self.assertFalse(first.context_exists('.a'))
+            self.assertNotEqual(first.get_or_create_context('.a'), cid)
+            first.connection.close()
+            second.connection.close()
+
+
+class TestImport(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.daccess.add_task('Existing', None)
+        self.daccess.remove(1)
+
+    def get_tasks(self):
+        return self.daccess.connection.execute("""
+            SELECT t.id, t.title, c.path, t.created, t.start, t.done, t.priority
+            FROM Task t JOIN Context c ON t.context = c.id
+            ORDER BY t.id
+        """).fetchall()
+
+    def get_dependencies(self):
+        return sorted(tuple(row) for row in self.daccess.connection.execute(
+            "SELECT task_id, dependency_id FROM TaskDependency"
+        ))
+
+    def test_import(self):
+        progress = []
+        records = [
+            {'title': 'A', 'context': 'work.a', 'created': '2024-01-01T10:00:00Z'},
+            {'title': 'B', 'start': '2024-02-01', 'done': True, 'priority': 3},
+            {
+                'title': 'C', 'period': 86400,
+                'done_history': ['2024-01-02 10:00:00'],
+            },
+        ] * 700
+        report = self.daccess.import_tasks(records, progress.append)
+        self.assertEqual(report['count'], 2100)
+        self.assertEqual(progress, [1000, 2000, 2100])
+        tasks = self.get_tasks()
+        # The ID of the removed task isn't reused
+        self.assertEqual(
+            tuple(tasks[0]),
+            (2, 'A', '.work.a', '2024-01-01 10:00:00', '2024-01-01 10:00:00',
+             None, 1)
+        )
+        self.assertEqual(tasks[1]['start'], '2024-02-01 00:00:00')
+        self.assertIsNotNone(tasks[1]['done'])
+        self.assertEqual(tasks[1]['priority'], 3)
+        recurring = self.daccess.get_task(4)
+        self.assertEqual(recurring['last_done'].isoformat(), '2024-01-02T10:00:00')
+        assert_consistent(self, self.daccess)
+
+    def get_triggers(self):
+        return {row[0] for row in self.daccess.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )}
+
+    def test_batch_triggers(self):
+        """ The work of the triggers left out during the import is done for
+        each batch, and they're back afterwards."""
+        triggers = self.get_triggers()
+        self.daccess.set_context('.hidden', [('visibility', 'hidden')])
+        self.daccess.import_tasks([
+            {'title': 'Water the cactus', 'context': 'hidden.a'},
+            {'title': 'Later', 'context': 'hidden', 'start': '2999-01-01'},
+            {'title': 'Repot the cactus', 'content': 'In spring'},
+        ] * 400)
+        self.assertEqual(self.get_triggers(), triggers)
+        assert_consistent(self, self.daccess)
+        self.assertEqual(
+            len(self.daccess.full_text_search('cactus spring')), 400
+        )
+        added = self.daccess.add_task('Prune the cactus', None)
+        self.assertEqual(
+            len(self.daccess.full_text_search('cactus', ctx='')), 801
+        )
+        self.assertEqual(self.daccess.get_task(added)['started'], 1)
+        assert_consistent(self, self.daccess)
+        with self.assertRaises(ValueError):
+            self.daccess.import_tasks([{'title': 'A'}, {'context': 'work'}])
+        self.assertEqual(self.get_triggers(), triggers)
+
+    def test_dependencies(self):
+        report = self.daccess.import_tasks([
+            {'title': 'A', 'id': 'a', 'depends_on': ['b', 'x']},
+            {'title': 'B', 'id': 'b', 'depends_on': ['c']},
+            {'title': 'C', 'id': 'c'},
+        ])
+        self.assertEqual(report['unexisting_dependencies'], ['x'])
+        self.assertIsNone(report['cycle'])
+        self.assertEqual(self.get_dependencies(), [(2, 3), (3, 4)])
+        self.assertEqual(self.daccess.get_task(2)['open_dependencies'], 1)
+
+    def test_cycle(self):
+        report = self.daccess.import_tasks([
+            {'title': 'A', 'id': 1, 'depends_on': [2, 4]},
+            {'title': 'B', 'id': 2, 'depends_on': [3]},
+            {'title': 'C', 'id': 3, 'depends_on': [1]},
+            {'title': 'D', 'id': 4},
+            {'title': 'E', 'id': 5, 'depends_on': [5]},
+        ])
+        self.assertIn(report['cycle'], [
+            ['1', '2', '3', '1'], ['2', '3', '1', '2'], ['3', '1', '2', '3'],
+            ['5', '5'],
+        ])
+        # Only the dependencies between tasks of cycles are left out
+        self.assertEqual(self.get_dependencies(), [(2, 5)])
+
+    def test_invalid_record(self):
+        with self.assertRaisesRegex(ValueError, 'Task 2: invalid datetime'):
+            self.daccess.import_tasks([
+                {'title': 'A'}, {'title': 'B', 'deadline': 'tomorrow'},
+            ])
+        with self.assertRaisesRegex(ValueError, 'Task 1: missing title'):
+            self.daccess.import_tasks([{'context': 'work'}])
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.daccess.import_tasks([
+            {
+                'title': 'A', 'id': 'a', 'context': 'work',
+                'created': '2024-01-01', 'deadline': '2024-02-01T12:00:00Z',
+                'depends_on': ['b', 'c'], 'front': True,
+            },
+            {'title': 'B', 'id': 'b', 'context': 'work.sub', 'done': True},
+            {
+                'title': 'C', 'id': 'c', 'content': 'Content',
+                'period': 86400, 'created': '2024-01-01',
+                'done_history': ['2024-01-03', '2024-01-02'],
+            },
+        ])
+
+    def export(self, ctx='', done=None):
+        return list(self.daccess.export_tasks(ctx, done))
+
+    def test_export(self):
+        records = self.export()
+        self.assertEqual([r['id'] for r in records], ['1', '2', '3'])
+        self.assertEqual(records[0], {
+            'id': '1', 'title': 'A', 'content': None, 'context': 'work',
+            'created': '2024-01-01T00:00:00Z', 'start': '2024-01-01T00:00:00Z',
+            'deadline': '2024-02-01T12:00:00Z', 'done': None, 'priority': 1,
+            'period': None, 'front': True, 'depends_on': ['2', '3'],
+            'done_history': [],
+        })
+        self.assertEqual(records[2]['done_history'], [
+            '2024-01-02T00:00:00Z', '2024-01-03T00:00:00Z',
+        ])
+
+    def test_filters(self):
+        self.assertEqual([r['id'] for r in self.export('.work')], ['1', '2'])
+        self.assertEqual([r['id'] for r in self.export(done=True)], ['2'])
+        self.assertEqual(
+            [r['id'] for r in self.export('.work', done=False)], ['1']
+        )
+
+    def test_round_trip(self):
+        records = self.export()
+        other = get_memory_data_access()
+        report = other.import_tasks(records)
+        self.assertEqual(report['unexisting_dependencies'], [])
+        self.assertEqual(list(other.export_tasks()), records)
+        assert_consistent(self, other)
+
+
+class TestOpenDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_dir = op.join(self.directory.name, '.toduh')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self):
+        connection = open_database(self.data_dir)
+        self.addCleanup(connection.close)
+        return connection
+
+    def get_schema(self, connection):
+        return sorted(tuple(row) for row in connection.execute("""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE name NOT LIKE 'sqlite_%'
+        """))
+
+    def test_create(self):
+        connection = self.open()
+        self.assertEqual(
+            init_db.get_schema_version(connection), init_db.SCHEMA_VERSION
+        )
+        self.assertEqual(
+            self.get_schema(connection),
+            self.get_schema(get_memory_data_access().connection)
+        )
+        self.assertEqual(os.listdir(self.data_dir), ['data.sqlite'])
+
+    def test_up_to_date(self):
+        self.open().close()
+        with mock.patch('todo.data_access.setup_database') as setup_database:
+            self.open()
+        setup_database.assert_not_called()
+
+    def test_full_text_added(self):
+        """ The full-text index left out of a database created with an SQLite
+        library lacking FTS5 is added once the library has it."""
+        with mock.patch('todo.init_db.has_fts5', return_value=False):
+            connection = self.open()
+            self.assertEqual(
+                init_db.get_schema_version(connection),
+                -init_db.SCHEMA_VERSION
+            )
+            connection.execute("""
+                INSERT INTO Task (title, context) VALUES ('Water the cactus', 1)
+            """)
+            connection.commit()
+            connection.close()
+            with mock.patch('todo.data_access.setup_database') as setup:
+                self.open()
+            setup.assert_not_called()
+        connection = self.open()
+        self.assertEqual(
+            init_db.get_schema_version(connection), init_db.SCHEMA_VERSION
+        )
+        self.assertEqual(
+            self.get_schema(connection),
+            self.get_schema(get_memory_data_access().connection)
+        )
+        tasks = DataAccess(connection).full_text_search('cactus')
+        self.assertEqual(
+            [task['title'] for task in tasks], ['Water the cactus']
+        )
+
+    def test_old_sqlite(self):
+        """ Nothing is created with an SQLite library lacking features of the
+        schema."""
+        version = 'todo.init_db.sqlite3.sqlite_version_info'
+        with mock.patch(version, (3, 30, 1)):
+            with self.assertRaises(init_db.UnsupportedSQLiteError):
+                self.open()
+        connection = sqlite3.connect(op.join(self.data_dir, 'data.sqlite'))
+        self.addCleanup(connection.close)
+        self.assertEqual(init_db.get_schema_version(connection), 0)
+        self.assertEqual(self.get_schema(connection), [])
+
+    def test_unversioned(self):
+        """ Databases of previous versions are updated from the version of the
+        version file."""
+        for version, applied in [('4.0.0', 12), ('5.1.0', 16)]:
+            with self.subTest(version=version):
+                self.data_dir = op.join(self.directory.name, version)
+                self.check_unversioned(version, applied)
+
+    def check_unversioned(self, version, applied):
+        os.mkdir(self.data_dir)
+        connection = sqlite3.connect(op.join(self.data_dir, 'data.sqlite'))
+        for stmt in init_db.INIT_DB[:applied]:
+            connection.execute(stmt)
+        connection.execute("INSERT INTO Task (title, context) VALUES ('A', 1)")
+        connection.commit()
+        connection.close()
+        with open(op.join(self.data_dir, 'version'), 'w') as version_file:
+            version_file.write(version)
+        connection = self.open()
+        self.assertEqual(
+            init_db.get_schema_version(connection), init_db.SCHEMA_VERSION
+        )
+        self.assertEqual(
+            connection.execute("SELECT title FROM Task").fetchall(), [('A',)]
+        )
+        self.assertEqual(
+            self.get_schema(connection),
+            self.get_schema(get_memory_data_access().connection)
+        )
+
+
+class TestTransferData(unittest.TestCase):
+
+    DATA = {
+        'contexts': {'work': {'p': 3}, 'home.garden': {'v': 'hidden'}},
+        'tasks': [
+            {
+                'content': 'A', 'context': 'work.sub',
+                'created': '2016-01-01T10:00:00', 'priority': 2,
+            },
+            {'content': 'B', 'deadline': '2016-02-01T00:00:00', 'done': True},
+        ],
+    }
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_dir = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def migrate(self, data):
+        with open(op.join(self.data_dir, 'data.json'), 'w') as datafile:
+            json.dump(data, datafile)
+        progress = []
+        connection = open_database(self.data_dir, progress=progress.append)
+        self.addCleanup(connection.close)
+        return DataAccess(connection), progress
+
+    def test_transfer(self):
+        daccess, progress = self.migrate(self.DATA)
+        self.assertEqual(progress, [2])
+        tasks = daccess.connection.execute("""
+            SELECT t.title, c.path, t.created, t.deadline, t.priority,
+                   t.done IS NOT NULL
+            FROM Task t JOIN Context c ON t.context = c.id
+            ORDER BY t.id
+        """).fetchall()
+        self.assertEqual([tuple(task) for task in tasks], [
+            ('A', '.work.sub', '2016-01-01 10:00:00', None, 2, 0),
+            ('B', '', '0001-01-01 00:00:00', '2016-02-01 00:00:00', 1, 1),
+        ])
+        contexts = daccess.connection.execute("""
+            SELECT path, priority, visibility FROM Context ORDER BY path
+        """).fetchall()
+        self.assertEqual([tuple(ctx) for ctx in contexts], [
+            ('', 1, 'normal'), ('.home', 1, 'normal'),
+            ('.home.garden', 1, 'hidden'), ('.work', 3, 'normal'),
+            ('.work.sub', 1, 'normal'),
+        ])
+        with open(op.join(self.data_dir, 'contexts')) as ctx_file:
+            self.assertEqual(ctx_file.read().split(), [
+                'home', 'home.garden', 'work', 'work.sub',
+            ])
+        assert_consistent(self, daccess)
+
+    def test_interrupted(self):
+        invalid = dict(self.DATA, tasks=self.DATA['tasks'] + [{'content': ''}])
+        with self.assertRaises(ValueError):
+            self.migrate(invalid)
+        # Nothing is left of the migration, which runs again from the start
+        connection = sqlite3.connect(op.join(self.data_dir, 'data.sqlite'))
+        self.assertEqual(init_db.get_schema_version(connection), 0)
+        self.assertEqual(connection.execute(
+            "SELECT count(*) FROM sqlite_master"
+        ).fetchone()[0], 0)
+        connection.close()
+        daccess, _ = self.migrate(self.DATA)
+        self.assertEqual(daccess.connection.execute(
+            "SELECT count(*) FROM Task"
+        ).fetchone()[0], 2)
+
+
+class TestContextsFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = op.join(self.directory.name, 'contexts')
+        self.daccess = get_memory_data_access()
+        self.daccess.data_dir = self.directory.name
+
+    def read(self):
+        with open(self.path) as ctx_file:
+            return ctx_file.read().splitlines()
+
+    def test_update(self):
+        update_contexts_file(self.path, {}, lambda: ['', '.b', '.a', '.a.b'])
+        self.assertEqual(self.read(), ['a', 'a.b', 'b'])
+        # The paths of the database aren't needed anymore
+        update_contexts_file(self.path, [
+            ('.a.b', False), ('.c', True), ('.a.a', True), ('.b', True),
+        ], None)
+        self.assertEqual(self.read(), ['a', 'a.a', 'b', 'c'])
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            ['contexts', 'contexts.lock']
+        )
+
+    def test_subtree_changes(self):
+        update_contexts_file(self.path, [], lambda: [
+            '', '.a', '.a.b', '.a.b.c', '.a-b', '.a-b.c', '.d', '.d.e',
+        ])
+        # The descendants of a context aren't next to it (a-b is in between)
+        update_contexts_file(self.path, [
+            ('.a', '.e'), ('.a', True), ('.a.f', True), ('.d', False),
+        ], None)
+        self.assertEqual(
+            self.read(), ['a', 'a-b', 'a-b.c', 'a.f', 'e', 'e.b', 'e.b.c']
+        )
+        update_contexts_file(self.path, [('.a-b', '.b')], None)
+        self.assertEqual(
+            self.read(), ['a', 'a.f', 'b', 'b.c', 'e', 'e.b', 'e.b.c']
+        )
+        update_contexts_file(self.path, [('', False)], None)
+        self.assertEqual(self.read(), [])
+
+    def check_file(self):
+        """ The file lists the contexts of the database once saved."""
+        self.daccess.save()
+        paths = self.daccess.connection.execute("""
+            SELECT path FROM Context WHERE path != '' ORDER BY path
+        """)
+        self.assertEqual(self.read(), [row[0][1:] for row in paths])
+
+    def test_changes(self):
+        self.daccess.add_task('A', None, context='.work.a')
+        self.daccess.add_task('B', None, context='.home')
+        self.check_file()
+        self.daccess.move_all('.work', '.home.work')
+        self.check_file()
+        self.daccess.rename_context('.home', 'house')
+        self.check_file()
+        self.daccess.remove_context('.work')
+        self.daccess.get_or_create_context('.work.b')
+        self.check_file()
+        self.daccess.remove_context('.house.work')
+        self.check_file()
+        # A context renamed then created again before saving
+        self.daccess.get_or_create_context('.house.a-b')
+        self.daccess.rename_context('.house', 'home')
+        self.daccess.get_or_create_context('.house.work')
+        self.check_file()
+
+    def test_rollback(self):
+        self.daccess.get_or_create_context('.kept')
+        self.check_file()
+        self.daccess.get_or_create_context('.dropped')
+        self.daccess.rollback()
+        self.check_file()
+
+    def test_lock_without_fcntl(self):
+        msvcrt = mock.Mock(LK_LOCK=1, LK_UNLCK=0)
+        with mock.patch('os.name', 'nt'), \
+             mock.patch.dict('sys.modules', {'msvcrt': msvcrt}):
+            update_contexts_file(self.path, {}, lambda: ['', '.a'])
+        self.assertEqual(self.read(), ['a'])
+        self.assertEqual(
+            [call.args[1:] for call in msvcrt.locking.mock_calls],
+            [(1, 1), (0, 1)]
+        )
+
+
+class TestQueryPlans(unittest.TestCase):
+    """ The hot queries must not scan the whole Task table: they may only
+    search indexes or scan partial indexes (which only hold undone tasks,
+    recurring tasks...)."""
+
+    SCAN_REGEX = re.compile(r'SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+    TASK_ALIASES = {'Task', 't', 'dependee'}
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        for i in range(10):
+            self.daccess.add_task('Task {}'.format(i), None, context='.a.b')
+        self.daccess.add_task('Recurring', None, options=[('period', 86400)])
+        blocked = self.daccess.add_task('Blocked', None, context='.a')
+        self.daccess.set_task_dependencies(blocked, [1, 2])
+        self.daccess.set_done(3)
+        self.partial_indexes = {
+            row[1] for row in self.daccess.connection.execute(
+                "PRAGMA index_list('Task')"
+            )
+            if row[4]
+        }
+
+    def get_statements(self, function, *args):
+        statements = []
+        self.daccess.connection.set_trace_callback(statements.append)
+        try:
+            function(*args)
+        finally:
+            self.daccess.connection.set_trace_callback(None)
+        return [
+            stmt for stmt in statements
+            if stmt.split()[0].upper() in ('SELECT', 'UPDATE', 'DELETE')
+        ]
+
+    def assertNoTaskScan(self, function, *args):
+        for stmt in self.get_statements(function, *args):
+            plan = self.daccess.connection.execute(
+                'EXPLAIN QUERY PLAN ' + stmt
+            ).fetchall()
+            for row in plan:
+                match = self.SCAN_REGEX.match(row[3])
+                if match is None:
+                    continue
+                table, index = match.groups()
+                if table in self.TASK_ALIASES:
+                    self.assertIn(index, self.partial_indexes, stmt)
+
+    def test_todo(self):
+        self.assertNoTaskScan(self.daccess.todo, '.a')
+        self.assertNoTaskScan(self.daccess.todo, '', True)
+
+    def test_get_subcontexts(self):
+        self.assertNoTaskScan(lambda: list(self.daccess.get_subcontexts('')))
+
+
+class TestFutureTasks(unittest.TestCase):
+
+    def test_done_tasks(self):
+        """ Done tasks that haven't started yet or whose dependencies are
+        undone are listed as well."""
+        daccess = get_memory_data_access()
+        later = daccess.add_task('Later', None, options=[
+            ('start', '2999-01-01 00:00:00')
+        ])
+        blocked = daccess.add_task('Blocked', None)
+        daccess.set_task_dependencies(blocked, [later])
+        now = daccess.add_task('Now', None)
+        daccess.set_done_many([later, blocked, now])
+        self.assertEqual(
+            [task['id'] for task in daccess.get_future_tasks()],
+            [later, blocked]
+        )
+
+
+class TestReadPaths(unittest.TestCase):
+    """ Listings don't write to the database, hence don't start a write
+    transaction, when there's nothing to catch up on."""
+
+    def setUp(self):
+        self.daccess = get_memory_data_access()
+        self.daccess.add_task('Task', None, context='.a')
+        self.daccess.add_task('Recurring', None, options=[('period', 86400)])
+        self.daccess.todo()
+        self.daccess.connection.commit()
+
+    def test_todo(self):
+        self.daccess.todo()
+        self.assertFalse(self.daccess.connection.in_transaction)
+
+    def test_get_future_tasks(self):
+        self.daccess.get_future_tasks()
+        self.assertFalse(self.daccess.connection.in_transaction)
+
+    def test_get_subcontexts(self):
+        self.daccess.get_subcontexts('')
+        self.assertFalse(self.daccess.connection.in_transaction)
+
+    def test_get_descendants(self):
+        list(self.daccess.get_descendants(''))
+        self.assertFalse(self.daccess.connection.in_transaction)
+
+    def test_started_task(self):
+        self.daccess.connection.execute("""
+            UPDATE Task SET start = '2999-01-01 00:00:00'
+        """)
+        self.daccess.connection.commit()
+        self.assertEqual(self.daccess.get_subcontexts('')[0]['total_tasks'], 0)
+        future = 'todo.data_access.get_now_timestamp'
+        with mock.patch(future, return_value=32503680000): # 3000-01-01
+            self.assertEqual(
+                self.daccess.get_subcontexts('')[0]['total_tasks'], 1
+            )
+        self.assertEqual(
+            self.daccess.connection.execute(
+                "SELECT count(*) FROM Task WHERE started = 0"
+            ).fetchone()[0],
+            0
+        )
+        assert_consistent(self, self.daccess)
+
+
+class TestJournalMode(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = op.join(self.directory.name, 'todo.sqlite')
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        for stmt in init_db.INIT_DB:
+            connection.execute(stmt)
+        connection.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def connect(self, journal_mode):
+        return DataAccess(
+            sqlite3.connect(self.path, timeout=0.1),
+            journal_mode=journal_mode,
+        )
+
+    def get_pragma(self, daccess, name):
+        return daccess.connection.execute(
+            'PRAGMA {}'.format(name)
+        ).fetchone()[0]
+
+    def test_switch_over(self):
+        daccess = self.connect('wal')
+        self.assertEqual(self.get_pragma(daccess, 'journal_mode'), 'wal')
+        self.assertEqual(self.get_pragma(daccess, 'synchronous'), 1) # NORMAL
+        daccess.exit()
+        daccess = self.connect('delete')
+        self.assertEqual(self.get_pragma(daccess, 'journal_mode'), 'delete')
+        self.assertEqual(self.get_pragma(daccess, 'synchronous'), 0) # OFF
+        daccess.exit()
+
+    def test_switch_over_while_in_use(self):
+        reader = self.connect('delete')
+        reader.connection.execute('BEGIN')
+        reader.connection.execute('SELECT * FROM Task').fetchall()
+        daccess = self.connect('wal')
+        self.assertEqual(self.get_pragma(daccess, 'journal_mode'), 'delete')
+        reader.exit()
+        daccess.exit()
+        daccess = self.connect('wal')
+        self.assertEqual(self.get_pragma(daccess, 'journal_mode'), 'wal')
+        daccess.exit()
+
+    def test_readers_dont_block_writers(self):
+        reader = self.connect('wal')
+        writer = self.connect('wal')
+        reader.connection.execute('BEGIN')
+        self.assertEqual(reader.todo(), [])
+        writer.add_task('Written while reading', None)
+        writer.connection.commit()
+        self.assertEqual(reader.todo(), [])
+        reader.connection.commit()
+        self.assertEqual(len(reader.todo()), 1)
+        reader.exit()
+        writer.exit()
+
+    def test_listings_while_locked(self):
+        reader = self.connect('wal')
+        writer = self.connect('wal')
+        recurring = reader.add_task(
+            'Recurring', None, options=[('period', 86400)]
+        )
+        done = reader.add_task('Done', None, options=[
+            ('start', '2000-01-01 00:00:00'), ('period', 86400)
+        ])
+        reader.add_done_occurrences([done])
+        later = reader.add_task('Task', None, context='.a')
+        reader.connection.commit()
+        reader.connection.execute("""
+            UPDATE Task SET start = '2999-01-01 00:00:00' WHERE id = ?
+        """, (later,))
+        reader.connection.commit()
+        writer.connection.execute('BEGIN IMMEDIATE')
+        future = 'todo.data_access.get_now_timestamp'
+        with mock.patch(future, return_value=32503680000): # 3000-01-01
+            self.assertEqual(reader.get_subcontexts('')[0]['total_tasks'], 0)
+        self.assertEqual([t['id'] for t in reader.todo()], [recurring])
+        self.assertEqual([t['id'] for t in reader.get_future_tasks()], [done, later])
+        self.assertFalse(reader.connection.in_transaction)
+        writer.connection.rollback()
+        self.assertEqual([t['id'] for t in reader.todo()], [recurring])
+        self.assertEqual(
+            reader.connection.execute(
+                "SELECT count(*) FROM Task WHERE next_occurrence IS NULL"
+            ).fetchone()[0],
+            1
+        )
+        reader.exit(save=False)
+        writer.exit(save=False)
+
+    def test_import_while_adding(self):
+        """ The IDs given upfront to imported tasks can't be taken by a task
+        added by another connection while the import is starting."""
+        importer = self.connect('wal')
+        adder = self.connect('wal')
+        suspend_triggers = importer._suspend_triggers
+
+        def add_then_suspend_triggers(names):
+            adder.add_task('Added', None)
+            adder.connection.commit()
+            return suspend_triggers(names)
+
+        with mock.patch.object(
+            importer, '_suspend_triggers', add_then_suspend_triggers
+        ):
+            report = importer.import_tasks([{'title': 'A'}, {'title': 'B'}])
+        importer.connection.commit()
+        self.assertEqual(report['count'], 2)
+        tasks = importer.connection.execute(
+            "SELECT id, title FROM Task ORDER BY id"
+        )
+        self.assertEqual(
+            [tuple(row) for row in tasks], [(1, 'Added'), (2, 'A'), (3, 'B')]
+        )
+        importer.exit(save=False)
+        adder.exit(save=False)
@@ -3,7 +3,7 @@ import unittest
 
 import freezegun
 
-from todo.core import get_neighbourhood_occurrences
+from todo.core import get_neighbourhood_occurrences, get_occurrences
 
 
 @freezegun.freeze_time('2023-11-20')
@@ -34,3 +34,56 @@ class TestLotsOfPreviousOccurrences(unittest.TestCase):
 
         self.assertEqual(previous_occurrence, datetime.datetime(2023, 3, 5))
         self.assertEqual(next_occurrence, datetime.datetime(2023, 3, 12))
+
+
+@freezegun.freeze_time('2025-11-20 12:00:30')
+class TestSmallPeriodLongAgo(unittest.TestCase):
+
+    def test_small_period_long_ago(self):
+        start = datetime.datetime(2023, 11, 20)
+
+        previous_occurrence, next_occurrence = get_neighbourhood_occurrences(
+            start=start,
+            period=60,  # 1 minute, over a million times in two years
+        )
+
+        self.assertEqual(
+            previous_occurrence, datetime.datetime(2025, 11, 20, 12, 0)
+        )
+        self.assertEqual(
+            next_occurrence, datetime.datetime(2025, 11, 20, 12, 1)
+        )
+
+
+@freezegun.freeze_time('2023-11-20')
+class TestStartInTheFuture(unittest.TestCase):
+
+    def test_start_in_the_future(self):
+        start = datetime.datetime(2023, 11, 22)
+
+        previous_occurrence, next_occurrence = get_neighbourhood_occurrences(
+            start=start,
+            period=7*24*3600,  # 1 week
+        )
+
+        self.assertEqual(previous_occurrence, datetime.datetime(2023, 11, 15))
+        self.assertEqual(next_occurrence, start)
+
+
+class TestBatchOccurrences(unittest.TestCase):
+
+    def test_batch_occurrences(self):
+        now = datetime.datetime(2023, 3, 7)
+        week = 7*24*3600
+        start = datetime.datetime(2023, 1, 1)
+
+        occurrences = get_occurrences([
+            (start, week),
+            # Starts exactly now
+            (now, week),
+        ], now=now)
+
+        self.assertEqual(occurrences[0].last, datetime.datetime(2023, 3, 5))
+        self.assertEqual(occurrences[0].next, datetime.datetime(2023, 3, 12))
+        self.assertEqual(occurrences[1].last, now)
+        self.assertEqual(occurrences[1].next, datetime.datetime(2023, 3, 14))
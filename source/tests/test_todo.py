@@ -1,5 +1,6 @@
-import unittest, sys
+import io, unittest, sys
 import os.path as op
+from contextlib import redirect_stderr, redirect_stdout
 from datetime import timedelta
 
 from .utils import TestFunction
@@ -8,6 +9,7 @@ from .utils import TestFunction
 sys.path.insert(1, op.abspath('./todo'))
 
 import todo.cli_parser as cli_parser
+import todo.todo as todo
 
 
 class TestParseId(TestFunction, unittest.TestCase):
@@ -25,3 +27,73 @@ class TestParseId(TestFunction, unittest.TestCase):
 
 	def test_parse_id(self):
 		self.run_test(cli_parser.parse_id)
+
+
+class TestParseCommand(unittest.TestCase):
+	""" Parsing a command line with the parser of its subcommand only gives
+	the same arguments, output and errors as parsing it with the whole tree
+	of parsers."""
+
+	argvs = [
+		['add', 'Task', '-c', 'a.b', '-d', '2w', '--front'],
+		['add', 'Task', '--depends-on', '1', '2', '-p', '3'],
+		['add', 'Task', '--', '-title'],
+		['add'],
+		['add', 'Task', '--front', 'maybe'],
+		['add', 'Task', '--version'],
+		['add', 'Task', '--unknown'],
+		['add', '-h'],
+		['search', 'term', '--done', '--undone'],
+		['task', '1', '2'],
+		['ctx', 'a', '-v', 'normal', '--name', 'b'],
+		['history'],
+		['deps', '1', '--depth', 'x'],
+		['export', '--format', 'csv', '--undone'],
+		['--version'],
+		['--location'],
+		['--version', '--location'],
+		['--version', 'add', 'Task'],
+		['-h'],
+	]
+
+	def parse(self, parse, argv):
+		""" Return the arguments parsed by `parse` from `argv`, in order, or
+		its exit status, along with what it printed."""
+		stdout, stderr = io.StringIO(), io.StringIO()
+		with redirect_stdout(stdout), redirect_stderr(stderr):
+			try:
+				result = list(parse(argv).items())
+			except SystemExit as exit:
+				result = exit.code
+		return result, stdout.getvalue(), stderr.getvalue()
+
+	def test_parse_command(self):
+		def parse_with_full_tree(argv):
+			return vars(cli_parser._make_full_parser().parse_args(argv))
+
+		for argv in self.argvs:
+			with self.subTest(argv=argv):
+				self.assertEqual(
+					self.parse(cli_parser.parse_command, argv),
+					self.parse(parse_with_full_tree, argv)
+				)
+
+
+class TestIsTaskDefault(unittest.TestCase):
+
+	task = {
+		'created': '0001-01-01 00:00:00',
+		'created_ts': -62135596800,
+		'start': '0001-01-01 00:00:00',
+		'start_ts': -62135596800,
+		'deadline': None,
+		'deadline_ts': None,
+		'priority': 1,
+	}
+
+	def test_timestamps(self):
+		for prop in ['created_ts', 'start_ts', 'priority']:
+			with self.subTest(prop=prop):
+				self.assertTrue(todo.is_task_default(self.task, prop))
+		task = dict(self.task, start='2020-01-01 00:00:00', start_ts=1577836800)
+		self.assertFalse(todo.is_task_default(task, 'start_ts'))
@@ -0,0 +1,156 @@
+import io
+import unittest
+
+from todo import transfer
+
+
+class TestReaders(unittest.TestCase):
+
+    def read(self, file_format, text):
+        return list(transfer.READERS[file_format](io.StringIO(text)))
+
+    def test_get_format(self):
+        self.assertEqual(transfer.get_format('tasks.JSONL'), 'jsonl')
+        self.assertEqual(transfer.get_format('dir.csv/todo.txt'), 'todotxt')
+        self.assertEqual(transfer.get_format('tasks.json'), 'json')
+        self.assertIsNone(transfer.get_format('tasks.yaml'))
+
+    def test_jsonl(self):
+        records = self.read('jsonl', '{"title": "A", "id": 1}\n\n{"title": "B"}\n')
+        self.assertEqual(records, [{'title': 'A', 'id': 1}, {'title': 'B'}])
+        with self.assertRaisesRegex(ValueError, 'Line 2'):
+            self.read('jsonl', '{"title": "A"}\n[1]\n')
+
+    def test_json(self):
+        self.assertEqual(self.read('json', '[{"title": "A"}]'), [{'title': 'A'}])
+        with self.assertRaisesRegex(ValueError, 'Task 2'):
+            self.read('json', '[{"title": "A"}, 1]')
+        with self.assertRaisesRegex(ValueError, 'not a JSON array'):
+            self.read('json', '{"title": "A"}')
+        for text in ['[{"title": "A"}', '[{"title": "A"}] {}', '[1,]']:
+            with self.assertRaises(ValueError):
+                self.read('json', text)
+
+    def test_json_elements(self):
+        text = ' [{"title": "A"}, 12345, [], {"title": "B"}] '
+        # Elements are decoded the same however they are split between chunks
+        for chunk_size in [1, 2, 3, 7, transfer.CHUNK_SIZE]:
+            elements = transfer.iter_json_elements(
+                io.StringIO(text), chunk_size
+            )
+            self.assertEqual(
+                list(elements), [{'title': 'A'}, 12345, [], {'title': 'B'}]
+            )
+        elements = transfer.iter_json_elements(io.StringIO('[]'))
+        self.assertEqual(list(elements), [])
+
+    def test_csv(self):
+        records = self.read('csv', (
+            'title,context,done,front,priority,depends_on\n'
+            'A,work,x,false,2,1 2\n'
+            'B,,2024-01-01,,,\n'
+        ))
+        self.assertEqual(records, [
+            {
+                'title': 'A', 'context': 'work', 'done': True, 'priority': 2,
+                'depends_on': ['1', '2'],
+            },
+            {'title': 'B', 'done': '2024-01-01'},
+        ])
+        with self.assertRaisesRegex(ValueError, 'Line 2: priority'):
+            self.read('csv', 'title,priority\nA,high\n')
+
+    def test_todotxt(self):
+        records = self.read('todotxt', (
+            'x 2024-01-03 2024-01-01 Pay bills +home +money\n'
+            '(B) 2024-02-01 Call mom @phone due:2024-03-01 t:2024-02-15\n'
+            '\n'
+            'Read http://example.com\n'
+        ))
+        self.assertEqual(records, [
+            {
+                'done': '2024-01-03', 'created': '2024-01-01',
+                'context': 'home', 'title': 'Pay bills +money',
+            },
+            {
+                'priority': 26, 'created': '2024-02-01',
+                'deadline': '2024-03-01', 'start': '2024-02-15',
+                'title': 'Call mom @phone',
+            },
+            {'title': 'Read http://example.com'},
+        ])
+
+
+class TestJsonMembers(unittest.TestCase):
+
+    TEXT = (
+        '{"contexts": {"a": {"p": 2}},\n'
+        ' "tasks": [{"content": "x"}, {"content": "y"}],\n'
+        ' "empty": [], "count": 12345}'
+    )
+
+    def members(self, text, chunk_size=transfer.CHUNK_SIZE):
+        return list(transfer.iter_json_members(
+            io.StringIO(text), ['tasks', 'empty'], chunk_size
+        ))
+
+    def test_members(self):
+        expected = [
+            ('contexts', {'a': {'p': 2}}),
+            ('tasks', {'content': 'x'}),
+            ('tasks', {'content': 'y'}),
+            ('count', 12345),
+        ]
+        # Values are decoded the same however they are split between chunks
+        for chunk_size in [1, 2, 3, 7, transfer.CHUNK_SIZE]:
+            self.assertEqual(self.members(self.TEXT, chunk_size), expected)
+        self.assertEqual(self.members(' {} '), [])
+
+    def test_invalid(self):
+        for text in ['', '[]', '{"tasks": [{}', '{"tasks": [1,]}', '{"a" 1}']:
+            with self.assertRaises(ValueError):
+                self.members(text, 2)
+
+
+class TestWriters(unittest.TestCase):
+
+    RECORDS = [
+        {
+            'id': '1', 'title': 'A, "quoted"', 'content': 'Line\nline',
+            'context': 'work', 'created': '2024-01-01T10:00:00Z',
+            'start': '2024-01-01T10:00:00Z', 'deadline': None, 'done': None,
+            'priority': 2, 'period': 86400, 'front': True, 'depends_on': ['2'],
+            'done_history': ['2024-01-02T10:00:00Z', '2024-01-03T10:00:00Z'],
+        },
+        {
+            'id': '2', 'title': 'B', 'content': None, 'context': '',
+            'created': '2024-01-01T10:00:00Z',
+            'start': '2024-01-01T10:00:00Z', 'deadline': '2024-02-01T00:00:00Z',
+            'done': '2024-01-05T10:00:00Z', 'priority': 1, 'period': None,
+            'front': False, 'depends_on': [], 'done_history': [],
+        },
+    ]
+
+    def write(self, file_format, records):
+        file = io.StringIO()
+        transfer.WRITERS[file_format](iter(records), file)
+        return file.getvalue()
+
+    def read_back(self, file_format):
+        text = self.write(file_format, self.RECORDS)
+        return list(transfer.READERS[file_format](io.StringIO(text)))
+
+    def test_json(self):
+        self.assertEqual(self.read_back('jsonl'), self.RECORDS)
+        self.assertEqual(self.read_back('json'), self.RECORDS)
+        self.assertEqual(self.write('json', []), '[]\n')
+
+    def test_csv(self):
+        # Empty values are left out
+        self.assertEqual(self.read_back('csv'), [
+            {
+                key: value for key, value in record.items()
+                if value not in (None, [], False, '')
+            }
+            for record in self.RECORDS
+        ])
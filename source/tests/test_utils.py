@@ -99,3 +99,16 @@ class TestCompareVersions(TestFunction, unittest.TestCase):
 
 	def test_compare_versions(self):
 		self.run_test(tutils.compare_versions)
+
+
+class TestSqliteDateToTimestamp(TestFunction, unittest.TestCase):
+
+	cases = [
+		(['1970-01-01 00:00:00'], 0),
+		(['2024-01-18 12:30:05'], 1705581005),
+		(['1969-12-31 23:59:59'], -1),
+		(['0001-01-01 00:00:00'], -62135596800),
+	]
+
+	def test_sqlite_date_to_timestamp(self):
+		self.run_test(tutils.sqlite_date_to_timestamp)
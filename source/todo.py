@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
 
-from todo.todo import main
+from todo.client import main
 
 main()
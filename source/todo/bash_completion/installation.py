@@ -1,5 +1,8 @@
+import re
 from pathlib import Path
 
+from .. import cli_parser
+
 
 FILENAME_CANDIDATES = ['.zshrc', '.bashrc']
 FILEPATH_CANDIDATES = [Path.home() / Path(fn) for fn in FILENAME_CANDIDATES]
@@ -8,6 +11,8 @@ TODO_AUTOCOMPLETION_MARK = (
 	"# todocli autocompletion (this was added by: todo --install-autocompletion)"
 )
 
+COMMANDS_DEFINITION_RE = re.compile(r'^(\s*commands=).*$', re.MULTILINE)
+
 
 def install_autocompletion():
 	config_filepath = None
@@ -59,4 +64,18 @@ def get_autocompletion_payload():
 	filename = pkg_resources.resource_filename('todo.bash_completion', 'toduh.sh')
 	with open(filename) as f:
 		payload = f.read()
-	return payload
+	return COMMANDS_DEFINITION_RE.sub(
+		lambda match: match.group(1) + '"{}"'.format(get_completion_commands()),
+		payload,
+	)
+
+
+def get_completion_commands():
+	""" Return the words completed as the first argument of todo: those of
+	the command table of the parser, so that the completion never misses a
+	command."""
+	return ' '.join([
+		*cli_parser.COMMAND_TABLE,
+		*cli_parser.ROOT_OPTIONS,
+		*cli_parser.HELP_OPTIONS,
+	])
@@ -4,15 +4,25 @@ _todo()
     COMPREPLY=()
     cur="${COMP_WORDS[COMP_CWORD]}"
     prev="${COMP_WORDS[COMP_CWORD-1]}"
-    commands="add done task edit rm ctx mv rmctx contexts history purge --location --help"
+    # Filled in from the command table of todo when the completion is installed
+    commands="add search view done undone task edit rm ctx mv rmctx contexts history purge future deps import export ping --location --version --install-autocompletion --daemon -h --help"
 
     data_dir="$HOME/.toduh"
     if [ -d '.toduh' ]; then
         data_dir='.toduh'
     fi
     data_file="$data_dir/contexts"
-    if [ -f $data_file ]; then
-        contexts=`cat $data_file`
+    if [ -f "$data_file" ]; then
+        # The contexts file is sorted: the contexts starting with the current
+        # word are found by binary search, or are read up to the last one
+        if command -v look > /dev/null 2>&1; then
+            contexts=$(look -- "$cur" "$data_file")
+        else
+            contexts=$(awk -v prefix="$cur" '
+                index($0, prefix) == 1 { print; found = 1; next }
+                found { exit }
+            ' "$data_file")
+        fi
     fi
 
     if [ ${prev} = 'todo' ]; then
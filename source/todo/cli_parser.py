@@ -5,8 +5,8 @@ import sys
 from collections import Counter
 from datetime import datetime, timedelta, timezone
 
-from . import data_access, utils
-from .utils import NOW, ISO_SHORT
+from . import utils
+from .utils import ISO_SHORT
 
 
 REMAINING = {
@@ -25,10 +25,16 @@ USER_DATE_FORMATS = [
 ]
 
 
-COMMANDS = {
-	'add', 'done', 'task', 'edit', 'rm', 'ctx', 'contexts', 'history',
-	'purge', 'mv', 'rmctx', 'search', 'future', '-h', '--help', '--location',
-	'--version', '--install-autocompletion', 'undone', 'ping'}
+# Options of todo itself, which exclude each other
+ROOT_OPTIONS = {
+	'--location': "Print the location of the todo data directory",
+	'--version': "Print the version of the program",
+	'--install-autocompletion': "Install command-line autocompletion for todo",
+	'--daemon': "Run a daemon to which todo commands are forwarded, sparing "
+	            "them the startup of the program",
+}
+
+HELP_OPTIONS = ('-h', '--help')
 
 
 ## Argument parsing error messages
@@ -73,7 +79,8 @@ def parse_id(tid_list):
 
 
 def parse_context(ctx):
-	return True, data_access.dbfy_context(ctx)
+	from .data_access import dbfy_context
+	return True, dbfy_context(ctx)
 
 
 def parse_moment(moment, direction=1):
@@ -83,7 +90,7 @@ def parse_moment(moment, direction=1):
 	direction indicates in which direction in time the delay is applied to the
 	current time. It can either be 1 (future) or -1 (past).
 	"""
-	dt = _parse_datetime(moment, NOW, direction)
+	dt = _parse_datetime(moment, utils.NOW, direction)
 	if dt is None:
 		return False, INCORRECT_MOMENT
 	else:
@@ -210,8 +217,9 @@ def parse_args(args):
 	return report
 
 
-def parse_cli():
-	argv = sys.argv[1:]
+def parse_cli(argv=None):
+	if argv is None:
+		argv = sys.argv[1:]
 	if len(argv) == 0:
 		argv = [''] # bare todo with root context
 	command, params = argv[0], argv[1:]
@@ -222,6 +230,38 @@ def parse_cli():
 
 
 def parse_bare_todo(argv):
+	args = _get_bare_todo_parser(sys.argv[0]).parse_args(argv)
+	return vars(args)
+
+
+def parse_command(argv):
+	"""
+	Parse the command line of a subcommand or of a root option. Only the
+	parser of the given subcommand is built, unless the whole tree of parsers
+	is needed: to print the help of todo, or to report arguments that the
+	subcommand doesn't know of, which argparse does with the usage of todo.
+	"""
+	command, params = argv[0], argv[1:]
+	if command in COMMAND_TABLE:
+		parser = _get_command_parser(sys.argv[0], command)
+		namespace, extras = parser.parse_known_args(params)
+		if len(extras) == 0:
+			# Root options come first and are unset, as with the whole tree
+			args = vars(_get_root_parser(sys.argv[0]).parse_args([]))
+			args.update(vars(namespace))
+			return args
+	elif command in ROOT_OPTIONS and len(params) == 0:
+		return vars(_get_root_parser(sys.argv[0]).parse_args(argv))
+	return vars(_make_full_parser().parse_args(argv))
+
+
+# PARSERS CONSTRUCTION.
+#
+# Parsers are named after the name the program was called with (sys.argv[0]),
+# which is why the cached ones are cached by this name.
+
+@functools.lru_cache(maxsize=None)
+def _get_bare_todo_parser(program):
 	parser = argparse.ArgumentParser()
 	parser.add_argument('context', nargs='?',
 		help="Context to show the tasks of. Defaults to the root context "
@@ -235,12 +275,27 @@ def parse_bare_todo(argv):
 	style_group.add_argument('--tidy', action='store_true',
 		help="Only show the tasks of the given context, and list subcontexts"
 	)
+	return parser
 
-	args = parser.parse_args(argv)
-	return vars(args)
 
+@functools.lru_cache(maxsize=None)
+def _get_root_parser(program):
+	return _make_root_parser()
 
-def parse_command(argv):
+
+@functools.lru_cache(maxsize=None)
+def _get_command_parser(program, command):
+	""" Return the parser of the subcommand `command`, as a subparser of the
+	root parser would be, without building the other subparsers."""
+	prog = '{} {}'.format(_get_root_parser(program).prog, command)
+	parser = argparse.ArgumentParser(prog=prog)
+	parser.set_defaults(command=command)
+	_, build_parser = COMMAND_TABLE[command]
+	build_parser(parser)
+	return parser
+
+
+def _make_root_parser():
 	parser = argparse.ArgumentParser(
 		description="Alternatively, the program might be called this way:\n"
 		    "  $ todo [<context>]\n"
@@ -249,183 +304,230 @@ def parse_command(argv):
 		formatter_class=argparse.RawTextHelpFormatter
 	)
 	root_group = parser.add_mutually_exclusive_group()
-	root_group.add_argument('--location', action='store_true',
-		help="Print the location of the todo data directory"
-	)
-	root_group.add_argument('--version', action='store_true',
-		help="Print the version of the program"
-	)
-	root_group.add_argument('--install-autocompletion', action='store_true',
-		help="Install command-line autocompletion for todo",
-	)
+	for option, option_help in ROOT_OPTIONS.items():
+		root_group.add_argument(option, action='store_true', help=option_help)
+	return parser
 
+
+def _make_full_parser():
+	parser = _make_root_parser()
 	subparsers = parser.add_subparsers()
+	for command, (command_help, build_parser) in COMMAND_TABLE.items():
+		command_parser = subparsers.add_parser(command, help=command_help)
+		command_parser.set_defaults(command=command)
+		build_parser(command_parser)
+	return parser
+
 
-	add_parser = subparsers.add_parser('add',
-		help="Add a new task")
-	add_parser.set_defaults(command='add')
-	add_parser.add_argument('title',
+def _build_add_parser(parser):
+	parser.add_argument('title',
 		help="The title of the task"
 	)
-	_add_common_task_arguments_to_command_parser(add_parser)
-	add_parser.add_argument('-e', '--edit', action='store_true',
+	_add_common_task_arguments_to_command_parser(parser)
+	parser.add_argument('-e', '--edit', action='store_true',
 		help="Edit the task in a text editor before adding it"
 	)
 
-	search_parser = subparsers.add_parser('search',
-		help="Search for tasks")
-	search_parser.set_defaults(command='search')
-	search_parser.add_argument('term',
+
+def _build_search_parser(parser):
+	parser.add_argument('term',
 		help="Substring to be searched in tasks' titles."
 	)
-	search_parser.add_argument('-c', '--context',
+	parser.add_argument('-c', '--context',
 		help="Context to search in, with recursion"
 	)
-	search_parser.add_argument('--before',
+	parser.add_argument('--before',
 		help="Restrict the search to tasks created before a certain moment. "
 		     "Same format than <add --deadline> except that a delay is a "
 		     "delay in the past."
 	)
-	search_parser.add_argument('--after',
+	parser.add_argument('--after',
 		help="Restrict the search to tasks created after a certain moment. "
 		     "Same format than <add --deadline>"
 	)
-	search_parser.add_argument('--case', action='store_true',
+	matching_group = parser.add_mutually_exclusive_group()
+	matching_group.add_argument('--case', action='store_true',
 		help="Make the search case-sensitive"
 	)
-	done_group = search_parser.add_mutually_exclusive_group()
+	matching_group.add_argument('--full-text', action='store_true',
+		help="Search words in tasks' titles and contents, regardless of "
+		     "case and accents, using the full-text index. A word ending "
+		     "with * matches any word starting with it. Tasks are sorted by "
+		     "relevance and an excerpt is printed for matching contents."
+	)
+	done_group = parser.add_mutually_exclusive_group()
 	done_group.add_argument('--done', action='store_true',
 		help="Restrict the search to done tasks"
 	)
 	done_group.add_argument('--undone', action='store_true',
 		help="Restrict the search to undone tasks"
 	)
+	parser.add_argument('--save', metavar='NAME',
+		help="Save the search under the given name, so that its results "
+		     "can be printed with <view NAME>. Full-text searches can't be "
+		     "saved."
+	)
+
 
-	done_parser = subparsers.add_parser('done',
-		help="Set task(s) as done")
-	done_parser.set_defaults(command='done')
-	done_parser.add_argument('id', nargs='+',
+def _build_view_parser(parser):
+	parser.add_argument('name', nargs='?',
+		help="Name of the saved search. If omitted, saved searches are "
+		     "listed"
+	)
+	parser.add_argument('--delete', action='store_true',
+		help="Delete the saved search instead of printing its results"
+	)
+
+
+def _build_done_parser(parser):
+	parser.add_argument('id', nargs='+',
 		help="The list of tasks' IDs to set as done"
 	)
 
-	done_parser = subparsers.add_parser('undone',
-		help="Cancel the 'done' command on a task")
-	done_parser.set_defaults(command='undone')
-	done_parser.add_argument('id', nargs='+',
+
+def _build_undone_parser(parser):
+	parser.add_argument('id', nargs='+',
 		help="The list of tasks' IDs to set as undone"
 	)
 
-	task_parser = subparsers.add_parser('task',
-		help="Select a task to apply modifiers to. Options that are shared "
-		     "with the add command are documented there")
-	task_parser.set_defaults(command='task')
-	task_parser.add_argument('id',
+
+def _build_task_parser(parser):
+	parser.add_argument('id',
 		help="ID of the task to apply modifiers to"
 	)
-	_add_common_task_arguments_to_command_parser(task_parser)
-	task_parser.add_argument('-t', '--title',
+	_add_common_task_arguments_to_command_parser(parser)
+	parser.add_argument('-t', '--title',
 		help="Rename the task"
 	)
 
-	edit_parser = subparsers.add_parser('edit',
-		help="Edit the title of a task")
-	edit_parser.set_defaults(command='edit')
-	edit_parser.add_argument('id',
+
+def _build_edit_parser(parser):
+	parser.add_argument('id',
 		help="ID of the task to edit"
 	)
 
-	rm_parser = subparsers.add_parser('rm',
-		help="Remove task(s) from history")
-	rm_parser.set_defaults(command='rm')
-	rm_parser.add_argument('id', nargs='+',
+
+def _build_rm_parser(parser):
+	parser.add_argument('id', nargs='+',
 		help="The list of tasks' IDs to remove"
 	)
 
-	ctx_parser = subparsers.add_parser('ctx',
-		help="Select a context to show the tasks of, or to apply modifiers to")
-	ctx_parser.set_defaults(command='ctx')
-	ctx_parser.add_argument('context',
+
+def _build_ctx_parser(parser):
+	parser.add_argument('context',
 		help="Context to show or to modify"
 	)
-	fashion_group = ctx_parser.add_mutually_exclusive_group()
+	fashion_group = parser.add_mutually_exclusive_group()
 	fashion_group.add_argument('--flat', action='store_true',
 		help="Show the tasks of subcontexts as well"
 	)
 	fashion_group.add_argument('--tidy', action='store_true',
 		help="Only show the tasks of the given context, and list subcontexts"
 	)
-	ctx_parser.add_argument('-p', '--priority', type=int,
+	parser.add_argument('-p', '--priority', type=int,
 		help="The priority of the context, as an integer. The higher the "
 		     "integer, the higher the priority. Contexts with a higher "
 		     "priority show up first in the list of sub-contexts of a "
 		     "context in a todolist"
 	)
-	ctx_parser.add_argument('-v', '--visibility', choices=['normal', 'hidden'],
+	parser.add_argument('-v', '--visibility', choices=['normal', 'hidden'],
 		help="Hidden contexts don't show up in the list of sub-contexts of a "
 		     "context in a todolist"
 	)
-	ctx_parser.add_argument('--name',
+	parser.add_argument('--name',
 		help="Name of a context. Cannot contain a dot."
 	)
 
-	mv_parser = subparsers.add_parser('mv',
-		help="Move all tasks and subcontexts from one context to another")
-	mv_parser.set_defaults(command='mv')
-	mv_parser.add_argument('ctx1',
+
+def _build_mv_parser(parser):
+	parser.add_argument('ctx1',
 		help="Source context"
 	)
-	mv_parser.add_argument('ctx2',
+	parser.add_argument('ctx2',
 		help="Destination context"
 	)
 
-	rmctx_parser = subparsers.add_parser('rmctx',
-		help="Remove a context and all its tasks")
-	rmctx_parser.set_defaults(command='rmctx')
-	rmctx_parser.add_argument('context',
+
+def _build_rmctx_parser(parser):
+	parser.add_argument('context',
 		help="Context to remove"
 	)
-	rmctx_parser.add_argument('--force', action='store_true',
+	parser.add_argument('--force', action='store_true',
 		help="Removing a context requires user interaction to confirm the "
 		     "action. Setting this option to true skips this step."
 	)
 
-	contexts_parser = subparsers.add_parser('context',
-		help="List all contexts")
-	contexts_parser.set_defaults(command='context')
-	contexts_parser.add_argument('context',
+
+def _build_contexts_parser(parser):
+	parser.add_argument('context', nargs='?',
 		help="Restrict the list to subcontexts of the given context"
 	)
 
-	history_parser = subparsers.add_parser('history',
-		help="Show tasks history")
-	history_parser.set_defaults(command='history')
 
-	purge_parser = subparsers.add_parser('purge',
-		help="Remove done tasks from history")
-	purge_parser.set_defaults(command='purge')
-	purge_parser.add_argument('--force', action='store_true',
+def _build_purge_parser(parser):
+	parser.add_argument('--force', action='store_true',
 		help="Purging requires user interaction to confirm the "
 		     "action. Setting this option to true skips this step."
 	)
-	purge_parser.add_argument('--before',
+	parser.add_argument('--before',
 		help="Only remove done tasks that were created before the given "
 		     "moment. Same format than <search --before>"
 	)
 
-	future_parser = subparsers.add_parser('future',
-		help="Show tasks that will start in the future"
+
+def _build_deps_parser(parser):
+	parser.add_argument('id',
+		help="The ID of the task"
+	)
+	direction_group = parser.add_mutually_exclusive_group()
+	direction_group.add_argument('--up', action='store_true',
+		help="Show the tasks the task depends on (default)"
+	)
+	direction_group.add_argument('--down', action='store_true',
+		help="Show the tasks depending on the task"
+	)
+	parser.add_argument('--depth', type=int,
+		help="Only show the tasks at most this number of dependencies away "
+		     "from the task"
 	)
-	future_parser.set_defaults(command='future')
 
-	ping_parser = subparsers.add_parser('ping',
-		help="Increase the ping counter of a task."
+
+def _build_import_parser(parser):
+	parser.add_argument('file',
+		help="The file to import"
+	)
+	parser.add_argument('--format',
+		choices=['jsonl', 'json', 'csv', 'todotxt'],
+		help="The format of the file. Defaults to the format matching the "
+		     "extension of the file (.jsonl, .json, .csv or .txt)"
 	)
-	ping_parser.set_defaults(command='ping')
-	ping_parser.add_argument('id', nargs='+',
+
+
+def _build_export_parser(parser):
+	parser.add_argument('--format', choices=['jsonl', 'json', 'csv'],
+		default='jsonl',
+		help="The format of the output (default: jsonl)"
+	)
+	parser.add_argument('-c', '--context',
+		help="Context to export the tasks of, with recursion"
+	)
+	done_group = parser.add_mutually_exclusive_group()
+	done_group.add_argument('--done', action='store_true',
+		help="Only export done tasks"
+	)
+	done_group.add_argument('--undone', action='store_true',
+		help="Only export undone tasks"
+	)
+
+
+def _build_ping_parser(parser):
+	parser.add_argument('id', nargs='+',
 		help="The list of tasks' IDs to ping",
 	)
 
-	return vars(parser.parse_args(argv))
+
+def _build_argumentless_parser(parser):
+	""" Used by the subcommands taking no arguments."""
 
 
 def _add_common_task_arguments_to_command_parser(command_parser):
@@ -459,3 +561,56 @@ def _add_common_task_arguments_to_command_parser(command_parser):
 		help="Show the task in any todo listing that is in an ascendant context "
 		     "of the task's context",
 	)
+
+
+# Subcommands of todo, in the order of the help: the help line of each
+# subcommand and the function adding its arguments to its parser
+COMMAND_TABLE = {
+	'add': ("Add a new task", _build_add_parser),
+	'search': ("Search for tasks", _build_search_parser),
+	'view': (
+		"Print the results of a saved search, or list saved searches",
+		_build_view_parser,
+	),
+	'done': ("Set task(s) as done", _build_done_parser),
+	'undone': ("Cancel the 'done' command on a task", _build_undone_parser),
+	'task': (
+		"Select a task to apply modifiers to. Options that are shared "
+		"with the add command are documented there",
+		_build_task_parser,
+	),
+	'edit': ("Edit the title of a task", _build_edit_parser),
+	'rm': ("Remove task(s) from history", _build_rm_parser),
+	'ctx': (
+		"Select a context to show the tasks of, or to apply modifiers to",
+		_build_ctx_parser,
+	),
+	'mv': (
+		"Move all tasks and subcontexts from one context to another",
+		_build_mv_parser,
+	),
+	'rmctx': ("Remove a context and all its tasks", _build_rmctx_parser),
+	'contexts': ("List all contexts", _build_contexts_parser),
+	'history': ("Show tasks history", _build_argumentless_parser),
+	'purge': ("Remove done tasks from history", _build_purge_parser),
+	'future': (
+		"Show tasks that will start in the future",
+		_build_argumentless_parser,
+	),
+	'deps': (
+		"Show the tasks a task depends on, directly or not, or the tasks "
+		"depending on it",
+		_build_deps_parser,
+	),
+	'import': (
+		"Add the tasks of a JSONL, JSON, CSV or todo.txt file",
+		_build_import_parser,
+	),
+	'export': (
+		"Print tasks in a format that <import> reads back",
+		_build_export_parser,
+	),
+	'ping': ("Increase the ping counter of a task.", _build_ping_parser),
+}
+
+COMMANDS = set(COMMAND_TABLE).union(ROOT_OPTIONS, HELP_OPTIONS)
@@ -0,0 +1,70 @@
+""" Entry point of the program. If a daemon (`todo --daemon`) is running for
+the data directory in use, the command line is forwarded to it along with
+what the output of the command depends on in the client's environment.
+Otherwise, or if the daemon declines the command, the command is run
+in-process. This module is kept light on imports, as importing the rest of
+the program is what the daemon spares, and the modules only needed to talk
+to the daemon are imported once a socket is found. """
+
+import os, sys
+
+from . import utils
+
+
+def main():
+	response = None
+	if os.path.exists(utils.SOCKET_PATH):
+		try:
+			response = request_daemon(sys.argv)
+		except OSError:
+			# Stale socket left by a daemon that didn't exit cleanly
+			response = None
+	if response is None or response['fallback']:
+		from .todo import main as run_in_process
+		run_in_process()
+	else:
+		sys.stdout.write(response['stdout'])
+		sys.stderr.write(response['stderr'])
+		sys.exit(response['status'])
+
+
+def request_daemon(argv):
+	""" Send the command line `argv` to the daemon and return its response: a
+	dictionary whose `fallback` key tells whether the client should run the
+	command itself, and whose `stdout`, `stderr` and `status` keys hold the
+	outcome of the command otherwise."""
+	import socket
+	request = {
+		'argv': argv,
+		'cwd': os.getcwd(),
+		'width': utils.get_terminal_width(),
+		'environ': {
+			name: os.environ.get(name) for name in ['COLUMNS', 'LINES', 'TZ']
+		},
+		'encoding': sys.stdout.encoding,
+		'errors': sys.stdout.errors,
+	}
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		sock.connect(utils.SOCKET_PATH)
+		send(sock, request)
+		return receive(sock)
+
+
+def send(sock, message):
+	""" Send the JSON-serializable `message` through the socket `sock` and
+	shut the socket down for writing, which delimits the message."""
+	import json, socket
+	sock.sendall(json.dumps(message).encode('utf-8'))
+	sock.shutdown(socket.SHUT_WR)
+
+
+def receive(sock):
+	""" Receive a message sent with `send` through the socket `sock`."""
+	import json
+	chunks = []
+	while True:
+		chunk = sock.recv(65536)
+		if not chunk:
+			break
+		chunks.append(chunk)
+	return json.loads(b''.join(chunks).decode('utf-8'))
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 
 from . import text_wrap
 from . import utils
-from .types import DoTaskReportType
+from .types import DoTaskReportType, Occurrences
 
 
 def editor_edit_task(title, content, editor):
@@ -65,35 +65,40 @@ def parse_task_full_content(full_content):
 	return title, content
 
 
-def do_recurring_task(task, daccess):
-	last_occurrence, next_occurrence = get_task_neighbourhood_occurrences(task)
-
-	report = {
-		'task': task,
-		'next_occurrence_datetime': next_occurrence,
-	}
-
-	last_done = task['last_done']
-
-	if last_done is not None and last_done > last_occurrence:
-		report['report_type'] = DoTaskReportType.RECURRENCE_ALREADY_DONE
-		return report
-
-	daccess.add_done_occurrence(task['id'])
-	report['report_type'] = DoTaskReportType.OK
-
-	return report
-
-
-def get_task_neighbourhood_occurrences(task: dict):
+def do_recurring_tasks(tasks, daccess):
 	"""
-	Return the latest and next occurrence of the task around the current
-	datetime.
+	Set the current occurrence of each of the recurring `tasks` as done, unless
+	it's already done. Return the list of reports, in the order of `tasks`.
 	"""
-	return get_neighbourhood_occurrences(
-		datetime.strptime(task['start'], utils.SQLITE_DT_FORMAT),
-		task['period'],
-	)
+	occurrences = get_occurrences([
+		(datetime.strptime(task['start'], utils.SQLITE_DT_FORMAT), task['period'])
+		for task in tasks
+	])
+	reports = []
+	done_ids = set()
+
+	for task, (last_occurrence, next_occurrence) in zip(tasks, occurrences):
+		report = {
+			'task_id': utils.to_hex(task['id']),
+			'task': task,
+			'next_occurrence_datetime': next_occurrence,
+		}
+		reports.append(report)
+
+		last_done = task['last_done']
+
+		if (
+			task['id'] in done_ids
+			or last_done is not None and last_done > last_occurrence
+		):
+			report['report_type'] = DoTaskReportType.RECURRENCE_ALREADY_DONE
+			continue
+
+		done_ids.add(task['id'])
+		report['report_type'] = DoTaskReportType.OK
+
+	daccess.add_done_occurrences(done_ids)
+	return reports
 
 
 def get_neighbourhood_occurrences(start: datetime, period: int):
@@ -101,27 +106,33 @@ def get_neighbourhood_occurrences(start: datetime, period: int):
 	From a start datetime and a period (in seconds), return the last and next
 	occurrence of the period around the current datetime.
 	"""
-	next_occurrence = start
-	now = datetime.utcnow()
-	while next_occurrence <= now:
-		next_occurrence += timedelta(seconds=period)
-	return next_occurrence - timedelta(seconds=period), next_occurrence
+	last_occurrence, next_occurrence = get_occurrences([(start, period)])[0]
+	return last_occurrence, next_occurrence
 
 
-def current_period_is_done(task: dict):
+def get_occurrences(schedules, now=None):
 	"""
-	Return a boolean indicating whether a recurring task has its ongoing
-	period done or not. Return false if the task is not recurring.
+	From an iterable of schedules, return the list of their Occurrences around
+	`now` (defaults to the current datetime). A schedule is a tuple (start,
+	period) where `start` is a datetime and `period` is in seconds.
+
+	The occurrences of a schedule are at `start` + k * `period` for k >= 0.
+	The last occurrence is the latest one at or before `now` (or the one just
+	before `start` if `start` is in the future), the next occurrence is the
+	first one after `now`.
 	"""
-	if task['period'] is None:
-		# Not a recurring task
-		return False
-
-	if task['last_done'] is None:
-		return False
-
-	last_occurrence, _ = get_task_neighbourhood_occurrences(task)
-
-	# The task has been set as done since its latest occurrence, so it's done
-	# for the current period.
-	return task['last_done'] > last_occurrence
+	if now is None:
+		now = datetime.utcnow()
+	occurrences = []
+	for start, period in schedules:
+		step = timedelta(seconds=period)
+
+		if now < start:
+			# Index of the last occurrence
+			last_index = -1
+		else:
+			last_index = (now - start) // step
+
+		next_occurrence = start + (last_index + 1) * step
+		occurrences.append(Occurrences(next_occurrence - step, next_occurrence))
+	return occurrences
@@ -0,0 +1,139 @@
+""" The daemon started by `todo --daemon`. It keeps the program loaded and the
+database open, and runs the commands forwarded by clients (see client.py)
+one at a time, as they would have run in the client's process: in the
+client's working directory, terminal width and timezone, with the current
+time, and with the output encoded as the client's terminal would. """
+
+import io, os, signal, socket, sys, time, traceback
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timezone
+
+from . import client, utils
+
+
+def serve(daccess, serve_request):
+	""" Listen on the socket of the data directory until interrupted (Ctrl+C
+	or SIGTERM), running each command received with
+	`serve_request(argv, daccess)`, which returns False to decline the
+	command. Return the exit status of the daemon."""
+	if is_running():
+		print('A daemon is already running for {}'.format(utils.DATA_DIR))
+		return 1
+	if os.path.exists(utils.SOCKET_PATH):
+		os.remove(utils.SOCKET_PATH)
+	signal.signal(signal.SIGTERM, signal.default_int_handler)
+	server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		server.bind(utils.SOCKET_PATH)
+		os.chmod(utils.SOCKET_PATH, 0o600)
+		server.listen()
+		print('Listening on {}'.format(utils.SOCKET_PATH))
+		sys.stdout.flush()
+		while True:
+			connection, _ = server.accept()
+			with connection:
+				try:
+					request = client.receive(connection)
+				except ValueError:
+					# Not a request, such as the probe of `is_running`
+					continue
+				response = handle(request, daccess, serve_request)
+				try:
+					client.send(connection, response)
+				except OSError:
+					# The client went away
+					pass
+	except KeyboardInterrupt:
+		return 0
+	finally:
+		server.close()
+		if os.path.exists(utils.SOCKET_PATH):
+			os.remove(utils.SOCKET_PATH)
+		daccess.exit()
+
+
+def is_running():
+	""" Return whether a daemon is listening on the socket of the data
+	directory."""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		try:
+			sock.connect(utils.SOCKET_PATH)
+		except OSError:
+			return False
+	return True
+
+
+def handle(request, daccess, serve_request):
+	""" Run the command of `request` (see client.request_daemon) and return
+	the response to send to the client."""
+	stdout = get_output_stream(request)
+	stderr = get_output_stream(request)
+	status = 0
+	cwd = os.getcwd()
+	set_environment(request)
+	try:
+		with redirect_stdout(stdout), redirect_stderr(stderr):
+			try:
+				served = serve_request(request['argv'][1:], daccess)
+			except SystemExit as error:
+				served = True
+				status = get_exit_status(error)
+			except Exception:
+				served = True
+				status = 1
+				traceback.print_exc()
+				daccess.rollback()
+	finally:
+		os.chdir(cwd)
+	return {
+		'fallback': not served,
+		'stdout': get_output(stdout, request),
+		'stderr': get_output(stderr, request),
+		'status': status,
+	}
+
+
+def set_environment(request):
+	os.chdir(request['cwd'])
+	sys.argv = request['argv']
+	utils.NOW = datetime.utcnow().replace(tzinfo=timezone.utc)
+	utils.TERMINAL_WIDTH = request['width']
+	environ = dict(request['environ'])
+	if environ['COLUMNS'] is None:
+		# Width of argparse's messages
+		environ['COLUMNS'] = str(request['width'])
+	for name, value in environ.items():
+		if value is None:
+			os.environ.pop(name, None)
+		else:
+			os.environ[name] = value
+	time.tzset()
+
+
+def get_output_stream(request):
+	""" Return a text stream which fails to encode the characters that the
+	client's standard output fails to encode, so that the fallbacks to ASCII
+	output are triggered alike."""
+	return io.TextIOWrapper(
+		io.BytesIO(),
+		encoding=request['encoding'],
+		errors=request['errors'],
+	)
+
+
+def get_output(stream, request):
+	stream.flush()
+	return stream.buffer.getvalue().decode(
+		request['encoding'], request['errors']
+	)
+
+
+def get_exit_status(error):
+	""" Return the exit status of the process exiting with the SystemExit
+	exception `error`, printing its message if it has one."""
+	if error.code is None:
+		return 0
+	if isinstance(error.code, int):
+		return error.code
+	print(error.code, file=sys.stderr)
+	return 1
@@ -1,70 +1,301 @@
-import sqlite3, json, os
+import bisect, sqlite3, os, re, time
 import os.path as op
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
 from datetime import datetime
 
-from . import utils, init_db
-from .utils import DATA_DIR, DB_PATH, DATAFILE_NAME, DATA_CTX_NAME
+from . import core, utils, init_db
+from .utils import (
+	DATA_DIR, DATABASE_NAME, DATAFILE_NAME, DATA_CTX_NAME, VER_FILE_NAME,
+	DATETIME_MIN,
+)
 
-DATETIME_MIN = '0001-01-01 00:00:00'
 END_OF_JSON = '2.1'
 
-
-def setup_data_access(current_version):
-	"""
-	Prepare the sqlite database so that it's ready to be used by the
-	application. It's supposed to work in any environment (new installation,
-	old version, etc) and will make any necessary conversion between different
-	versions (for example converting the json datafile from v2.2- into a
-	sqlite database)
-	"""
-	if not op.exists(DATA_DIR):
-		os.makedirs(DATA_DIR)
-
-	init_db.update_database(DB_PATH, current_version)
-	if current_version is not None \
-	and utils.compare_versions(current_version, END_OF_JSON) <= 0:
-		json_path = op.join(DATA_DIR, DATAFILE_NAME)
-		with open(json_path) as datafile:
-			data = json.load(datafile)
-		connection = sqlite3.connect(DB_PATH)
-		transfer_data(connection, data)
-
-
-def transfer_data(connection, data):
-	""" Transfer all data from a v2.2- JSON datafile held in the `data`
-	dictionary into a sqlite database connected to with `connection`."""
-	daccess = DataAccess(connection)
-	for ctx, props in data['contexts'].items():
-		ctx = dbfy_context(ctx)
+JOURNAL_MODES = ('delete', 'wal')
+
+# Maximum number of parameters of a statement in SQLite versions prior to 3.32
+MAX_VARIABLES = 999
+
+# Number of tasks inserted at once by `DataAccess.import_tasks`
+IMPORT_BATCH_SIZE = 1000
+
+# Triggers doing for each inserted task what `DataAccess.import_tasks` does
+# for each batch: setting the started flag (and through it the tallies of
+# contexts) and indexing the full text
+IMPORT_SUSPENDED_TRIGGERS = ('TaskStartedOnInsert', 'FullTextOnInsert')
+
+# Datetimes accepted in imported tasks: ISO 8601 (with or without the time)
+# and the SQLite format
+IMPORT_DATE_RE = re.compile(
+	r'(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}:\d{2})(?:\.\d+)?)?Z?$'
+)
+
+# Format of the datetimes of exported tasks (in UTC), for SQLite's strftime
+EXPORT_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def open_database(data_dir=DATA_DIR, timeout=5.0, progress=None):
+	""" Return a connection to the database of the data directory `data_dir`,
+	whose schema is brought up to date first if needed (see `setup_database`,
+	to which `progress` is given). `timeout` is the busy timeout of the
+	connection, in seconds.
+
+	When the schema is up to date, which is recorded in the database itself,
+	opening the database is all there is to do (but for checking whether the
+	SQLite library has FTS5 now, for databases created without it)."""
+	path = op.join(data_dir, DATABASE_NAME)
+	try:
+		connection = sqlite3.connect(path, timeout=timeout)
+	except sqlite3.OperationalError:
+		if op.exists(data_dir):
+			raise
+		os.makedirs(data_dir)
+		connection = sqlite3.connect(path, timeout=timeout)
+	if not init_db.is_up_to_date(connection):
+		setup_database(connection, data_dir, progress)
+	return connection
+
+
+def setup_database(connection, data_dir, progress=None):
+	""" Create the schema of the database of `connection`, or update it from
+	its schema version, in a single transaction. The version of databases
+	created before the schema version was recorded is the one of the version
+	file of `data_dir`. A v2.2- JSON datafile of `data_dir` is transferred
+	into a new database (see `transfer_data`, to which `progress` is given).
+	An interrupted setup leaves the database as it was and is run again by
+	the next connection."""
+	schema_version = init_db.get_schema_version(connection)
+	first_update, legacy_path = schema_version, None
+	if schema_version == 0:
+		first_update, legacy_path = get_unversioned_schema(connection, data_dir)
+	daccess = None
+	if legacy_path is not None:
+		# Created outside of the transaction, in which pragmas can't be set
+		daccess = DataAccess(connection, data_dir=data_dir)
+	connection.execute('BEGIN IMMEDIATE')
+	try:
+		# Another process may have set the database up in the meantime
+		if init_db.get_schema_version(connection) == schema_version:
+			init_db.update_database(connection, first_update)
+			if daccess is not None:
+				with open(legacy_path) as datafile:
+					transfer_data(daccess, datafile, progress)
+		connection.commit()
+	except BaseException:
+		connection.rollback()
+		raise
+
+
+def get_unversioned_schema(connection, data_dir):
+	""" Return a tuple (first_update, legacy_path) for the database of
+	`connection` whose schema version isn't recorded: the index of the first
+	statement of INIT_DB it lacks (see `init_db.get_first_update`), and the
+	path of the v2.2- JSON datafile to transfer into it or None."""
+	c = connection.cursor()
+	c.execute("""
+		SELECT 1 FROM sqlite_master
+		WHERE type = 'table' AND name = 'Task'
+	""")
+	exists = c.fetchone() is not None
+	version_path = op.join(data_dir, VER_FILE_NAME)
+	installed_version = None
+	if op.exists(version_path):
+		with open(version_path) as version_file:
+			installed_version = version_file.read()
+	if exists:
+		# Databases older than the version file are from version 3.0.1
+		return init_db.get_first_update(installed_version or '3.0.1'), None
+	legacy_path = op.join(data_dir, DATAFILE_NAME)
+	if op.exists(legacy_path) and (installed_version is None
+	or utils.compare_versions(installed_version, END_OF_JSON) <= 0):
+		return 0, legacy_path
+	return 0, None
+
+
+def transfer_data(daccess, datafile, progress=None):
+	""" Transfer all data from a v2.2- JSON datafile opened as `datafile`
+	into the database of the data access object `daccess`, and save it. The
+	datafile is read as it is transferred, so that its tasks are never all in
+	memory at once. `progress` is called with the number of tasks transferred
+	so far (see `DataAccess.import_tasks`)."""
+	from . import transfer
+	contexts = {}
+
+	def get_records():
+		members = transfer.iter_json_members(datafile, arrays=['tasks'])
+		for key, value in members:
+			if key == 'tasks':
+				yield get_legacy_record(value)
+			elif key == 'contexts':
+				contexts.update(value)
+
+	daccess.import_tasks(get_records(), progress)
+	for ctx, props in contexts.items():
 		options = []
 		if 'p' in props:
 			options.append(('priority', props['p']))
 		if 'v' in props and props['v'] == 'hidden':
 			options.append(('visibility', 'hidden'))
-		daccess.get_or_create_context(ctx, options)
-	for task in data['tasks']:
-		title = task['content']
-		if 'context' in task:
-			ctx = dbfy_context(task['context'])
-			daccess.get_or_create_context(ctx)
+		if options:
+			daccess.set_context(dbfy_context(ctx), options)
 		else:
-			ctx = ''
-
-		options = []
-		if 'created' in task:
-			created = iso2sqlite(task['created'])
+			daccess.get_or_create_context(dbfy_context(ctx))
+	daccess.save()
+
+
+def update_contexts_file(path, changes, get_paths):
+	""" Apply `changes`, a list of (DB path, change) pairs in the order they
+	were made, to the contexts file at `path`: the user paths of all non-root
+	contexts, one per line, sorted. The change is True if the context was
+	created, False if it was removed with its descendants, or its new DB path
+	if it was renamed with them.
+	If the file doesn't exist, it's written from the DB paths of all contexts
+	returned by `get_paths()`.
+
+	The file is written aside and renamed over the previous one, so that it's
+	never read partially written, and writers wait for each other on a lock
+	file."""
+	with locked(path + '.lock'):
+		if op.exists(path):
+			with open(path) as ctx_file:
+				lines = ctx_file.read().splitlines()
+			apply_context_changes(lines, changes)
+		else:
+			lines = sorted(userify_context(ctx) for ctx in get_paths())
+		temp_path = path + '.tmp'
+		with open(temp_path, 'w') as ctx_file:
+			ctx_file.writelines(line + '\n' for line in lines if line != '')
+		os.replace(temp_path, path)
+
+
+@contextmanager
+def locked(lock_path):
+	""" Hold an exclusive lock on the file at `lock_path`, created if needed,
+	waiting for other processes holding it: with flock on POSIX systems, and
+	msvcrt.locking otherwise (which gives up with an OSError after 10 tries).
+	"""
+	with open(lock_path, 'w') as lock_file:
+		if os.name == 'posix':
+			import fcntl
+			fcntl.flock(lock_file, fcntl.LOCK_EX)
+			yield
 		else:
-			created = DATETIME_MIN
-		options.append(('created', created))
-		for prop in ['start', 'deadline']:
-			if prop in task:
-				options.append((prop, iso2sqlite(task[prop])))
-		if 'done' in task and task['done']:
-			options.append(('done', '1'))
-		if 'priority' in task:
-			options.append(('priority', task['priority']))
-		daccess.add_task(title, None, ctx, options)
-	daccess.exit()
+			import msvcrt
+			msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+			try:
+				yield
+			finally:
+				lock_file.seek(0)
+				msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def apply_context_changes(lines, changes):
+	""" Apply `changes` (see `update_contexts_file`) to the sorted list `lines`
+	of user paths, finding the contexts and their descendants by binary
+	search."""
+	for ctx, change in changes:
+		ctx = userify_context(ctx)
+		if change is True:
+			index = bisect.bisect_left(lines, ctx)
+			if index == len(lines) or lines[index] != ctx:
+				lines.insert(index, ctx)
+			continue
+		descendants = pop_subtree(lines, ctx)
+		if change is not False:
+			renamed = userify_context(change)
+			pop_subtree(lines, renamed)
+			bisect.insort(lines, renamed)
+			index = bisect.bisect_left(lines, renamed + '.')
+			lines[index:index] = [
+				renamed + line[len(ctx):] for line in descendants
+			]
+
+
+def pop_subtree(lines, ctx):
+	""" Remove the user path `ctx` and the ones of its descendants from the
+	sorted list `lines`, and return the latter. The descendants are contiguous
+	in the list, unlike the context itself (e.g. `a-b` is between `a` and
+	`a.b`)."""
+	index = bisect.bisect_left(lines, ctx)
+	if index < len(lines) and lines[index] == ctx:
+		del lines[index]
+	if ctx == '':
+		start, end = 0, len(lines)
+	else:
+		# '/' is the character following '.'
+		start = bisect.bisect_left(lines, ctx + '.')
+		end = bisect.bisect_left(lines, ctx + '/')
+	descendants = lines[start:end]
+	del lines[start:end]
+	return descendants
+
+
+def get_legacy_record(task):
+	""" Return the record (see `get_task_values`) of the task `task` of a
+	v2.2- JSON datafile."""
+	record = {
+		key: task[key]
+		for key in ['context', 'start', 'deadline', 'done', 'priority']
+		if key in task
+	}
+	record['title'] = task['content']
+	record['created'] = task.get('created', DATETIME_MIN)
+	return record
+
+
+def get_task_values(record, now):
+	""" Return the dictionary of the values of the columns of the task
+	described by the dictionary `record`, whose keys are:
+	 * title: required
+	 * content
+	 * created, start, deadline: datetimes in the ISO 8601 format (in UTC) or
+	   the SQLite format. The creation defaults to `now` and the start to the
+	   creation.
+	 * done: True or the datetime the task was done
+	 * priority, period (in seconds): integers
+	 * front: boolean
+	 * done_history: list of the datetimes the occurrences of the (recurring)
+	   task were done
+	The context of the task isn't part of the values.
+
+	Raise ValueError if the record is invalid."""
+	title = record.get('title')
+	if not isinstance(title, str) or title == '':
+		raise ValueError('missing title')
+	values = {
+		'title': title,
+		'content': record.get('content'),
+		'created': get_sqlite_date(record.get('created'), now),
+		'deadline': get_sqlite_date(record.get('deadline')),
+		'priority': int(record.get('priority', 1)),
+		'period': record.get('period'),
+		'front': 1 if record.get('front') else None,
+	}
+	values['start'] = get_sqlite_date(record.get('start'), values['created'])
+	done = record.get('done')
+	if done is True:
+		values['done'] = now
+	else:
+		values['done'] = get_sqlite_date(done or None)
+	if values['period'] is not None:
+		values['period'] = int(values['period'])
+	values['done_history'] = [
+		get_sqlite_date(dt) for dt in record.get('done_history', [])
+	]
+	return values
+
+
+def get_sqlite_date(value, default=None):
+	""" Return the datetime string `value` (see `IMPORT_DATE_RE`) in the SQLite
+	format, or `default` if `value` is None."""
+	if value is None:
+		return default
+	match = IMPORT_DATE_RE.match(str(value))
+	if match is None:
+		raise ValueError('invalid datetime: {}'.format(value))
+	date, time_ = match.groups()
+	return '{} {}'.format(date, time_ or '00:00:00')
 
 
 # In the database, contexts all descent from the root context ('') and any
@@ -91,10 +322,81 @@ def userify_context(ctx):
 	else:
 		return ctx[1:]
 
-# This one is used by transfer_data
-def iso2sqlite(iso_date):
-	dt = datetime.strptime(iso_date, utils.ISO_DATE)
-	return dt.strftime(utils.SQLITE_DT_FORMAT)
+
+def get_chunks(values, size=MAX_VARIABLES):
+	""" Split the `values` collection into lists of at most `size` values, so
+	that each list can be the parameters of an `IN (...)` clause."""
+	values = list(values)
+	return [values[i:i+size] for i in range(0, len(values), size)]
+
+
+def get_placeholders(values):
+	return ', '.join('?' * len(values))
+
+
+def get_unmatched_ids(tids, matched, once):
+	""" Return the list of the IDs of the `tids` list which aren't in the
+	`matched` set, in order. If `once` is True, an ID repeated in `tids` is
+	only matched by its first occurrence, as the operation applied to the
+	matched IDs can't be applied twice (removing a task, etc)."""
+	unmatched = []
+	seen = set()
+	for tid in tids:
+		if tid not in matched or once and tid in seen:
+			unmatched.append(tid)
+		seen.add(tid)
+	return unmatched
+
+
+def get_cyclic_tasks(edges):
+	""" Return the set of the tasks of the dependency graph `edges` (mapping
+	tasks to the list of their dependencies) which are part of a cycle or
+	depend on one: the tasks left once the tasks not depending on any task
+	left are repeatedly removed (Kahn's algorithm)."""
+	dependers = defaultdict(list)
+	remaining = {}
+	for task_id, dependency_ids in edges.items():
+		remaining[task_id] = len(set(dependency_ids))
+		for dependency_id in set(dependency_ids):
+			dependers[dependency_id].append(task_id)
+	ready = deque(
+		dependency_id for dependency_id in dependers
+		if remaining.get(dependency_id, 0) == 0
+	)
+	while ready:
+		for depender in dependers[ready.popleft()]:
+			remaining[depender] -= 1
+			if remaining[depender] == 0:
+				ready.append(depender)
+	return {task_id for task_id, count in remaining.items() if count > 0}
+
+
+def find_cycle(edges, cyclic):
+	""" Return a cycle of the dependency graph `edges` among the `cyclic`
+	tasks (see `get_cyclic_tasks`), as a list of tasks starting and ending
+	with the same task, each depending on the next one."""
+	# Every cyclic task depends on a cyclic task, so following dependencies
+	# from one eventually comes back to a task already visited.
+	path = [next(iter(cyclic))]
+	positions = {path[0]: 0}
+	while True:
+		task_id = next(d for d in edges[path[-1]] if d in cyclic)
+		if task_id in positions:
+			return path[positions[task_id]:] + [task_id]
+		positions[task_id] = len(path)
+		path.append(task_id)
+
+
+def is_busy_error(error):
+	""" Return whether the sqlite3 exception `error` is due to the database
+	being locked by another connection."""
+	return 'is locked' in str(error)
+
+
+def get_now_timestamp():
+	""" Return the current time as an integer Unix timestamp, to be compared
+	with the `*_ts` columns of tasks."""
+	return int(time.time())
 
 
 def get_insert_components(options):
@@ -124,6 +426,71 @@ def get_update_components(options):
 	return placeholders, values
 
 
+def get_search_filters(ctx, done, before, after):
+	""" Return a tuple (conditions, values) with the SQL conditions (to be
+	added to a WHERE clause on Task t) and their values implementing the
+	filters common to search methods. See DataAccess.search."""
+	conditions = """
+		AND t.context IN (
+			SELECT descendant FROM ContextClosure
+			WHERE ancestor = (
+				SELECT id FROM Context
+				WHERE path = ?
+			)
+		)
+	"""
+	values = (ctx,)
+	if done is not None:
+		cond = 'IS NOT NULL' if done else 'IS NULL'
+		conditions += """
+			AND t.done {}
+		""".format(cond)
+	if before is not None:
+		conditions += """
+			AND t.created_ts < ?
+		"""
+		values = values + (utils.sqlite_date_to_timestamp(before),)
+	if after is not None:
+		conditions += """
+			AND t.created_ts > ?
+		"""
+		values = values + (utils.sqlite_date_to_timestamp(after),)
+	return conditions, values
+
+
+def get_search_condition(term, case):
+	""" Return a tuple (condition, values) with the SQL condition (on Task t)
+	and its values implementing the term of `DataAccess.search`: the term is
+	a substring of the title or of the content, case-insensitively (for
+	ASCII characters) unless `case` is True. The triggers of saved searches
+	(see init_db) match tasks the same way."""
+	if case:
+		condition = '(instr(t.title, ?) > 0 OR instr(t.content, ?) > 0)'
+	else:
+		condition = """(
+			instr(lower(t.title), lower(?)) > 0
+			OR instr(lower(t.content), lower(?)) > 0
+		)"""
+	return condition, (term, term)
+
+
+def get_full_text_query(term):
+	""" Convert user-typed words into a FTS5 query matching all of them. Each
+	word is quoted so that punctuation isn't interpreted as FTS5 syntax,
+	except for a trailing star which makes a prefix query."""
+	phrases = []
+	for word in term.split():
+		prefix = word.endswith('*')
+		word = word.rstrip('*')
+		if word == '':
+			continue
+		phrase = '"{}"'.format(word.replace('"', '""'))
+		if prefix:
+			phrase += '*'
+		phrases.append(phrase)
+	return ' '.join(phrases)
+
+
 def check_options(options, allowed_options):
 	for option, val in options:
 		if option not in allowed_options:
@@ -162,7 +529,9 @@ def return_row_task(method):
 	"""
 	def deserialized_method(self, *args, **kwargs):
 		result = method(self, *args, **kwargs)
-		if isinstance(result, list):
+		if result is None:
+			return None
+		elif isinstance(result, list):
 			return [self._deserialize_row_task(t) for t in result]
 		else:
 			return self._deserialize_row_task(result)
@@ -182,9 +551,17 @@ class DataAccess():
 	task with the following keys:
 	 * All columns from the Task table
 	 * ctx_path: the path of the task's context.
-	 * last_done: if the task is a recurring one, the last time the task was done
+	 * last_done: if the task is a recurring one, the last time the task was
+	   done (a column of Task, maintained by a trigger on TaskDoneHistory)
 	 * [Optional] dependencies_ids: comma-separated list of dependencies
 
+	For recurring tasks, the Task columns last_occurrence and next_occurrence
+	hold the boundaries of the current period. Methods listing tasks bring
+	them up to date before querying, so that whether the current period of a
+	task is done can be evaluated by SQLite. Listings never wait for the write
+	lock to do so (see `_write_catch_up`): while another connection holds it,
+	the boundaries that are due are computed for the listing only.
+
 	Row-context objects represent a context with the following keys: id, path,
 	priority, visibility, own_tasks, total_tasks where own_tasks is the number
 	of tasks which directly belong to the context and total_tasks is the
@@ -209,23 +586,53 @@ class DataAccess():
 	in the form (column name, value).
 	"""
 
-	def __init__(self, connection):
+	def __init__(self, connection, journal_mode=None, data_dir=DATA_DIR):
+		""" If `journal_mode` is given (one of JOURNAL_MODES), the database is
+		switched to this journal mode if it isn't already in it. In WAL mode,
+		readers don't block writers and commits are synced at checkpoints
+		only, which is durable enough and can't corrupt the database.
+		`data_dir` is the data directory where the contexts file is saved."""
 		self.connection = connection
-		self.case_sensitive_like = False
-		self.set_case_sensitive_like(True)
+		self.data_dir = data_dir
+		# Transactions take the write lock upfront, so that a writer waits
+		# for another one (up to the busy timeout of the connection) instead
+		# of failing when upgrading its read lock
+		self.connection.isolation_level = 'IMMEDIATE'
 		c = self.connection.cursor()
 		c.execute('PRAGMA foreign_keys = ON;')
-		c.execute('PRAGMA synchronous = OFF;')
+		if journal_mode is not None:
+			journal_mode = self._switch_journal_mode(journal_mode)
+		if journal_mode == 'wal':
+			c.execute('PRAGMA synchronous = NORMAL;')
+		else:
+			c.execute('PRAGMA synchronous = OFF;')
 		self.connection.row_factory = sqlite3.Row
-		self.changed_contexts = False
-
-	def set_case_sensitive_like(self, switch=True):
-		if self.case_sensitive_like == switch:
-			return
-		value = 'ON' if switch else 'OFF'
+		# Contexts created, removed or renamed since the last save, for the
+		# contexts file (see `update_contexts_file`)
+		self.context_changes = []
+		# Cache of the IDs of contexts by path (see `_get_context_ids`)
+		self.context_ids = {}
+		self.data_version = None
+
+	def _switch_journal_mode(self, journal_mode):
+		""" Switch the database to `journal_mode` if needed and return the
+		journal mode the database is in. The switch requires that no other
+		process uses the database: if one does, the database stays in its
+		current mode and the switch is attempted again next time."""
+		if journal_mode not in JOURNAL_MODES:
+			raise ValueError('Unknown journal mode: {}'.format(journal_mode))
 		c = self.connection.cursor()
-		c.execute('PRAGMA case_sensitive_like = {};'.format(value))
-		self.case_sensitive_like = switch
+		c.execute('PRAGMA journal_mode;')
+		current = c.fetchone()[0].lower()
+		if current != journal_mode:
+			try:
+				c.execute('PRAGMA journal_mode = {};'.format(journal_mode))
+			except sqlite3.OperationalError as error:
+				if not is_busy_error(error):
+					raise
+			else:
+				current = c.fetchone()[0].lower()
+		return current
 
 	@staticmethod
 	def _deserialize_row_task(row_task: dict):
@@ -259,6 +666,175 @@ class DataAccess():
 		c.execute(query, values)
 		return c.lastrowid
 
+	def import_tasks(self, records, progress=None):
+		""" Add the tasks described by the `records` iterable of dictionaries
+		(see `get_task_values`), in batches, creating their contexts (the
+		`context` key of records, a user path) as needed. A record may have an
+		`id` key, which the `depends_on` lists of other records refer to.
+		`progress` is called with the number of tasks imported so far after
+		each batch.
+
+		Return a dictionary with the number of imported tasks (`count`), the
+		list of the IDs of `depends_on` lists that no record has
+		(`unexisting_dependencies`), and a cycle of dependencies (as a list of
+		records' IDs, see `find_dependency_cycle`) if some were left out
+		because they form cycles, or None (`cycle`).
+
+		Raise ValueError if a record is invalid."""
+		now = datetime.utcnow().strftime(utils.SQLITE_DT_FORMAT)
+		c = self.connection.cursor()
+		# Tasks are given their IDs upfront so that the dependencies between
+		# them can be resolved without looking them up. This is done in the
+		# write transaction begun by _suspend_triggers, so that no other
+		# connection adds a task with one of these IDs in the meantime.
+		with self._suspend_triggers(IMPORT_SUSPENDED_TRIGGERS) as suspended:
+			c.execute("""
+				SELECT max(
+					COALESCE((SELECT max(id) FROM Task), 0),
+					COALESCE(
+						(SELECT seq FROM sqlite_sequence WHERE name = 'Task'), 0
+					)
+				)
+			""")
+			last_id = c.fetchone()[0]
+			first_id = last_id + 1
+			context_ids = {}
+			ids = {}
+			dependencies = []
+			tasks, history = [], []
+			# Number of undone started tasks of the batch by context
+			tallies = Counter()
+
+			def flush():
+				c.executemany("""
+					INSERT INTO Task (
+						id, title, content, context, created, start, deadline,
+						done, priority, period, front, started
+					)
+					VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+				""", tasks)
+				c.executemany("""
+					INSERT INTO TaskDoneHistory (task_id, done_datetime)
+					VALUES (?, ?)
+				""", history)
+				self._add_to_tallies(tallies)
+				if 'FullTextOnInsert' in suspended:
+					c.execute("""
+						INSERT INTO TaskFullText (rowid, title, content)
+						SELECT id, title, content FROM Task
+						WHERE id >= ?
+					""", (tasks[0][0],))
+				tasks.clear()
+				history.clear()
+				tallies.clear()
+				if progress is not None:
+					progress(last_id - first_id + 1)
+
+			for number, record in enumerate(records, 1):
+				try:
+					values = get_task_values(record, now)
+				except (TypeError, ValueError) as error:
+					raise ValueError('Task {}: {}'.format(number, error))
+				last_id += 1
+				ctx = dbfy_context(record.get('context') or '')
+				if ctx not in context_ids:
+					context_ids[ctx] = self.get_or_create_context(ctx)
+				started = values['start'] <= now
+				tasks.append((
+					last_id, values['title'], values['content'],
+					context_ids[ctx], values['created'], values['start'],
+					values['deadline'], values['done'], values['priority'],
+					values['period'], values['front'], started,
+				))
+				if started and values['done'] is None:
+					tallies[context_ids[ctx]] += 1
+				history.extend((last_id, dt) for dt in values['done_history'])
+				if record.get('id') is not None:
+					ids[str(record['id'])] = last_id
+				if record.get('depends_on'):
+					dependencies.append((last_id, record['depends_on']))
+				if len(tasks) == IMPORT_BATCH_SIZE:
+					flush()
+			if tasks:
+				flush()
+
+		edges = defaultdict(list)
+		unexisting_dependencies = []
+		for task_id, dependency_ids in dependencies:
+			for dependency_id in dependency_ids:
+				if str(dependency_id) in ids:
+					edges[task_id].append(ids[str(dependency_id)])
+				else:
+					unexisting_dependencies.append(dependency_id)
+		cyclic = get_cyclic_tasks(edges)
+		cycle = None
+		if cyclic:
+			record_ids = {tid: rid for rid, tid in ids.items()}
+			cycle = [record_ids[tid] for tid in find_cycle(edges, cyclic)]
+		c.executemany("""
+			INSERT INTO TaskDependency (task_id, dependency_id)
+			VALUES (?, ?)
+		""", [
+			(task_id, dependency_id)
+			for task_id, dependency_ids in edges.items()
+			for dependency_id in set(dependency_ids)
+			if task_id not in cyclic or dependency_id not in cyclic
+		])
+		return {
+			'count': last_id - first_id + 1,
+			'unexisting_dependencies': unexisting_dependencies,
+			'cycle': cycle,
+		}
+
+	@contextmanager
+	def _suspend_triggers(self, names):
+		""" Drop the triggers among `names` that the database has for the
+		duration of the block, whose value is the set of their names, and
+		create them again afterwards from their definitions. This is done in
+		the write transaction, which is begun if needed, so that other
+		connections never see the database without them."""
+		c = self.connection.cursor()
+		if not self.connection.in_transaction:
+			c.execute('BEGIN IMMEDIATE')
+		c.execute("""
+			SELECT name, sql FROM sqlite_master
+			WHERE type = 'trigger' AND name IN ({})
+		""".format(', '.join('?' * len(names))), names)
+		definitions = dict(c.fetchall())
+		for name in definitions:
+			c.execute('DROP TRIGGER `{}`'.format(name))
+		try:
+			yield set(definitions)
+		finally:
+			# Unless an error already rolled the transaction back
+			if self.connection.in_transaction:
+				for definition in definitions.values():
+					c.execute(definition)
+
+	def _add_to_tallies(self, counts):
+		""" Add to the tallies of contexts the numbers of undone started
+		tasks added to them, `counts` mapping context IDs to numbers, as
+		TaskTallyOnUpdate does for a single task."""
+		rows = [
+			{'context': context, 'count': count}
+			for context, count in counts.items()
+		]
+		c = self.connection.cursor()
+		c.executemany("""
+			UPDATE Context SET own_tasks = own_tasks + :count
+			WHERE id = :context
+		""", rows)
+		c.executemany("""
+			UPDATE Context SET
+			  total_tasks = total_tasks + :count,
+			  visible_tasks = visible_tasks + :count * (
+				SELECT visibility = 'normal' FROM Context WHERE id = :context
+			  )
+			WHERE id IN (
+				SELECT ancestor FROM ContextClosure WHERE descendant = :context
+			)
+		""", rows)
+
 	def update_task(self, tid, context=None, options=None):
 		""" Update the task identified by ID `tid` (int) with the given
 		`options`. If the context of the task needs to be updated as well,
@@ -305,12 +881,7 @@ class DataAccess():
 		query = """
 			SELECT
 			  t.*,
-			  c.path as ctx_path,
-			  (
-			  	SELECT max(done_datetime)
-			  	FROM TaskDoneHistory
-			  	WHERE task_id = t.id
-			  ) as last_done
+			  c.path as ctx_path
 			FROM Task t JOIN Context c
 			ON t.context = c.id
 			WHERE t.id = ?
@@ -323,44 +894,241 @@ class DataAccess():
 		return row
 
 	def set_task_dependencies(self, tid, dependencies):
-		# Remove any existing dependencies
+		""" Replace the dependencies of the task `tid` by the tasks of the
+		`dependencies` list of IDs. Return the list of the IDs which don't
+		identify a task, and which are left out."""
 		c = self.connection.cursor()
 		c.execute("""
 			DELETE FROM TaskDependency
 			WHERE task_id = ?
 		""", (tid,))
 
-		# Add the new dependencies
+		existing = self._select_ids('1', dependencies)
 		unexisting_dependencies = []
+		new_dependencies = []
 		for dependency_id in dependencies:
-			# Check that the dependency actually exists
-			c.execute("""
-				SELECT 1 FROM Task
-				WHERE id = ?
-			""", (dependency_id,))
-			if c.fetchone() is None:
+			if dependency_id not in existing:
 				unexisting_dependencies.append(dependency_id)
+			elif dependency_id not in new_dependencies:
+				new_dependencies.append(dependency_id)
+
+		c.executemany("""
+			INSERT INTO TaskDependency (task_id, dependency_id)
+			VALUES (?, ?)
+		""", [(tid, dependency_id) for dependency_id in new_dependencies])
+
+		return unexisting_dependencies
+
+	def get_dependency_chain(self, tid, downstream=False, max_depth=None):
+		""" Return the tasks that the task `tid` depends on, directly or
+		through other tasks, or the tasks that depend on it if `downstream` is
+		True. Tasks are dictionaries with the keys `id`, `title`, `done`,
+		`ctx_path` and `depth`, the length of the shortest dependency path
+		between the task `tid` and the task, which is at most `max_depth` if
+		given. They're sorted by depth, then ID."""
+		if downstream:
+			source, target = 'dependency_id', 'task_id'
+		else:
+			source, target = 'task_id', 'dependency_id'
+		# The edges reachable from the task, which are finite even if the
+		# graph has cycles, unlike paths. Given `max_depth`, only the ones
+		# reachable within `max_depth` edges are followed, along with their
+		# depth (an edge may then be reached at several depths, which are
+		# bounded).
+		if max_depth is None:
+			depth, first_depth, next_depth, depth_limit = '', '', '', ''
+		else:
+			depth, first_depth = ', depth', ', 1'
+			next_depth = ', e.depth + 1'
+			depth_limit = 'WHERE e.depth < :max_depth'
+		c = self.connection.cursor()
+		c.execute("""
+			WITH RECURSIVE Edge(source, target{depth}) AS (
+				SELECT {source}, {target}{first_depth}
+				FROM TaskDependency
+				WHERE {source} = :tid
+				UNION
+				SELECT td.{source}, td.{target}{next_depth}
+				FROM TaskDependency td JOIN Edge e
+				ON td.{source} = e.target
+				{depth_limit}
+			)
+			SELECT
+			  e.source,
+			  t.id,
+			  t.title,
+			  t.done,
+			  c.path as ctx_path
+			FROM Edge e
+			JOIN Task t ON t.id = e.target
+			JOIN Context c ON t.context = c.id
+		""".format(
+			source=source, target=target, depth=depth, first_depth=first_depth,
+			next_depth=next_depth, depth_limit=depth_limit,
+		), {'tid': tid, 'max_depth': max_depth})
+		successors = defaultdict(list)
+		tasks = {}
+		for row in c:
+			successors[row['source']].append(row['id'])
+			tasks[row['id']] = row
+
+		chain = []
+		depths = {tid: 0}
+		queue = deque([tid])
+		while queue:
+			task_id = queue.popleft()
+			depth = depths[task_id]
+			if depth == max_depth:
 				continue
+			for successor in successors[task_id]:
+				if successor not in depths:
+					depths[successor] = depth + 1
+					queue.append(successor)
+					task = dict(tasks[successor], depth=depth + 1)
+					del task['source']
+					chain.append(task)
+		chain.sort(key=lambda task: (task['depth'], task['id']))
+		return chain
+
+	def find_dependency_cycle(self, tid, dependencies):
+		""" Return the cycle that making the task `tid` depend on the tasks of
+		the `dependencies` list of IDs would create, as the list of the IDs of
+		the tasks of the cycle, starting and ending with `tid`, each task
+		depending on the next one. Return None if there would be no cycle."""
+		if tid in dependencies:
+			return [tid, tid]
+		# Dependency edges leading to `tid`, which only cover the part of the
+		# graph that depends on the task.
+		c = self.connection.cursor()
+		c.execute("""
+			WITH RECURSIVE Edge(task_id, dependency_id) AS (
+				SELECT task_id, dependency_id
+				FROM TaskDependency
+				WHERE dependency_id = :tid
+				UNION
+				SELECT td.task_id, td.dependency_id
+				FROM TaskDependency td JOIN Edge e
+				ON td.dependency_id = e.task_id
+			)
+			SELECT task_id, dependency_id FROM Edge
+		""", {'tid': tid})
+		edges = defaultdict(list)
+		for task_id, dependency_id in c:
+			edges[task_id].append(dependency_id)
+
+		# Breadth-first search of the shortest path from one of the
+		# dependencies to `tid`
+		previous = {}
+		queue = deque()
+		for dependency_id in dependencies:
+			if dependency_id in edges and dependency_id not in previous:
+				previous[dependency_id] = None
+				queue.append(dependency_id)
+		while queue:
+			task_id = queue.popleft()
+			for dependency_id in edges[task_id]:
+				if dependency_id == tid:
+					path = []
+					while task_id is not None:
+						path.append(task_id)
+						task_id = previous[task_id]
+					return [tid] + path[::-1] + [tid]
+				if dependency_id not in previous:
+					previous[dependency_id] = task_id
+					queue.append(dependency_id)
+		return None
 
-			# Add it
+	@return_row_task
+	def get_tasks(self, tids):
+		""" Return the list of Row-tasks (see `get_task`) identified by the IDs
+		of the `tids` list, in no particular order. Unexisting tasks are left
+		out."""
+		tasks = []
+		for chunk in get_chunks(set(tids)):
+			c = self.connection.cursor()
+			c.execute("""
+				SELECT
+				  t.*,
+				  c.path as ctx_path
+				FROM Task t JOIN Context c
+				ON t.context = c.id
+				WHERE t.id IN ({})
+			""".format(get_placeholders(chunk)), chunk)
+			tasks.extend(c.fetchall())
+		return tasks
+
+	def _select_ids(self, condition, tids):
+		""" Return the set of the IDs of the `tids` list identifying existing
+		tasks which match the SQL `condition`."""
+		ids = set()
+		for chunk in get_chunks(set(tids)):
+			c = self.connection.cursor()
 			c.execute("""
-				INSERT INTO TaskDependency (task_id, dependency_id)
-				VALUES (?, ?)
-			""", (tid, dependency_id))
+				SELECT id FROM Task
+				WHERE ({})
+				  AND id IN ({})
+			""".format(condition, get_placeholders(chunk)), chunk)
+			ids.update(row[0] for row in c)
+		return ids
+
+	def _execute_on_ids(self, statement, tids, params=()):
+		""" Execute the SQL `statement`, which ends with an `IN ({})` clause,
+		for the IDs of the `tids` collection, in as few executions as the
+		maximum number of parameters allows. `params` are parameters preceding
+		the IDs in the statement."""
+		for chunk in get_chunks(tids, MAX_VARIABLES - len(params)):
+			c = self.connection.cursor()
+			c.execute(
+				statement.format(get_placeholders(chunk)),
+				tuple(params) + tuple(chunk)
+			)
 
-		return unexisting_dependencies
-		
-
-	def do_many(self, function, tids):
-		""" Call the method `function` for each task ID in the `tids` list.
-		`function` should accept only one positional argument (in addition to
-		self) which is a task ID."""
-		missing = []
-		for tid in tids:
-			updated = getattr(self, function)(tid)
-			if updated == 0:
-				missing.append(tid)
-		return missing
+	def set_done_many(self, tids):
+		""" Set the undone tasks identified by the IDs of the `tids` list as
+		done."""
+		self._execute_on_ids("""
+			UPDATE Task SET done = datetime('now')
+			WHERE done IS NULL
+			  AND id IN ({})
+		""", set(tids))
+
+	def set_undone_many(self, tids):
+		""" Set the done tasks identified by the IDs of the `tids` list as
+		undone. Return the list of the IDs that didn't identify a done task
+		(see `get_unmatched_ids`)."""
+		done = self._select_ids('done IS NOT NULL', tids)
+		self._execute_on_ids("""
+			UPDATE Task SET done = NULL
+			WHERE id IN ({})
+		""", done)
+		return get_unmatched_ids(tids, done, once=True)
+
+	def remove_many(self, tids):
+		""" Remove the tasks identified by the IDs of the `tids` list. Return
+		the list of the IDs that didn't identify a task (see
+		`get_unmatched_ids`)."""
+		existing = self._select_ids('1', tids)
+		self._execute_on_ids("""
+			DELETE FROM Task
+			WHERE id IN ({})
+		""", existing)
+		return get_unmatched_ids(tids, existing, once=True)
+
+	def ping_many(self, tids):
+		""" Ping the tasks identified by the IDs of the `tids` list, as many
+		times as they appear in the list. Return the list of the IDs that
+		didn't identify a task (see `get_unmatched_ids`)."""
+		existing = self._select_ids('1', tids)
+		counts = Counter(tid for tid in tids if tid in existing)
+		ids_by_count = defaultdict(list)
+		for tid, count in counts.items():
+			ids_by_count[count].append(tid)
+		for count, ids in ids_by_count.items():
+			self._execute_on_ids("""
+				UPDATE Task SET ping = ping + ?
+				WHERE id IN ({})
+			""", ids, (count,))
+		return get_unmatched_ids(tids, existing, once=False)
 
 	def set_done(self, tid):
 		c = self.connection.cursor()
@@ -405,52 +1173,99 @@ class DataAccess():
 
 		Return the ID of the context."""
 		check_options(options, CONTEXT_OPTIONS)
-		ctxs = path.split('.')[1:-1]
-		path_so_far = ''
+		context_ids = self._get_context_ids()
+		if path in context_ids:
+			return context_ids[path]
+
+		# Paths from the root context to the context. The contexts that
+		# already exist come first, as the ancestors of a context exist, and
+		# the ones up to the deepest cached context are known to exist.
+		parts = path.split('.')
+		paths = ['.'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+		first_unknown = len(paths) - 1
+		while first_unknown > 1 and paths[first_unknown - 1] not in context_ids:
+			first_unknown -= 1
 		c = self.connection.cursor()
-		for ctx in ctxs:
-			path_so_far += '.'+ctx
-			try:
-				c.execute("""
-					INSERT INTO Context (path)
-					VALUES (?)
-				""", (path_so_far,))
-			except sqlite3.IntegrityError: # Already exists
-				continue
-			else:
-				self.changed_contexts = True
-
-		query_tmp = """
-			INSERT INTO Context (path {})
-			VALUES (? {})
-		"""
-		col_names, placeholders, values = get_insert_components(options)
-		query = query_tmp.format(col_names, placeholders)
-
-		try:
-			c.execute(query, (path,) + values)
-		except sqlite3.IntegrityError as e:
-			c2 = self.connection.cursor()
-			c2.execute("""
-				SELECT id FROM Context
-				WHERE path = ?
-			""", (path,))
-			row = c2.fetchone()
-			return row[0]
-		else:
-			self.changed_contexts = True
-			return c.lastrowid
+		c.executemany("""
+			INSERT OR IGNORE INTO Context (path)
+			VALUES (?)
+		""", [(p,) for p in paths[first_unknown:]])
+		created = c.rowcount
+		if created == 0:
+			return self._get_context_id(path)
+
+		ids = self._fetch_context_ids(paths)
+		self._link_contexts(ids, len(paths) - created)
+		for created_path in paths[len(paths) - created:]:
+			self.context_changes.append((created_path, True))
+		if options:
+			placeholders, values = get_update_components(options)
+			c.execute("""
+				UPDATE Context SET {}
+				WHERE id = ?
+			""".format(placeholders), values + (ids[-1],))
+		return ids[-1]
 
-	def context_exists(self, path):
-		""" Return a boolean indicating whether the context pointed to by the
-		dotted path `path` exists."""
+	def _fetch_context_ids(self, paths):
+		""" Return the list of the IDs of the contexts pointed to by the
+		`paths` list, which must exist, and cache them."""
 		c = self.connection.cursor()
 		c.execute("""
-			SELECT 1 FROM Context
+			SELECT path, id FROM Context
+			WHERE path IN ({})
+		""".format(get_placeholders(paths)), paths)
+		self.context_ids.update(c.fetchall())
+		return [self.context_ids[p] for p in paths]
+
+	def _link_contexts(self, ids, first_created):
+		""" Insert the closure rows of the newly created contexts of the
+		chain of contexts identified by `ids`, from the root context to the
+		deepest one, the contexts from the index `first_created` being the new
+		ones: each context is its own ancestor at depth 0, and a descendant of
+		the contexts preceding it in the chain."""
+		c = self.connection.cursor()
+		c.executemany("""
+			INSERT INTO ContextClosure (ancestor, descendant, depth)
+			VALUES (?, ?, ?)
+		""", [
+			(ids[i], ids[j], j - i)
+			for j in range(first_created, len(ids))
+			for i in range(j + 1)
+		])
+
+	def _get_context_ids(self):
+		""" Return the cache mapping the paths of contexts to their IDs. The
+		cache is emptied when another connection commits changes to the
+		database, as it may have renamed or removed contexts."""
+		c = self.connection.cursor()
+		c.execute('PRAGMA data_version;')
+		data_version = c.fetchone()[0]
+		if data_version != self.data_version:
+			self.context_ids.clear()
+			self.data_version = data_version
+		return self.context_ids
+
+	def _get_context_id(self, path):
+		""" Return the ID of the context pointed to by `path`, or None if it
+		doesn't exist."""
+		context_ids = self._get_context_ids()
+		if path in context_ids:
+			return context_ids[path]
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT id FROM Context
 			WHERE path = ?
 		""", (path,))
 		row = c.fetchone()
-		return row is not None
+		if row is None:
+			return None
+		context_ids[path] = row[0]
+		return row[0]
+
+	def context_exists(self, path):
+		""" Return a boolean indicating whether the context pointed to by the
+		dotted path `path` exists."""
+		return self._get_context_id(path) is not None
 
 	def get_basic_context_tally(self, path):
 		""" Returns the number of (direct) tasks a context contains and the
@@ -465,10 +1280,14 @@ class DataAccess():
 			WHERE t.done IS NULL
 			  AND c.path = ?
 			UNION ALL
-			SELECT COUNT(id)
-			FROM Context
-			WHERE path LIKE ?
-		""", (path, '{}_%'.format(path)))
+			SELECT COUNT(*)
+			FROM ContextClosure
+			WHERE ancestor = (
+				SELECT id FROM Context
+				WHERE path = ?
+			)
+			  AND depth > 0
+		""", (path, path))
 		result = c.fetchall()
 		return result[0][0], result[1][0]
 
@@ -507,22 +1326,124 @@ class DataAccess():
 
 	def move_all(self, ctx1, ctx2):
 		""" Same as `move` but move tasks of subcontexts as well. (any
-		necessary context is created at the destination context."""
-		for ctx in self.get_descendants(ctx1):
-			dest = ctx2 + ctx['path'][len(ctx1):]
-			self.move(ctx['path'], dest)
+		necessary context is created at the destination context.
+
+		The subtree of `ctx1` is moved as it is before the move, so that
+		moving a context into its own subtree moves each task once."""
+		if ctx1 == ctx2:
+			return
+		c = self.connection.cursor()
+		# Contexts created by the move have greater IDs than the maximum ID
+		# before the move, which excludes them from the moved subtree.
+		c.execute("""
+			SELECT id, (SELECT max(id) FROM Context)
+			FROM Context
+			WHERE path = ?
+		""", (ctx1,))
+		source, max_id = c.fetchone()
+		destination = self.get_or_create_context(ctx2)
+		params = {
+			'ctx1': ctx1,
+			'ctx2': ctx2,
+			'source': source,
+			'destination': destination,
+			'max_id': max_id,
+		}
+		# Path of the destination context of a source context `ctx`
+		destination_path = ':ctx2 || substr({}.path, length(:ctx1) + 1)'
+
+		c.execute("""
+			INSERT OR IGNORE INTO Context (path)
+			SELECT {}
+			FROM ContextClosure cl
+			JOIN Context d ON d.id = cl.descendant
+			WHERE cl.ancestor = :source
+			  AND cl.depth > 0
+			  AND d.id <= :max_id
+			ORDER BY cl.depth
+		""".format(destination_path.format('d')), params)
+		if c.rowcount > 0:
+			c.execute("""
+				SELECT path FROM Context
+				WHERE id > ?
+			""", (max_id,))
+			for row in c.fetchall():
+				self.context_changes.append((row[0], True))
+
+		# The closure rows of the destination subtree mirror the ones of the
+		# source subtree, and the ancestors of the destination context are
+		# ancestors of its whole subtree. Rows of already existing contexts
+		# are ignored.
+		c.execute("""
+			INSERT OR IGNORE INTO ContextClosure (ancestor, descendant, depth)
+			SELECT a2.id, d2.id, cl.depth
+			FROM ContextClosure sub
+			JOIN ContextClosure cl ON cl.ancestor = sub.descendant
+			JOIN Context a ON a.id = cl.ancestor
+			JOIN Context d ON d.id = cl.descendant
+			JOIN Context a2 ON a2.path = {}
+			JOIN Context d2 ON d2.path = {}
+			WHERE sub.ancestor = :source
+			  AND a.id <= :max_id
+			  AND d.id <= :max_id
+		""".format(
+			destination_path.format('a'), destination_path.format('d')
+		), params)
+		c.execute("""
+			INSERT OR IGNORE INTO ContextClosure (ancestor, descendant, depth)
+			SELECT up.ancestor, down.descendant, up.depth + down.depth
+			FROM ContextClosure up
+			JOIN ContextClosure down ON down.ancestor = up.descendant
+			WHERE up.descendant = :destination
+			  AND up.depth > 0
+			  AND down.depth > 0
+		""", params)
+
+		c.execute("""
+			UPDATE Task
+			SET context = (
+				SELECT dest.id
+				FROM Context src
+				JOIN Context dest ON dest.path = {}
+				WHERE src.id = Task.context
+			)
+			WHERE context IN (
+				SELECT descendant FROM ContextClosure
+				WHERE ancestor = :source
+				  AND descendant <= :max_id
+			)
+		""".format(destination_path.format('src')), params)
 
 	def remove_context(self, path):
 		""" Remove the context (and all subcontexts and tasks/subtasks)
 		pointed to by `path`."""
-		# We only have to remove the context and its subcontext as the foreign
-		# key on tasks to set up to cascade the delete
+		# The foreign key on tasks is set up to cascade the delete, but the
+		# tasks are removed beforehand so that the tally triggers still find
+		# the closure rows of their context when updating the ancestors'
+		# counters.
 		c = self.connection.cursor()
+		self.context_changes.append((path, False))
+		c.execute("""
+			DELETE FROM Task
+			WHERE context IN (
+				SELECT descendant FROM ContextClosure
+				WHERE ancestor = (
+					SELECT id FROM Context
+					WHERE path = ?
+				)
+			)
+		""", (path,))
 		c.execute("""
 			DELETE FROM Context
-			WHERE path LIKE ?
-		""", ('{}%'.format(path),))
-		self.changed_contexts = True
+			WHERE id IN (
+				SELECT descendant FROM ContextClosure
+				WHERE ancestor = (
+					SELECT id FROM Context
+					WHERE path = ?
+				)
+			)
+		""", (path,))
+		self.context_ids.clear()
 		return c.rowcount
 
 	def rename_context(self, path, name):
@@ -540,77 +1461,83 @@ class DataAccess():
 		""", (renamed,))
 		if c.fetchone() is not None:
 			return None
-		# We need to rename all the subcontexts as well. Can't do it in one
-		# UPDATE query because sqlite's REPLACE would replace all occurrences
-		# and we risk renaming other things (contexts whose same structure
-		# repeats at a sub-level)
-		c = self.connection.cursor()
+		# Rename all the subcontexts as well, by replacing the prefix of their
+		# path. The subtree comes from the closure table and not from a LIKE
+		# on the path, which would also catch siblings sharing the same prefix
+		# (e.g. `.work` and `.workshop`).
 		c.execute("""
-			SELECT id, path FROM Context WHERE path LIKE ?
-		""", ('{}%'.format(path),))
-		new = ((renamed + row['path'][len(path):], row['id']) for row in c)
-		c2 = self.connection.cursor()
-		c2.executemany("""
 			UPDATE Context
-			SET path = ?
-			WHERE ID = ?
-		""", new)
-		self.changed_contexts = True
-		return c2.rowcount
+			SET path = :renamed || substr(path, length(:path) + 1)
+			WHERE id IN (
+				SELECT descendant FROM ContextClosure
+				WHERE ancestor = (
+					SELECT id FROM Context
+					WHERE path = :path
+				)
+			)
+		""", {'path': path, 'renamed': renamed})
+		self.context_changes.append((path, renamed))
+		self.context_ids.clear()
+		return c.rowcount
 
 	@return_row_task
 	def todo(self, path='', recursive=False):
 		""" Return a list of Row-tasks which belong the the context pointed to
 		by `path`. If `recursive` is False, then the list only contains tasks
 		that *directly* belong to the context. Otherwise it contains tasks
-		from descendance as well. In the list, tasks are sorted by:
+		from descendance as well. Recurring tasks whose current period is
+		already done are excluded. In the list, tasks are sorted by:
 		  * priority, descending
 		  * remaining time (before deadline, infinity if no deadline),
 		    ascending
 		  * datetime created, ascending
 		"""
-		context_like_value = '{}%'.format(path)
 		if recursive:
-			operator, context_value = 'LIKE', context_like_value
+			context_condition = '1'
 		else:
-			operator, context_value = '=', path
+			context_condition = 't.context = :context OR t.front = 1'
+
+		due = self._catch_up_occurrences()
 		c = self.connection.cursor()
 		c.execute("""
 			SELECT
 			  t.*,
-			  c.path as ctx_path,
-			  (
-			  	SELECT max(done_datetime)
-			  	FROM TaskDoneHistory
-			  	WHERE task_id = t.id
-			  ) as last_done
+			  c.path as ctx_path
 			FROM Task t
 			JOIN Context c
 			  ON t.context = c.id
 			WHERE
-			  (
-				c.path {} ?
-				OR (t.front = 1 AND c.path LIKE ?)
+			  t.context IN (
+			  	SELECT descendant FROM ContextClosure
+			  	WHERE ancestor = :context
 			  )
+			  AND ({})
 			  AND t.done IS NULL
-			  AND (c.path = ? OR c.visibility = 'normal')
-			  AND (datetime('now')) >= datetime(t.start)
-			  AND NOT EXISTS (
-			  	SELECT * FROM Task as Dependency
-			  	JOIN TaskDependency ON Dependency.id = TaskDependency.dependency_id
-			  	WHERE TaskDependency.task_id = t.id
-			  	  AND Dependency.done is NULL
+			  AND (
+			  	t.period IS NULL
+			  	OR t.last_done IS NULL
+			  	OR t.last_done <= t.last_occurrence
+			  	OR t.id IN ({})
 			  )
+			  AND (t.context = :context OR c.visibility = 'normal')
+			  AND t.start_ts <= :now
+			  AND t.open_dependencies = 0
 			ORDER BY
 			  priority DESC,
-			  COALESCE(
-			      julianday(deadline),
-			      julianday('9999-12-31 23:59:59')
-			    ) - julianday('now') ASC,
+			  t.deadline_ts IS NULL,
+			  t.deadline_ts ASC,
 			  ping DESC,
-			  created ASC
-		""".format(operator), (context_value, context_like_value, path))
-		return c.fetchall()
+			  t.created_ts ASC
+		""".format(context_condition, ', '.join(map(str, due))), {
+			'context': self._get_context_id(path),
+			'now': get_now_timestamp(),
+		})
+		return [
+			row for row in c
+			if row['id'] not in due
+			or row['last_done'] is None
+			or row['last_done'] <= due[row['id']]
+		]
 
 	def get_subcontexts(self, path='', get_empty=True):
 		"""
@@ -625,37 +1552,31 @@ class DataAccess():
 		if get_empty:
 			add_condition = ''
 		else:
-			add_condition = 'AND total_tasks > 0'
-		c = self.connection.cursor()
-		c.execute("""
-			SELECT c.*, COUNT(own.id) as own_tasks, (
-				SELECT COUNT(t.id)
-				FROM Context c1
-				LEFT JOIN Task t
-				  ON t.context = c1.id
-				 AND t.start <= (datetime('now'))
-				 AND t.done IS NULL
-				WHERE c1.path LIKE c.path||'%'
-				  AND c1.visibility = 'normal'
-			) as total_tasks
-			FROM Context c
-			LEFT JOIN Task own
-			  ON own.context = c.id
-			 AND own.start <= (datetime('now'))
-			 AND own.done IS NULL
-			WHERE path LIKE ?
-			  AND path NOT LIKE ?
-			  AND visibility = 'normal'
+			add_condition = 'AND c.visible_tasks > 0'
+		self._catch_up_started_tasks()
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT
+			  c.id,
+			  c.path,
+			  c.priority,
+			  c.visibility,
+			  c.own_tasks,
+			  c.visible_tasks as total_tasks
+			FROM ContextClosure children
+			JOIN Context c
+			  ON c.id = children.descendant
+			WHERE children.ancestor = (
+				SELECT id FROM Context
+				WHERE path = ?
+			)
+			  AND children.depth = 1
+			  AND c.visibility = 'normal'
 			  {}
-			GROUP BY c.id
 			ORDER BY
-			  priority DESC,
-			  total_tasks DESC
-		""".format(add_condition), (
-			'{}.%'.format(path),
-			'{}.%.%'.format(path),
-			)
-		)
+			  c.priority DESC,
+			  c.visible_tasks DESC
+		""".format(add_condition), (path,))
 		return c.fetchall()
 
 	def get_descendants(self, path=''):
@@ -663,29 +1584,80 @@ class DataAccess():
 		of the context pointed to by `path`. The iterator is agnostic of
 		visibility and the contexts are sorted by their path. The first
 		element of the iterator is the given context itself. """
+		self._catch_up_started_tasks()
 		c = self.connection.cursor()
 		c.execute("""
-			SELECT c.*, COUNT(own.id) as own_tasks, (
-				SELECT COUNT(t.id)
-				FROM Context c1
-				LEFT JOIN Task t
-				  ON t.context = c1.id
-				 AND t.start <= (datetime('now'))
-				 AND t.done IS NULL
-				WHERE c1.path LIKE c.path||'%' 
-			) as total_tasks
-			FROM Context c
-			LEFT JOIN Task own
-			  ON own.context = c.id
-			 AND own.start <= (datetime('now'))
-			 AND own.done IS NULL
-			WHERE path LIKE ?
-			GROUP BY c.id
+			SELECT
+			  c.id,
+			  c.path,
+			  c.priority,
+			  c.visibility,
+			  c.own_tasks,
+			  c.total_tasks
+			FROM ContextClosure sub
+			JOIN Context c
+			  ON c.id = sub.descendant
+			WHERE sub.ancestor = (
+				SELECT id FROM Context
+				WHERE path = ?
+			)
 			ORDER BY
 			  c.path
-		""", ('{}%'.format(path),))
+		""", (path,))
 		return c
 
+	def _catch_up_started_tasks(self):
+		""" Set the `started` flag of undone tasks whose start has passed since
+		they were last written. The flag is what makes a task count in the
+		per-context tallies (the update is picked up by the tally triggers),
+		so this must be called before reading them. Nothing is written, hence
+		no write transaction is started, if no task has started since."""
+		now = get_now_timestamp()
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT EXISTS (
+				SELECT 1 FROM Task
+				WHERE started = 0
+				  AND done IS NULL
+				  AND start_ts <= ?
+			)
+		""", (now,))
+		if not c.fetchone()[0]:
+			return
+		self._write_catch_up("""
+			UPDATE Task SET started = 1
+			WHERE started = 0
+			  AND done IS NULL
+			  AND start_ts <= ?
+		""", [(now,)])
+
+	def _write_catch_up(self, query, rows):
+		""" Run the UPDATE `query` bringing derived columns up to date with
+		each of the parameters in `rows`. Within the transaction of a command
+		that already writes, the update is part of it. Otherwise it is
+		committed at once in a transaction of its own, or skipped if another
+		connection holds the write lock, so that listings neither wait for the
+		lock nor keep it: the next command catches up then. Return whether the
+		update was done."""
+		if self.connection.in_transaction:
+			self.connection.cursor().executemany(query, rows)
+			return True
+		c = self.connection.cursor()
+		c.execute('PRAGMA busy_timeout;')
+		busy_timeout = c.fetchone()[0]
+		c.execute('PRAGMA busy_timeout = 0;')
+		try:
+			c.executemany(query, rows)
+			self.connection.commit()
+		except sqlite3.OperationalError as error:
+			self.connection.rollback()
+			if not is_busy_error(error):
+				raise
+			return False
+		finally:
+			c.execute('PRAGMA busy_timeout = {};'.format(busy_timeout))
+		return True
+
 	def history(self):
 		""" Return an iterator over Row-tasks which iterates over all the
 		tasks in existence, sorted by their date of creation."""
@@ -694,10 +1666,75 @@ class DataAccess():
 			SELECT t.*, c.path as ctx_path
 			FROM Task t JOIN Context c
 			ON t.context = c.id
-			ORDER BY t.created
+			ORDER BY t.created_ts
 		""")
 		return c
 
+	def export_tasks(self, ctx='', done=None):
+		""" Return an iterator over the records (see `import_tasks`) of the
+		tasks in the descendance of the context pointed to by `ctx`, sorted by
+		ID. If `done` is not None, only done (True) or undone (False) tasks
+		are exported. IDs are the IDs of tasks shown to the user, and
+		datetimes are in the ISO 8601 format.
+
+		Records are read one at a time by a single statement, hence from a
+		consistent snapshot of the database however long the iteration takes.
+		In WAL mode, the snapshot doesn't block writers."""
+		done_filter = ''
+		if done is not None:
+			cond = 'IS NOT NULL' if done else 'IS NULL'
+			done_filter = 'AND t.done {}'.format(cond)
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT t.id, t.title, t.content, c.path AS ctx_path,
+			       strftime(:iso, t.created) AS created,
+			       strftime(:iso, t.start) AS start,
+			       strftime(:iso, t.deadline) AS deadline,
+			       strftime(:iso, t.done) AS done,
+			       t.priority, t.period, t.front,
+			       (
+			           SELECT group_concat(dependency_id, ' ')
+			           FROM TaskDependency
+			           WHERE task_id = t.id
+			       ) AS depends_on,
+			       (
+			           SELECT group_concat(done_datetime, ' ')
+			           FROM (
+			               SELECT strftime(:iso, done_datetime) AS done_datetime
+			               FROM TaskDoneHistory
+			               WHERE task_id = t.id
+			               ORDER BY done_datetime
+			           )
+			       ) AS done_history
+			FROM Task t JOIN Context c
+			ON t.context = c.id
+			WHERE t.context IN (
+				SELECT descendant FROM ContextClosure
+				WHERE ancestor = (SELECT id FROM Context WHERE path = :ctx)
+			)
+			  {}
+			ORDER BY t.id
+		""".format(done_filter), {'iso': EXPORT_DATE_FORMAT, 'ctx': ctx})
+		for row in c:
+			yield {
+				'id': utils.to_hex(row['id']),
+				'title': row['title'],
+				'content': row['content'],
+				'context': userify_context(row['ctx_path']),
+				'created': row['created'],
+				'start': row['start'],
+				'deadline': row['deadline'],
+				'done': row['done'],
+				'priority': row['priority'],
+				'period': row['period'],
+				'front': bool(row['front']),
+				'depends_on': [
+					utils.to_hex(int(tid))
+					for tid in (row['depends_on'] or '').split()
+				],
+				'done_history': (row['done_history'] or '').split(),
+			}
+
 	def get_greatest_id(self):
 		""" Returns the greatest existing task ID, or None if there are no
 		task."""
@@ -722,9 +1759,9 @@ class DataAccess():
 		"""
 		if before is not None:
 			query += """
-				AND created < ?
+				AND created_ts < ?
 			"""
-			values = (before,)
+			values = (utils.sqlite_date_to_timestamp(before),)
 		else:
 			values = ()
 		c.execute(query, values)
@@ -732,65 +1769,242 @@ class DataAccess():
 
 	def search(self, term, ctx='', done=None, before=None, after=None,
 		       case=False):
-		original = self.case_sensitive_like
-		self.set_case_sensitive_like(case)
+		""" Return a list of Row-tasks whose title or content contains
+		`term`, in the descendance of the context pointed to by `ctx`. The
+		search is case-insensitive (for ASCII characters) unless `case` is
+		True. If `done` is not None, restrict the search to done (True) or
+		undone (False) tasks. `before` and `after` restrict the search to tasks
+		created before/after the given datetimes."""
+		condition, values = get_search_condition(term, case)
+		filters, params = get_search_filters(ctx, done, before, after)
 		c = self.connection.cursor()
-		query = """
+		c.execute("""
 			SELECT t.*, c.path as ctx_path
 			FROM Task t JOIN Context c
 			ON t.context = c.id
-			WHERE t.title LIKE ?
-			  AND c.path LIKE ?
-		"""
-		params = ('%{}%'.format(term), '{}%'.format(ctx))
+			WHERE {}
+			  {}
+		""".format(condition, filters), values + params)
+		return c.fetchall()
 
-		if done is not None:
-			cond = 'IS NOT NULL' if done else 'IS NULL'
-			query += """
-				AND t.done {}
-			""".format(cond)
-		if before is not None:
-			query += """
-				AND t.created < ?
-			"""
-			params = params + (before,)
-		if after is not None:
-			query += """
-				AND t.created > ?
-			"""
-			params = params + (after,)
+	def has_full_text_index(self):
+		""" Return whether the database has the full-text index used by
+		`full_text_search`, which isn't created if the SQLite library lacks
+		FTS5 (see `init_db.update_database`)."""
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT 1 FROM sqlite_master
+			WHERE type = 'table' AND name = 'TaskFullText'
+		""")
+		return c.fetchone() is not None
+
+	def full_text_search(self, term, ctx='', done=None, before=None,
+		                 after=None, markers=('', '')):
+		""" Same as `search` but use the full-text index over titles and
+		contents of tasks. The words of `term` must all be found (a word
+		ending with a star matches any word starting with it), regardless of
+		case and diacritics. Tasks are sorted by relevance, and the Row-tasks
+		have an additional `excerpt` key which is an excerpt of the content
+		of the task around the matching words (surrounded with the 2-tuple
+		of strings `markers`) if the content matches, None otherwise."""
+		filters, params = get_search_filters(ctx, done, before, after)
+		start, end = markers
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT
+			  t.*,
+			  c.path as ctx_path,
+			  snippet(TaskFullText, 1, ?, ?, '...', 12) as excerpt,
+			  highlight(TaskFullText, 1, char(1), char(2)) as highlighted
+			FROM TaskFullText
+			JOIN Task t
+			  ON t.id = TaskFullText.rowid
+			JOIN Context c
+			  ON t.context = c.id
+			WHERE TaskFullText MATCH ?
+			  {}
+			ORDER BY bm25(TaskFullText, 10.0, 1.0)
+		""".format(filters), (start, end, get_full_text_query(term)) + params)
+		tasks = []
+		for row in c:
+			task = dict(row)
+			highlighted = task.pop('highlighted')
+			if highlighted is None or chr(1) not in highlighted:
+				task['excerpt'] = None
+			tasks.append(task)
+		return tasks
+
+	def save_search(self, name, term, ctx='', done=None, before=None,
+		            after=None, case=False):
+		""" Save the search defined by the arguments (see `search`) under the
+		name `name`, replacing any saved search with the same name, and
+		materialize its results. The results are then kept up to date by
+		triggers as tasks are added and updated. Return the number of tasks
+		matching the search, or None if the context pointed to by `ctx`
+		doesn't exist."""
+		cid = self._get_context_id(ctx)
+		if cid is None:
+			return None
+		c = self.connection.cursor()
+		c.execute("""
+			DELETE FROM SavedSearch
+			WHERE name = ?
+		""", (name,))
+		c.execute("""
+			INSERT INTO SavedSearch
+			  (name, term, context, done, before, after, case_sensitive)
+			VALUES (?, ?, ?, ?, ?, ?, ?)
+		""", (name, term, cid, done, before, after, case))
+		search_id = c.lastrowid
+		condition, values = get_search_condition(term, case)
+		filters, params = get_search_filters(ctx, done, before, after)
+		c.execute("""
+			INSERT INTO SavedSearchTask (search_id, task_id)
+			SELECT ?, t.id FROM Task t
+			WHERE {}
+			  {}
+		""".format(condition, filters), (search_id,) + values + params)
+		return c.rowcount
 
-		c.execute(query, params)
-		self.set_case_sensitive_like(original)
+	def get_saved_search(self, name):
+		""" Return the saved search named `name` as a Row object with the keys
+		name, term, ctx_path, done, before, after and case_sensitive, and the
+		number of tasks matching it as `tasks`. Return None if there's no
+		such saved search."""
+		for search in self.get_saved_searches(name):
+			return search
+		return None
+
+	def get_saved_searches(self, name=None):
+		""" Return a list of all saved searches (or only the one named `name`)
+		sorted by name, as Row objects (see `get_saved_search`)."""
+		condition = 'WHERE s.name = ?' if name is not None else ''
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT
+			  s.*,
+			  c.path as ctx_path,
+			  (
+			  	SELECT COUNT(*) FROM SavedSearchTask
+			  	WHERE search_id = s.id
+			  ) as tasks
+			FROM SavedSearch s
+			JOIN Context c
+			  ON s.context = c.id
+			{}
+			ORDER BY s.name
+		""".format(condition), () if name is None else (name,))
 		return c.fetchall()
 
+	def get_saved_search_tasks(self, name):
+		""" Return the list of Row-tasks matching the saved search named
+		`name`, read from its materialized results."""
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT t.*, c.path as ctx_path
+			FROM SavedSearchTask s
+			JOIN Task t
+			  ON t.id = s.task_id
+			JOIN Context c
+			  ON t.context = c.id
+			WHERE s.search_id = (
+				SELECT id FROM SavedSearch
+				WHERE name = ?
+			)
+			ORDER BY t.id
+		""", (name,))
+		return c.fetchall()
+
+	def remove_saved_search(self, name):
+		""" Remove the saved search named `name`. Return the number of rows
+		affected."""
+		c = self.connection.cursor()
+		c.execute("""
+			DELETE FROM SavedSearch
+			WHERE name = ?
+		""", (name,))
+		return c.rowcount
+
 	@return_row_task
 	def get_future_tasks(self):
+		""" Return a list of Row-tasks that aren't in the todo list for now but
+		will be in the future: tasks that haven't started yet, tasks depending
+		on tasks that are undone or haven't started yet, and recurring tasks
+		whose current period is done."""
+		now = datetime.utcnow().strftime(utils.SQLITE_DT_FORMAT)
+		due = self._catch_up_occurrences(now)
+		now_ts = utils.sqlite_date_to_timestamp(now)
 		c = self.connection.cursor()
-		now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
 		query = """
 			SELECT
 				t.*,
 				c.path as ctx_path,
-				group_concat(dependee.id, ', ') as dependencies_ids,
-				(
-					SELECT max(done_datetime)
-					FROM TaskDoneHistory
-					WHERE task_id = t.id
-				) as last_done
+				group_concat(dependee.id, ', ') as dependencies_ids
 			FROM Task t
 			JOIN Context c ON t.context = c.id
 			LEFT JOIN TaskDependency ON TaskDependency.task_id = t.id
 			LEFT JOIN Task dependee ON TaskDependency.dependency_id = dependee.id
-			WHERE t.start > ?
-			OR dependee.id AND dependee.done IS NULL
-			OR dependee.id AND dependee.start > ?
-			OR t.period IS NOT NULL
+			WHERE t.period IS NULL AND (
+				t.start_ts > ?
+				OR dependee.id AND dependee.done IS NULL
+				OR dependee.id AND dependee.start_ts > ?
+			)
+			OR t.period IS NOT NULL AND t.last_done > t.last_occurrence
+			OR t.id IN ({})
 			GROUP BY t.id
-			ORDER BY t.created
-		"""
-		c.execute(query, (now, now))
-		return c.fetchall()
+			ORDER BY t.created_ts
+		""".format(', '.join(map(str, due)))
+		c.execute(query, (now_ts, now_ts))
+		return [
+			row for row in c
+			if row['id'] not in due
+			or row['last_done'] is not None
+			and row['last_done'] > due[row['id']]
+		]
+
+	def _catch_up_occurrences(self, now=None):
+		""" Compute the boundaries of the current period of the recurring
+		tasks for which they're missing (new task, start or period updated)
+		or outdated (the next occurrence has passed), and write them in a
+		single batch. If they can't be written (see `_write_catch_up`), return
+		a dictionary mapping the IDs of these tasks to the last occurrence of
+		their current period, for the caller to use instead of the column.
+		Otherwise, return an empty dictionary."""
+		if now is None:
+			now = datetime.utcnow().strftime(utils.SQLITE_DT_FORMAT)
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT id, start, period FROM Task
+			WHERE period IS NOT NULL
+			  AND (next_occurrence IS NULL OR next_occurrence <= ?)
+		""", (now,))
+		rows = c.fetchall()
+		if len(rows) == 0:
+			# Nothing is due: don't start a write transaction for nothing
+			return {}
+		schedules = [
+			(datetime.strptime(row['start'], utils.SQLITE_DT_FORMAT), row['period'])
+			for row in rows
+		]
+		occurrences = [
+			(
+				last.strftime(utils.SQLITE_DT_FORMAT),
+				next_.strftime(utils.SQLITE_DT_FORMAT),
+				row['id'],
+			)
+			for row, (last, next_) in zip(rows, core.get_occurrences(
+				schedules,
+				datetime.strptime(now, utils.SQLITE_DT_FORMAT),
+			))
+		]
+		written = self._write_catch_up("""
+			UPDATE Task
+			SET last_occurrence = ?, next_occurrence = ?
+			WHERE id = ?
+		""", occurrences)
+		if written:
+			return {}
+		return {tid: last for last, _, tid in occurrences}
 
 	def get_last_occurrence_done(self, task_id):
 		"""
@@ -798,25 +2012,23 @@ class DataAccess():
 		"""
 		c = self.connection.cursor()
 		query = """
-			SELECT max(done_datetime) as last_occurrence FROM TaskDoneHistory
-			WHERE task_id = ?
+			SELECT last_done FROM Task
+			WHERE id = ?
 		"""
 		c.execute(query, (task_id,))
 		row = c.fetchone()
-		if row is None or row['last_occurrence'] is None:
+		if row is None or row['last_done'] is None:
 			return None
-		return datetime.strptime(row['last_occurrence'], utils.SQLITE_DT_FORMAT)
+		return datetime.strptime(row['last_done'], utils.SQLITE_DT_FORMAT)
 
-	def add_done_occurrence(self, task_id):
+	def add_done_occurrences(self, task_ids):
 		c = self.connection.cursor()
 		query = """
 			INSERT INTO TaskDoneHistory (task_id, done_datetime)
 			VALUES (?, ?)
 		"""
-		c.execute(
-			query,
-			(task_id, datetime.utcnow().strftime(utils.SQLITE_DT_FORMAT))
-		)
+		now = datetime.utcnow().strftime(utils.SQLITE_DT_FORMAT)
+		c.executemany(query, [(task_id, now) for task_id in task_ids])
 
 	def take_editing_lock(self, tid):
 		"""
@@ -848,20 +2060,34 @@ class DataAccess():
 
 	def exit(self, save=True):
 		""" Close the database and save all operations done to it if `save` is
-		True. Write all contexts paths (NON fully-dotted) to the contexts file
-		if at least one context was created or removed during operations. The
-		contexts file exists for terminal auto-completion."""
+		True (see `save`)."""
 		if save:
-			self.connection.commit()
-			if self.changed_contexts:
-				c = self.connection.cursor()
-				c.execute("""
-					SELECT DISTINCT path FROM Context
-					ORDER BY path
-				""")
-				data_ctx = op.join(DATA_DIR, DATA_CTX_NAME)
-				with open(data_ctx, 'w') as ctx_file:
-					for row in c:
-						ctx = userify_context(row[0])
-						ctx_file.write(ctx + '\n')
+			self.save()
 		self.connection.close()
+
+	def rollback(self):
+		""" Cancel all operations done to the database since the last save."""
+		self.connection.rollback()
+		# Contexts created since then don't exist anymore
+		self.context_ids.clear()
+		self.context_changes.clear()
+
+	def save(self):
+		""" Save all operations done to the database. Apply the contexts
+		created or removed since the last save to the contexts file (see
+		`update_contexts_file`), which exists for terminal auto-completion."""
+		self.connection.commit()
+		if self.context_changes:
+			update_contexts_file(
+				op.join(self.data_dir, DATA_CTX_NAME),
+				self.context_changes,
+				self._get_context_paths,
+			)
+			self.context_changes = []
+
+	def _get_context_paths(self):
+		c = self.connection.cursor()
+		c.execute("""
+			SELECT path FROM Context
+		""")
+		return [row[0] for row in c]
@@ -3,6 +3,51 @@ import sqlite3
 from . import utils
 
 
+# Full-text index over the title and content of tasks, as an external
+# content FTS5 table kept in sync with Task by triggers. Its statements are
+# part of INIT_DB, but are skipped when the SQLite library lacks FTS5.
+FULL_TEXT_SCHEMA = [
+	"""
+	CREATE VIRTUAL TABLE `TaskFullText` USING fts5(
+		title,
+		content,
+		content='Task',
+		content_rowid='id',
+		tokenize='unicode61 remove_diacritics 2'
+	);
+	""",
+	"""
+	INSERT INTO TaskFullText (TaskFullText) VALUES ('rebuild')
+	""",
+	"""
+	CREATE TRIGGER `FullTextOnInsert`
+	AFTER INSERT ON Task
+	BEGIN
+		INSERT INTO TaskFullText (rowid, title, content)
+		VALUES (NEW.id, NEW.title, NEW.content);
+	END;
+	""",
+	"""
+	CREATE TRIGGER `FullTextOnDelete`
+	AFTER DELETE ON Task
+	BEGIN
+		INSERT INTO TaskFullText (TaskFullText, rowid, title, content)
+		VALUES ('delete', OLD.id, OLD.title, OLD.content);
+	END;
+	""",
+	"""
+	CREATE TRIGGER `FullTextOnUpdate`
+	AFTER UPDATE OF title, content ON Task
+	BEGIN
+		INSERT INTO TaskFullText (TaskFullText, rowid, title, content)
+		VALUES ('delete', OLD.id, OLD.title, OLD.content);
+		INSERT INTO TaskFullText (rowid, title, content)
+		VALUES (NEW.id, NEW.title, NEW.content);
+	END;
+	""",
+]
+
+
 INIT_DB = [
 	"""
 	CREATE TABLE `Task` (
@@ -71,42 +116,498 @@ INIT_DB = [
 	""",
 	"""
 	ALTER TABLE Task ADD COLUMN `front` INTEGER
+	""",
+	"""
+	CREATE TABLE `ContextClosure` (
+		`ancestor`	INTEGER NOT NULL REFERENCES Context(id) ON DELETE CASCADE,
+		`descendant`	INTEGER NOT NULL REFERENCES Context(id) ON DELETE CASCADE,
+		`depth`	INTEGER NOT NULL,
+		PRIMARY KEY (`ancestor`, `descendant`)
+	) WITHOUT ROWID;
+	""",
+	"""
+	CREATE INDEX `ContextClosureDepthIndex` ON `ContextClosure` (`ancestor`, `depth`);
+	""",
+	"""
+	CREATE INDEX `ContextClosureDescendantIndex` ON `ContextClosure` (`descendant`);
+	""",
+	# A context is its own ancestor at depth 0, and an ancestor of every
+	# context whose path starts with its own path followed by a dot. The depth
+	# is the difference in the number of dots of both paths.
+	"""
+	INSERT INTO `ContextClosure` (ancestor, descendant, depth)
+	SELECT
+	  a.id,
+	  d.id,
+	  (length(d.path) - length(replace(d.path, '.', '')))
+	  - (length(a.path) - length(replace(a.path, '.', '')))
+	FROM Context a
+	JOIN Context d
+	  ON d.path = a.path
+	  OR substr(d.path, 1, length(a.path) + 1) = a.path || '.'
+	""",
+	# Per-context counters of undone tasks that have started: directly in the
+	# context (own), in the context's subtree (total) and in the non-hidden
+	# contexts of the subtree (visible). A task only counts once its
+	# `started` flag is set, which is done on insertion/update if its start
+	# has passed, and later on by DataAccess._catch_up_started_tasks.
+	"""
+	ALTER TABLE Task ADD COLUMN `started` INTEGER NOT NULL DEFAULT 0
+	""",
+	"""
+	ALTER TABLE Context ADD COLUMN `own_tasks` INTEGER NOT NULL DEFAULT 0
+	""",
+	"""
+	ALTER TABLE Context ADD COLUMN `total_tasks` INTEGER NOT NULL DEFAULT 0
+	""",
+	"""
+	ALTER TABLE Context ADD COLUMN `visible_tasks` INTEGER NOT NULL DEFAULT 0
+	""",
+	"""
+	UPDATE Task SET started = (start <= datetime('now'))
+	""",
+	"""
+	UPDATE Context SET own_tasks = (
+		SELECT COUNT(*) FROM Task
+		WHERE Task.context = Context.id
+		  AND Task.done IS NULL
+		  AND Task.started = 1
+	)
+	""",
+	"""
+	UPDATE Context SET
+	  total_tasks = (
+		SELECT COALESCE(SUM(d.own_tasks), 0)
+		FROM ContextClosure cl
+		JOIN Context d ON d.id = cl.descendant
+		WHERE cl.ancestor = Context.id
+	  ),
+	  visible_tasks = (
+		SELECT COALESCE(SUM(d.own_tasks), 0)
+		FROM ContextClosure cl
+		JOIN Context d ON d.id = cl.descendant
+		WHERE cl.ancestor = Context.id
+		  AND d.visibility = 'normal'
+	  )
+	""",
+	"""
+	CREATE TRIGGER `TaskStartedOnInsert`
+	AFTER INSERT ON Task
+	WHEN NEW.start <= datetime('now')
+	BEGIN
+		UPDATE Task SET started = 1 WHERE id = NEW.id;
+	END;
+	""",
+	"""
+	CREATE TRIGGER `TaskStartedOnUpdate`
+	AFTER UPDATE OF start ON Task
+	WHEN (NEW.start <= datetime('now')) != NEW.started
+	BEGIN
+		UPDATE Task SET started = (NEW.start <= datetime('now'))
+		WHERE id = NEW.id;
+	END;
+	""",
+	"""
+	CREATE TRIGGER `TaskTallyOnUpdate`
+	AFTER UPDATE OF done, started, context ON Task
+	WHEN (OLD.done IS NULL AND OLD.started) != (NEW.done IS NULL AND NEW.started)
+	  OR OLD.context != NEW.context
+	BEGIN
+		UPDATE Context SET own_tasks = own_tasks - 1
+		WHERE id = OLD.context
+		  AND OLD.done IS NULL AND OLD.started;
+		UPDATE Context SET
+		  total_tasks = total_tasks - 1,
+		  visible_tasks = visible_tasks - (
+			SELECT visibility = 'normal' FROM Context WHERE id = OLD.context
+		  )
+		WHERE id IN (
+			SELECT ancestor FROM ContextClosure WHERE descendant = OLD.context
+		)
+		  AND OLD.done IS NULL AND OLD.started;
+		UPDATE Context SET own_tasks = own_tasks + 1
+		WHERE id = NEW.context
+		  AND NEW.done IS NULL AND NEW.started;
+		UPDATE Context SET
+		  total_tasks = total_tasks + 1,
+		  visible_tasks = visible_tasks + (
+			SELECT visibility = 'normal' FROM Context WHERE id = NEW.context
+		  )
+		WHERE id IN (
+			SELECT ancestor FROM ContextClosure WHERE descendant = NEW.context
+		)
+		  AND NEW.done IS NULL AND NEW.started;
+	END;
+	""",
+	"""
+	CREATE TRIGGER `TaskTallyOnDelete`
+	AFTER DELETE ON Task
+	WHEN OLD.done IS NULL AND OLD.started
+	BEGIN
+		UPDATE Context SET own_tasks = own_tasks - 1
+		WHERE id = OLD.context;
+		UPDATE Context SET
+		  total_tasks = total_tasks - 1,
+		  visible_tasks = visible_tasks - (
+			SELECT visibility = 'normal' FROM Context WHERE id = OLD.context
+		  )
+		WHERE id IN (
+			SELECT ancestor FROM ContextClosure WHERE descendant = OLD.context
+		);
+	END;
+	""",
+	"""
+	CREATE TRIGGER `ContextTallyOnVisibility`
+	AFTER UPDATE OF visibility ON Context
+	WHEN (OLD.visibility = 'normal') != (NEW.visibility = 'normal')
+	BEGIN
+		UPDATE Context SET
+		  visible_tasks = visible_tasks + NEW.own_tasks * (
+			(NEW.visibility = 'normal') - (OLD.visibility = 'normal')
+		  )
+		WHERE id IN (
+			SELECT ancestor FROM ContextClosure WHERE descendant = NEW.id
+		);
+	END;
+	""",
+	"""
+	ALTER TABLE Task ADD COLUMN `last_done` TEXT
+	""",
+	"""
+	UPDATE Task SET last_done = (
+		SELECT max(done_datetime) FROM TaskDoneHistory
+		WHERE task_id = Task.id
+	)
+	""",
+	"""
+	CREATE TRIGGER `TaskLastDone`
+	AFTER INSERT ON TaskDoneHistory
+	BEGIN
+		UPDATE Task SET last_done = NEW.done_datetime
+		WHERE id = NEW.task_id
+		  AND (last_done IS NULL OR last_done < NEW.done_datetime);
+	END;
+	""",
+	# Number of undone dependencies of each task: a task is blocked as long as
+	# it's not 0. When a task is deleted, foreign keys cascade the delete to
+	# its TaskDependency rows after the task is gone, so the dependers of a
+	# deleted undone task are updated by a BEFORE DELETE trigger on Task
+	# while the trigger on TaskDependency only accounts for existing tasks.
+	"""
+	ALTER TABLE Task ADD COLUMN `open_dependencies` INTEGER NOT NULL DEFAULT 0
+	""",
+	"""
+	UPDATE Task SET open_dependencies = (
+		SELECT COUNT(*) FROM TaskDependency
+		JOIN Task AS Dependency
+		  ON Dependency.id = TaskDependency.dependency_id
+		WHERE TaskDependency.task_id = Task.id
+		  AND Dependency.done IS NULL
+	)
+	""",
+	"""
+	CREATE TRIGGER `DependencyOnInsert`
+	AFTER INSERT ON TaskDependency
+	WHEN EXISTS (
+		SELECT 1 FROM Task WHERE id = NEW.dependency_id AND done IS NULL
+	)
+	BEGIN
+		UPDATE Task SET open_dependencies = open_dependencies + 1
+		WHERE id = NEW.task_id;
+	END;
+	""",
+	"""
+	CREATE TRIGGER `DependencyOnDelete`
+	AFTER DELETE ON TaskDependency
+	WHEN EXISTS (
+		SELECT 1 FROM Task WHERE id = OLD.dependency_id AND done IS NULL
+	)
+	BEGIN
+		UPDATE Task SET open_dependencies = open_dependencies - 1
+		WHERE id = OLD.task_id;
+	END;
+	""",
+	"""
+	CREATE TRIGGER `DependencyOnDone`
+	AFTER UPDATE OF done ON Task
+	WHEN (OLD.done IS NULL) != (NEW.done IS NULL)
+	BEGIN
+		UPDATE Task SET open_dependencies = open_dependencies
+		  + (CASE WHEN NEW.done IS NULL THEN 1 ELSE -1 END)
+		WHERE id IN (
+			SELECT task_id FROM TaskDependency WHERE dependency_id = NEW.id
+		);
+	END;
+	""",
+	"""
+	CREATE TRIGGER `DependencyOnTaskDelete`
+	BEFORE DELETE ON Task
+	WHEN OLD.done IS NULL
+	BEGIN
+		UPDATE Task SET open_dependencies = open_dependencies - 1
+		WHERE id IN (
+			SELECT task_id FROM TaskDependency WHERE dependency_id = OLD.id
+		);
+	END;
+	""",
+	# Boundaries of the current period of recurring tasks. They're computed by
+	# DataAccess._catch_up_occurrences when missing or outdated, and reset
+	# whenever the start or the period of a task changes.
+	"""
+	ALTER TABLE Task ADD COLUMN `last_occurrence` TEXT
+	""",
+	"""
+	ALTER TABLE Task ADD COLUMN `next_occurrence` TEXT
+	""",
+	"""
+	CREATE INDEX `NextOccurrenceIndex` ON `Task` (`next_occurrence`)
+	WHERE period IS NOT NULL;
+	""",
+	"""
+	CREATE TRIGGER `OccurrencesOnSchedule`
+	AFTER UPDATE OF start, period ON Task
+	BEGIN
+		UPDATE Task SET last_occurrence = NULL, next_occurrence = NULL
+		WHERE id = NEW.id;
+	END;
+	""",
+	# Full-text index, if the SQLite library has FTS5 (see update_database)
+	*FULL_TEXT_SCHEMA,
+	# Saved searches (see DataAccess.save_search) and their materialized
+	# results, maintained by triggers whenever a task is inserted or one of
+	# the columns searches depend on is updated.
+	"""
+	CREATE TABLE `SavedSearch` (
+		`id`	INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE,
+		`name`	TEXT NOT NULL UNIQUE,
+		`term`	TEXT NOT NULL,
+		`context`	INTEGER NOT NULL REFERENCES Context(id) ON DELETE CASCADE,
+		`done`	INTEGER,
+		`before`	TEXT,
+		`after`	TEXT,
+		`case_sensitive`	INTEGER NOT NULL DEFAULT 0
+	);
+	""",
+	"""
+	CREATE TABLE `SavedSearchTask` (
+		`search_id`	INTEGER NOT NULL REFERENCES SavedSearch(id) ON DELETE CASCADE,
+		`task_id`	INTEGER NOT NULL REFERENCES Task(id) ON DELETE CASCADE,
+		PRIMARY KEY (`search_id`, `task_id`)
+	) WITHOUT ROWID;
+	""",
+	"""
+	CREATE INDEX `SavedSearchTaskIndex` ON `SavedSearchTask` (`task_id`);
+	""",
+	"""
+	CREATE TRIGGER `SavedSearchOnInsert`
+	AFTER INSERT ON Task
+	BEGIN
+		INSERT INTO SavedSearchTask (search_id, task_id)
+		SELECT s.id, NEW.id FROM SavedSearch s
+		WHERE (
+			CASE WHEN s.case_sensitive
+			THEN instr(NEW.title, s.term) > 0
+			  OR instr(NEW.content, s.term) > 0
+			ELSE instr(lower(NEW.title), lower(s.term)) > 0
+			  OR instr(lower(NEW.content), lower(s.term)) > 0
+			END
+		)
+		  AND EXISTS (
+			SELECT 1 FROM ContextClosure
+			WHERE ancestor = s.context AND descendant = NEW.context
+		  )
+		  AND (s.done IS NULL OR s.done = (NEW.done IS NOT NULL))
+		  AND (s.before IS NULL OR NEW.created < s.before)
+		  AND (s.after IS NULL OR NEW.created > s.after);
+	END;
+	""",
+	"""
+	CREATE TRIGGER `SavedSearchOnUpdate`
+	AFTER UPDATE OF title, content, context, done, created ON Task
+	BEGIN
+		DELETE FROM SavedSearchTask WHERE task_id = NEW.id;
+		INSERT INTO SavedSearchTask (search_id, task_id)
+		SELECT s.id, NEW.id FROM SavedSearch s
+		WHERE (
+			CASE WHEN s.case_sensitive
+			THEN instr(NEW.title, s.term) > 0
+			  OR instr(NEW.content, s.term) > 0
+			ELSE instr(lower(NEW.title), lower(s.term)) > 0
+			  OR instr(lower(NEW.content), lower(s.term)) > 0
+			END
+		)
+		  AND EXISTS (
+			SELECT 1 FROM ContextClosure
+			WHERE ancestor = s.context AND descendant = NEW.context
+		  )
+		  AND (s.done IS NULL OR s.done = (NEW.done IS NOT NULL))
+		  AND (s.before IS NULL OR NEW.created < s.before)
+		  AND (s.after IS NULL OR NEW.created > s.after);
+	END;
+	""",
+	# Integer Unix timestamps of the datetimes of tasks, so that sorting and
+	# filtering tasks by date compares integers instead of parsing strings.
+	# They're generated from the TEXT columns, which remain the reference.
+	"""
+	ALTER TABLE `Task` ADD COLUMN `created_ts` INTEGER
+	GENERATED ALWAYS AS (CAST(strftime('%s', created) AS INTEGER)) VIRTUAL;
+	""",
+	"""
+	ALTER TABLE `Task` ADD COLUMN `start_ts` INTEGER
+	GENERATED ALWAYS AS (CAST(strftime('%s', start) AS INTEGER)) VIRTUAL;
+	""",
+	"""
+	ALTER TABLE `Task` ADD COLUMN `deadline_ts` INTEGER
+	GENERATED ALWAYS AS (CAST(strftime('%s', deadline) AS INTEGER)) VIRTUAL;
+	""",
+	"""
+	ALTER TABLE `Task` ADD COLUMN `done_ts` INTEGER
+	GENERATED ALWAYS AS (CAST(strftime('%s', done) AS INTEGER)) VIRTUAL;
+	""",
+	"""
+	CREATE INDEX `TaskCreatedIndex` ON `Task` (`created_ts`);
+	""",
+	"""
+	CREATE INDEX `TaskStartIndex` ON `Task` (`start_ts`);
+	""",
+	"""
+	CREATE INDEX `TaskDeadlineIndex` ON `Task` (`deadline_ts`)
+	WHERE done IS NULL;
+	""",
+	"""
+	CREATE INDEX `NotStartedIndex` ON `Task` (`start_ts`)
+	WHERE started = 0 AND done IS NULL;
+	""",
+	# Indexes shaped for the hot queries, which only deal with undone tasks:
+	# DoneIndex is restricted to done tasks so that the planner picks the
+	# partial indexes on undone tasks instead of it.
+	"""
+	DROP INDEX `DoneIndex`;
+	""",
+	"""
+	CREATE INDEX `DoneIndex` ON `Task` (`done`)
+	WHERE done IS NOT NULL;
+	""",
+	"""
+	DROP INDEX `DateCreatedIndex`;
+	""",
 	"""
+	CREATE INDEX `TodoIndex` ON `Task` (`context`, `start_ts`)
+	WHERE done IS NULL AND open_dependencies = 0;
+	""",
 ]
 
 
+# Index of the first statement of INIT_DB of each version, for databases
+# created before their schema version was recorded in the database
 VERSIONS_INDEX = [
 	('3.0', 0),
 	('3.1', 4),
 	('3.2', 6),
 	('4.0.0', 8),
 	('5.0.0', 12),
+	('5.1.0', 16),
 ]
 
+# The version of the schema of a database, stored in its user_version, is the
+# number of statements of INIT_DB applied to it. It's stored negated if the
+# statements of FULL_TEXT_SCHEMA among them were skipped for lack of FTS5.
+SCHEMA_VERSION = len(INIT_DB)
 
-def update_database(path, current_version):
+# First version recording the schema version: the unversioned databases of
+# this version come from its development versions, which lacked its
+# statements
+VERSIONED_SINCE = '5.1.0'
+
+# Oldest SQLite library the schema can be created with (generated columns)
+MIN_SQLITE_VERSION = (3, 31, 0)
+
+
+class UnsupportedSQLiteError(Exception):
+	pass
+
+
+def get_schema_version(connection):
+	return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+def is_up_to_date(connection):
+	""" Return whether the database of `connection` has the schema of
+	INIT_DB, but for the full-text index while the SQLite library lacks FTS5.
+	"""
+	schema_version = get_schema_version(connection)
+	if schema_version == -SCHEMA_VERSION:
+		return not has_fts5(connection)
+	return schema_version == SCHEMA_VERSION
+
+
+def get_first_update(current_version):
+	""" Return the index of the first statement of INIT_DB not applied to the
+	database of the todo version `current_version` (None if there is no
+	database), for databases created before the schema version was recorded.
+	"""
 	if current_version is None:
 		current_version = '0'
-	for i, (version, idx) in enumerate(VERSIONS_INDEX):
+	if utils.compare_versions(current_version, VERSIONED_SINCE) >= 0:
+		return dict(VERSIONS_INDEX)[VERSIONED_SINCE]
+	for version, idx in VERSIONS_INDEX:
 		if utils.compare_versions(current_version, version) < 0:
-			index = idx
-			break
-	else:
-		index = len(INIT_DB)
+			return idx
+
+
+def update_database(connection, first_update):
+	""" Apply the statements of INIT_DB from the `first_update` index on to the
+	database of `connection`, and record its schema version. No transaction is
+	committed, so that the caller can make the update atomic. Raise
+	UnsupportedSQLiteError if the SQLite library is older than
+	MIN_SQLITE_VERSION, before anything is applied.
+
+	The statements of FULL_TEXT_SCHEMA are skipped if the library lacks FTS5,
+	and the schema version is then recorded negated. `first_update` may be
+	such a version, in which case the skipped statements are applied first if
+	the library now has FTS5 (the full-text index being rebuilt from the
+	tasks)."""
+	if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+		raise UnsupportedSQLiteError(
+			"todo requires SQLite {} or later, but Python uses SQLite {}."
+			.format(
+				'.'.join(str(part) for part in MIN_SQLITE_VERSION),
+				sqlite3.sqlite_version,
+			)
+		)
+	full_text = has_fts5(connection)
+	statements = INIT_DB[abs(first_update):]
+	skipped = first_update < 0
+	if skipped and full_text:
+		statements = [
+			stmt for stmt in INIT_DB[:-first_update] if stmt in FULL_TEXT_SCHEMA
+		] + statements
+	for stmt in statements:
+		if full_text or stmt not in FULL_TEXT_SCHEMA:
+			connection.execute(stmt)
+		else:
+			skipped = True
+	schema_version = SCHEMA_VERSION
+	if skipped and not full_text:
+		schema_version = -SCHEMA_VERSION
+	connection.execute('PRAGMA user_version = {}'.format(schema_version))
+
 
-	updates = INIT_DB[index:]
-	if len(updates) > 0:
-		conn = sqlite3.connect(path, isolation_level=None)
-		for stmt in updates:
-			conn.execute(stmt)
-		conn.commit()
-		conn.close()
+def has_fts5(connection):
+	""" Return whether the SQLite library of `connection` has FTS5, by
+	creating a temporary FTS5 table."""
+	try:
+		connection.execute("CREATE VIRTUAL TABLE temp.Fts5Probe USING fts5(x)")
+	except sqlite3.OperationalError:
+		return False
+	connection.execute("DROP TABLE temp.Fts5Probe")
+	return True
 
 
 def main():
 	conn = sqlite3.connect('data.sqlite')
-	for stmt in INIT_DB:
-		conn.execute(stmt)
+	update_database(conn, 0)
+	conn.commit()
 
 
 if __name__ == '__main__':
@@ -1,22 +1,21 @@
 #! /usr/bin/env python3
 
-import os, sys, sqlite3, functools, configparser, textwrap
+import os, sys, functools, configparser, time
 import os.path as op
-from datetime import date, datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import List
 
-from . import cli_parser, utils, data_access, core
-from .bash_completion import installation as bash_completion_installation
-from .data_access import DataAccess
-from .rainbow import ColoredStr, cstr
+# The data access layer (and with it sqlite3), the core and the colors are
+# imported by the commands needing them, so that the ones not dealing with
+# tasks (e.g. --version) start faster
+from . import cli_parser, utils
 from .types import DoTasksReport, DoTaskReportType
 from .utils import (
-	DATA_DIR, DB_PATH, VERSION_PATH, DATAFILE_PATH, NOW, ISO_SHORT,
-	CannotOpenEditorError
+	DATA_DIR, DATETIME_MIN, ISO_SHORT, CannotOpenEditorError
 )
 
 
-__version__ = '5.0.0'
+__version__ = '5.1.0'
 
 
 ISO_DATE_LENGTH = 10
@@ -38,7 +37,7 @@ TASK_MUTATORS = {
 	'period': None,
 	'priority': 1,
 	'title': None,
-	'created': data_access.DATETIME_MIN,
+	'created': DATETIME_MIN,
 	'front': None,
 }
 
@@ -80,6 +79,11 @@ DEFAULT_CONFIG['Word-wrapping'] = {
 	'smart': False,
 	'width': -1
 }
+DEFAULT_CONFIG['Storage'] = {
+	'journal_mode': 'delete',
+	'busy_timeout': 5000,
+	'busy_retries': 3,
+}
 
 CONFIG = configparser.ConfigParser(
 	allow_no_value=True,
@@ -96,73 +100,155 @@ EDITOR = CONFIG.get('App', 'editor', fallback=None)
 if EDITOR is None:
 	EDITOR = os.environ.get('EDITOR', 'vim')
 
-if CONFIG.getboolean('Colors', 'colors'):
-	cstr = functools.partial(
-		cstr,
-		palette=CONFIG.get('Colors', 'palette')
-	)
-else:
-	cstr = functools.partial(
-		cstr,
-		no_color=True
-	)
+COLORED = CONFIG.getboolean('Colors', 'colors')
+PALETTE = CONFIG.get('Colors', 'palette')
 
 
 DONE_STR = '[DONE]'
 
+HIGHLIGHT_START = '\33[1;31m'
+HIGHLIGHT_END = '\33[0m'
+
+# Seconds to wait before dispatching a command again after the database was
+# locked for longer than the busy timeout, doubled at each retry
+RETRY_DELAY = 0.1
+
+# Commands that the daemon leaves to the client, as they read files, report
+# progress while running or stream an output of any size
+IN_PROCESS_COMMANDS = ('import', 'export')
+
 
 def main():
 	argv = sys.argv[1:]
 	if len(argv) == 1 and argv[0] == 'doduh':
 		print('Beethoven - Symphony No. 5')
 		sys.exit(0)
-	args = cli_parser.parse_cli()
+	args = cli_parser.parse_cli(argv)
 
 	if args.get('version'):
 		print(__version__)
 	elif args.get('location'):
 		print(DATA_DIR)
 	elif args.get('install_autocompletion'):
-		bash_completion_installation.install_autocompletion()
+		from .bash_completion import installation
+		installation.install_autocompletion()
+	elif args.get('daemon'):
+		from . import daemon
+		sys.exit(daemon.serve(open_data_access(), serve_request))
 	else:
-		report = cli_parser.parse_args(args)
-		if len(report) > 0:
-			for error in report:
-				print(error)
-			sys.exit(1)
-
-		current_version = get_installed_version()
-		if not op.exists(DATA_DIR):
-			os.mkdir(DATA_DIR)
-		if current_version != __version__:
-			with open(VERSION_PATH, 'w') as version_file:
-				version_file.write(__version__)
-
-		daccess = get_data_access(current_version)
-		result = dispatch(args, daccess)
-		if result is not None:
-			feedback_code, *data = result
-			globals()['feedback_'+feedback_code](*data)
+		check_args(args)
+		daccess = open_data_access()
+		run(args, daccess)
 		daccess.exit()
 
 
-def get_installed_version():
-	if op.exists(VERSION_PATH):
-		with open(VERSION_PATH) as version_file:
-			return version_file.read()
-	else:
-		if op.exists(DB_PATH):
-			return '3.0.1'
-		elif op.exists(DATAFILE_PATH):
-			return '2.1'
+def check_args(args):
+	report = cli_parser.parse_args(args)
+	if len(report) > 0:
+		for error in report:
+			print(error)
+		sys.exit(1)
+
+
+def run(args, daccess):
+	result = dispatch_and_commit(args, daccess)
+	if result is not None:
+		feedback_code, *data = result
+		globals()['feedback_'+feedback_code](*data)
+
+
+def serve_request(argv, daccess):
+	""" Run the command line `argv` in the daemon, with the data access object
+	it keeps open. Return False if the command must rather be run by the
+	client itself: commands not dealing with tasks (whose output doesn't
+	depend on the database but may depend on the client's terminal),
+	interactive commands and IN_PROCESS_COMMANDS."""
+	if argv == ['doduh'] or '-h' in argv or '--help' in argv:
+		return False
+	args = cli_parser.parse_cli(argv)
+	root_options = ['version', 'location', 'install_autocompletion', 'daemon']
+	if any(args.get(opt) for opt in root_options) or is_interactive(args):
+		return False
+	if args.get('command') in IN_PROCESS_COMMANDS:
+		return False
+	check_args(args)
+	run(args, daccess)
+	daccess.save()
+	return True
+
+
+def open_data_access():
+	from .data_access import DataAccess, open_database
+	from .init_db import UnsupportedSQLiteError
+	progress = get_progress_printer('migrated')
+	try:
+		connection = open_database(
+			timeout=CONFIG.getint('Storage', 'busy_timeout') / 1000,
+			progress=progress,
+		)
+	except UnsupportedSQLiteError as error:
+		print(error)
+		sys.exit(1)
+	finally:
+		progress.done()
+	return DataAccess(
+		connection,
+		journal_mode=CONFIG.get('Storage', 'journal_mode')
+	)
+
+
+def get_progress_printer(action):
+	""" Return a function printing the number of tasks `action` so far (e.g.
+	'imported') over the previous count, if the standard error is a terminal.
+	Its `done` attribute clears the line once the operation is over."""
+	show_progress = sys.stderr.isatty()
+	printed = False
+
+	def progress(count):
+		nonlocal printed
+		if show_progress:
+			print('\r{} tasks {}'.format(count, action), end='', file=sys.stderr)
+			printed = True
+
+	def done():
+		if printed:
+			print('\r\033[K', end='', file=sys.stderr)
+
+	progress.done = done
+	return progress
+
+
+def dispatch_and_commit(args, daccess):
+	""" Dispatch the command and commit its changes. If the database stays
+	locked by other processes for longer than the busy timeout, the changes
+	are rolled back and the command is dispatched again, up to the configured
+	number of retries. Commands opening an editor aren't retried, as the user
+	would have to edit the task again."""
+	from sqlite3 import OperationalError
+	from .data_access import is_busy_error
+	retries = CONFIG.getint('Storage', 'busy_retries')
+	if is_interactive(args):
+		retries = 0
+	for attempt in range(retries + 1):
+		try:
+			result = dispatch(args, daccess)
+			daccess.connection.commit()
+		except OperationalError as error:
+			if attempt == retries or not is_busy_error(error):
+				raise
+			daccess.rollback()
+			time.sleep(RETRY_DELAY * 2**attempt)
 		else:
-			return None
+			return result
 
 
-def get_data_access(current_version):
-	data_access.setup_data_access(current_version)
-	connection = sqlite3.connect(DB_PATH)
-	return DataAccess(connection)
+def is_interactive(args):
+	""" Return whether the command requires the user to interact with an
+	editor or to answer a confirmation prompt."""
+	command = args.get('command')
+	if command == 'edit' or args.get('edit'):
+		return True
+	return command in ('rmctx', 'purge') and not args['force']
 
 
 # HANDLERS
@@ -180,17 +266,16 @@ def add_task(args, daccess):
 		context = ''
 
 	if args['edit']:
+		from . import core
 		title, content = core.editor_edit_task(args['title'], None, EDITOR)
 	else:
 		title, content = args['title'], None
 
 	task_id = daccess.add_task(title, content, context, options)
 	if args['depends_on']:
-		unexisting_deps = daccess.set_task_dependencies(
-			task_id, args['depends_on']
-		)
-		if unexisting_deps:
-			return 'dependencies_not_found', unexisting_deps
+		feedback = set_dependencies(task_id, args['depends_on'], daccess)
+		if feedback is not None:
+			return feedback
 
 	return 'add_task', task_id
 
@@ -210,12 +295,30 @@ def manage_task(args, daccess):
 		daccess.update_task(tid, context, options)
 
 	if args['depends_on'] is not None:
-		unexisting_deps = daccess.set_task_dependencies(tid, args['depends_on'])
-		if unexisting_deps:
-			return 'dependencies_not_found', unexisting_deps
+		return set_dependencies(tid, args['depends_on'], daccess)
+
+
+def set_dependencies(tid, dependencies, daccess):
+	""" Set the dependencies of the task `tid`, unless this would make tasks
+	depend on themselves."""
+	cycle = daccess.find_dependency_cycle(tid, dependencies)
+	if cycle is not None:
+		return 'dependency_cycle', cycle
+	unexisting_deps = daccess.set_task_dependencies(tid, dependencies)
+	if unexisting_deps:
+		return 'dependencies_not_found', unexisting_deps
+
+
+def show_dependencies(args, daccess):
+	tid = args['id'][0]
+	if not daccess.task_exists(tid):
+		return 'task_not_found', tid
+	tasks = daccess.get_dependency_chain(tid, args['down'], args['depth'])
+	return 'dependency_chain', tasks, args['down']
 
 
 def show_task(tid, daccess):
+	from . import core
 	task = daccess.get_task(tid)
 	if task is None:
 		return 'task_not_found', tid
@@ -239,6 +342,7 @@ def show_task(tid, daccess):
 
 
 def edit_task(args, daccess):
+	from . import core
 	tid = args['id'][0]
 	task = daccess.get_task(tid)
 	if task is None:
@@ -263,39 +367,54 @@ def edit_task(args, daccess):
 		daccess.release_editing_lock(tid)
 
 
-def do_tasks(args: dict, daccess: DataAccess) -> List[DoTasksReport]:
+def do_tasks(args: dict, daccess: 'DataAccess') -> List[DoTasksReport]:
+	from . import core
 	reports = []
+	# (index in reports, task) of recurring tasks, which are processed in a
+	# single batch.
+	recurring = []
+	tasks = {task['id']: task for task in daccess.get_tasks(args['id'])}
+	done_ids = set()
 
 	for task_id in args['id']:
-		task = daccess.get_task(task_id)
+		task = tasks.get(task_id)
 
 		report = {
+			'task_id': utils.to_hex(task_id),
 			'task': task,
 			'next_occurrence_datetime': None,
 		}
 
 		if task is None:
 			report['report_type'] = DoTaskReportType.NOT_FOUND
-		elif task['done']:
+		elif task['done'] or task_id in done_ids:
 			report['report_type'] = DoTaskReportType.ALREADY_DONE
 		elif task['period'] is not None:
-			report = core.do_recurring_task(task, daccess)
+			recurring.append((len(reports), task))
 		else:
-			daccess.set_done(task_id)
+			done_ids.add(task_id)
 			report['report_type'] = DoTaskReportType.OK
 
 		reports.append(report)
 
+	daccess.set_done_many(done_ids)
+
+	recurring_reports = core.do_recurring_tasks(
+		[task for _, task in recurring], daccess
+	)
+	for (index, _), report in zip(recurring, recurring_reports):
+		reports[index] = report
+
 	return 'multiple_tasks_done', reports
 
 
 def undo_task(args, daccess):
-	not_found = daccess.do_many('set_undone', args['id'])
+	not_found = daccess.set_undone_many(args['id'])
 	return 'multiple_tasks_undone', not_found
 
 
 def remove_task(args, daccess):
-	not_found = daccess.do_many('remove', args['id'])
+	not_found = daccess.remove_many(args['id'])
 	return 'multiple_tasks_update', not_found
 
 
@@ -308,7 +427,8 @@ def manage_context(args, daccess):
 		return todo(args, daccess)
 	else:
 		if name is not None:
-			renamed = data_access.rename_context(args['context'], name)
+			from .data_access import rename_context
+			renamed = rename_context(args['context'], name)
 			rcount = daccess.rename_context(args['context'], name)
 			if rcount is None:
 				return 'target_name_exists', renamed
@@ -363,9 +483,6 @@ def todo(args, daccess):
 
 	tasks = daccess.todo(ctx, recursive=(fashion == 'flat'))
 
-	# Filter out recurring task whose next undone occcurrence is in the future
-	tasks = [t for t in tasks if not core.current_period_is_done(t)]
-
 	if fashion == 'tidy':
 		get_empty = CONFIG.getboolean('App', 'show_empty_contexts')
 		subcontexts = daccess.get_subcontexts(ctx, get_empty)
@@ -409,6 +526,43 @@ def purge(args, daccess):
 		return 'purge', count
 
 
+def import_tasks(args, daccess):
+	from . import transfer
+	filename = args['file']
+	file_format = args['format'] or transfer.get_format(filename)
+	if file_format is None:
+		return 'unknown_import_format', filename
+	start = time.perf_counter()
+	progress = get_progress_printer('imported')
+	try:
+		with open(filename, newline='', encoding='utf-8') as file:
+			records = transfer.READERS[file_format](file)
+			report = daccess.import_tasks(records, progress)
+	except OSError as error:
+		return 'cannot_read_file', filename, error.strerror
+	except ValueError as error:
+		daccess.rollback()
+		return 'invalid_import', filename, str(error)
+	finally:
+		progress.done()
+	return 'import', report, time.perf_counter() - start
+
+
+def export_tasks(args, daccess):
+	ctx = args['context'] or ''
+	if not daccess.context_exists(ctx):
+		return 'not_exists', ctx
+	done = None
+	if args['done']:
+		done = True
+	elif args['undone']:
+		done = False
+	# Records are read as the feedback writes them, once the command is
+	# committed, so that the export doesn't hold the write lock
+	records = daccess.export_tasks(ctx, done)
+	return 'export', records, args['format']
+
+
 def search(args, daccess):
 	term = args['term']
 	done = None
@@ -420,6 +574,37 @@ def search(args, daccess):
 		ctx = ''
 	else:
 		ctx = args['context']
+	if args['save'] is not None:
+		if args['full_text']:
+			return 'cannot_save_full_text',
+		count = daccess.save_search(
+			args['save'],
+			term,
+			ctx=ctx,
+			done=done,
+			before=args.get('before'),
+			after=args.get('after'),
+			case=args['case']
+		)
+		if count is None:
+			return 'not_exists', ctx
+	from .data_access import get_full_text_query
+	if args['full_text'] and get_full_text_query(term):
+		if not daccess.has_full_text_index():
+			return 'full_text_unavailable',
+		if CONFIG.getboolean('Colors', 'colors'):
+			markers = (HIGHLIGHT_START, HIGHLIGHT_END)
+		else:
+			markers = ('', '')
+		tasks = daccess.full_text_search(
+			term,
+			ctx=ctx,
+			done=done,
+			before=args.get('before'),
+			after=args.get('after'),
+			markers=markers,
+		)
+		return 'full_text_search', tasks
 	tasks = daccess.search(
 		term,
 		ctx=ctx,
@@ -431,23 +616,28 @@ def search(args, daccess):
 	return 'todo', '', tasks, [], (term, args['case'])
 
 
-def list_future_tasks(args, daccess):
-	tasks = daccess.get_future_tasks()
+def view_search(args, daccess):
+	name = args['name']
+	if name is None:
+		return 'saved_searches', daccess.get_saved_searches()
+	if args['delete']:
+		if daccess.remove_saved_search(name) == 0:
+			return 'saved_search_not_found', name
+		return
+	search = daccess.get_saved_search(name)
+	if search is None:
+		return 'saved_search_not_found', name
+	tasks = daccess.get_saved_search_tasks(name)
+	return 'todo', '', tasks, [], (search['term'], search['case_sensitive'])
 
-	# Filter out recurring tasks whose current period is not done
-	tasks = [
-		t for t in tasks
-		if (
-			t['period'] is None
-			or core.current_period_is_done(t)
-		)
-	]
 
+def list_future_tasks(args, daccess):
+	tasks = daccess.get_future_tasks()
 	return 'todo', '', tasks, [], None
 
 
 def ping_task(args, daccess):
-	not_found = daccess.do_many('ping', args['id'])
+	not_found = daccess.ping_many(args['id'])
 	return 'multiple_tasks_update', not_found
 
 
@@ -469,8 +659,12 @@ DISPATCHER = {
 	'history': get_history,
 	'purge': purge,
 	'search': search,
+	'view': view_search,
 	'future': list_future_tasks,
 	'ping': ping_task,
+	'deps': show_dependencies,
+	'import': import_tasks,
+	'export': export_tasks,
 }
 
 
@@ -522,6 +716,28 @@ def feedback_dependencies_not_found(unexisting_dependencies):
 		)
 
 
+def feedback_dependency_cycle(cycle):
+	print(
+		"Dependencies not set because of a cycle: " +
+		' -> '.join([utils.to_hex(tid) for tid in cycle])
+	)
+
+
+def feedback_dependency_chain(tasks, downstream):
+	if len(tasks) == 0:
+		print('No dependent task.' if downstream else 'No dependency.')
+		return
+	gid_len = len(utils.to_hex(max(task['id'] for task in tasks)))
+	struct = [
+		('depth', 5, '>', 'depth', None),
+		('id', gid_len + 1, '>', 'id', utils.to_hex),
+		('title', lambda a: 3 * (a//4), '<', 'title', None),
+		('context', lambda a: a//4 + a%4, '<', 'ctx_path', lambda a: a[1:]),
+		('status', 7, '<', 'done', lambda a: 'DONE' if a is not None else ''),
+	]
+	utils.print_table(struct, tasks)
+
+
 def feedback_task_not_found(tid):
 	print('Task {} not found'.format(utils.to_hex(tid)))
 
@@ -543,7 +759,7 @@ def feedback_multiple_tasks_update(not_found):
 
 def feedback_multiple_tasks_done(reports: List[DoTasksReport]):
 	for report in reports:
-		task_id = report['task']['user_task_id']
+		task_id = report['task_id']
 
 		if report['report_type'] == DoTaskReportType.NOT_FOUND:
 			print(f"Task not found: {task_id}")
@@ -599,6 +815,68 @@ def feedback_todo(context, tasks, subcontexts, highlight=None):
 		safe_print(partial)
 
 
+def feedback_full_text_search(tasks):
+	import textwrap
+	if len(tasks) != 0:
+		id_width = max(len(utils.to_hex(task['id'])) for task in tasks)
+	else:
+		id_width = 1
+
+	wrap_width = CONFIG.getint('Word-wrapping', 'width')
+	if wrap_width == -1:
+		wrap_width = utils.get_terminal_width()
+	indent = ' '*(id_width + 4)
+
+	for task in tasks:
+		task_string_builder = functools.partial(
+			get_basic_task_string,
+			'',
+			id_width,
+			task,
+		)
+		safe_print(task_string_builder)
+		if task['excerpt'] is not None:
+			excerpt = ' '.join(task['excerpt'].split())
+			if CONFIG.getboolean('Word-wrapping', 'content'):
+				excerpt = textwrap.fill(
+					excerpt,
+					width=wrap_width,
+					initial_indent=indent,
+					subsequent_indent=indent,
+				)
+			else:
+				excerpt = indent + excerpt
+			print(excerpt)
+
+
+def feedback_cannot_save_full_text():
+	print("Full-text searches cannot be saved")
+
+
+def feedback_full_text_unavailable():
+	print(
+		"Full-text search is unavailable: the SQLite library used by Python "
+		"lacks the FTS5 extension"
+	)
+
+
+def feedback_saved_search_not_found(name):
+	print("Saved search not found: {}".format(name))
+
+
+def feedback_saved_searches(searches):
+	if len(searches) == 0:
+		print('No saved search.')
+		return
+	struct = [
+		('name', lambda a: a//3, '<', 'name', None),
+		('term', lambda a: a//3, '<', 'term', None),
+		('context', lambda a: a//3 + a%3, '<', 'ctx_path', lambda a: a[1:]),
+		('tasks', 5, '>', 'tasks', None),
+	]
+	utils.print_table(struct, searches)
+
+
 def feedback_target_name_exists(renamed):
 	print('Context already exists: {}'.format(
 		utils.get_relative_path('', renamed)
@@ -633,6 +911,40 @@ def feedback_history(tasks, gid):
 		utils.print_table(struct, tasks, is_task_default)
 
 
+def feedback_import(report, duration):
+	count = report['count']
+	print('{} task{} imported in {:.1f} seconds ({:.0f} tasks per second)'.format(
+		count, 's' if count != 1 else '', duration, count / max(duration, 1e-6)
+	))
+	if report['unexisting_dependencies']:
+		print(
+			"Dependencies not set because not existing: " +
+			', '.join(str(tid) for tid in report['unexisting_dependencies'])
+		)
+	if report['cycle'] is not None:
+		print(
+			"Dependencies not set because of a cycle: " +
+			' -> '.join(str(tid) for tid in report['cycle'])
+		)
+
+
+def feedback_export(records, file_format):
+	from . import transfer
+	transfer.WRITERS[file_format](records, sys.stdout)
+
+
+def feedback_unknown_import_format(filename):
+	print('Unknown format for {}, use --format'.format(filename))
+
+
+def feedback_cannot_read_file(filename, reason):
+	print('Cannot read {}: {}'.format(filename, reason))
+
+
+def feedback_invalid_import(filename, reason):
+	print('Nothing imported, invalid {}: {}'.format(filename, reason))
+
+
 def feedback_purge(count):
 	s = 's' if count > 1 else ''
 	print('{} task{} deleted'.format(count, s))
@@ -640,11 +952,11 @@ def feedback_purge(count):
 
 def feedback_show_task(task, full_content):
 	print(cstr("     ID:", '6'), utils.to_hex(task['id']))
-	print(cstr("Created:", '6'), utils.sqlite_date_to_local(task['created']))
+	print(cstr("Created:", '6'), utils.timestamp_to_local(task['created_ts']))
 	if task['start'] == task['created']:
 		print(cstr("  Start:", '6'), "@created")
 	else:
-		print(cstr("  Start:", '6'), utils.sqlite_date_to_local(task['start']))
+		print(cstr("  Start:", '6'), utils.timestamp_to_local(task['start_ts']))
 	print(
 		cstr(" Status:", '6'),
 		"DONE" if task['done'] is not None else "TODO"
@@ -678,14 +990,12 @@ def feedback_show_task(task, full_content):
 # version in case of error from the terminal.
 
 def get_basic_task_string(context, id_width, task, highlight=None, ascii_=False):
+	import textwrap
 	c = get_task_string_components(
 		dict(task), context, ascii_, highlight=highlight
 	)
 
-	if isinstance(c['id'], ColoredStr):
-		ansi_offset = c['id'].lenesc
-	else:
-		ansi_offset = 0
+	ansi_offset = getattr(c['id'], 'lenesc', 0)
 	result = ' {id:>{width}} | '.format(id=c['id'], width=id_width + ansi_offset)
 	left_width = id_width + 4
 	init_indent = left_width
@@ -768,9 +1078,9 @@ def get_task_string_components(task, ctx, ascii_=False, highlight=None):
 		content_str = cstr(task['title'], clr('content'))
 
 	remaining_str = ''
-	deadline = get_datetime(task['deadline'])
+	deadline = get_datetime(task['deadline_ts'])
 	if deadline is not None:
-		remaining = deadline - NOW
+		remaining = deadline - utils.NOW
 		user_friendly = utils.parse_remaining(remaining)
 		remaining_str = '{} {} remaining'.format(
 			TIME_ICON[ascii_],
@@ -796,7 +1106,7 @@ def get_task_string_components(task, ctx, ascii_=False, highlight=None):
 		done_str = cstr(DONE_STR, clr('done'))
 
 	start_str = ''
-	start_date = utils.sqlite_date_to_local(task['start'])[:ISO_DATE_LENGTH]
+	start_date = utils.timestamp_to_local(task['start_ts'])[:ISO_DATE_LENGTH]
 	if start_date > date.today().isoformat():
 		start_str = cstr('[starts: {}]'.format(start_date), clr('start'))
 
@@ -837,10 +1147,7 @@ def format_dependencies(dependencies: str):
 
 def get_context_string(context, id_width, ctx, ascii_=False):
 	hash_str = cstr('#', clr('id'))
-	if isinstance(hash_str, ColoredStr):
-		ansi_offset = hash_str.lenesc
-	else:
-		ansi_offset = 0
+	ansi_offset = getattr(hash_str, 'lenesc', 0)
 	path = utils.get_relative_path(context, ctx['path'])
 	string = '{hash:>{width}} | {path} ({nbr})'.format(
 		hash=hash_str,
@@ -866,16 +1173,18 @@ def safe_print(partial):
 			print(result)
 
 
-def get_datetime(db_dt):
-	""" Get a datetime object from the string retrieved from the database."""
-	if db_dt is None:
+def get_datetime(timestamp):
+	""" Get a datetime object from a timestamp retrieved from the database."""
+	if timestamp is None:
 		return None
-	return datetime\
-		.strptime(db_dt, utils.SQLITE_DT_FORMAT)\
-		.replace(tzinfo=timezone.utc)
+	return utils.EPOCH + timedelta(seconds=timestamp)
 
 
 def is_task_default(task, prop):
+	# Datetimes are printed from their timestamps, but their defaults are the
+	# ones of the TEXT columns (e.g. the creation date of migrated tasks)
+	if prop.endswith('_ts'):
+		prop = prop[:-len('_ts')]
 	if prop == 'start':
 		return task['start'] == task['created']
 	return is_default(task, prop, TASK_MUTATORS)
@@ -898,12 +1207,12 @@ def get_history_struct(gid):
 	struct = [
 		('id', gid_len + 1, '>', 'id', utils.to_hex),
 		('title', lambda a: 3 * (a//4), '<', 'title', None),
-		('created', 19, '<', 'created', utils.sqlite_date_to_local),
+		('created', 19, '<', 'created_ts', utils.timestamp_to_local),
 	]
 	if utils.get_terminal_width() > WIDE_HIST_THRESHOLD:
 		struct += [
-			('start', 19, '<', 'start', utils.sqlite_date_to_local),
-			('deadline', 19, '<', 'deadline', utils.sqlite_date_to_local),
+			('start', 19, '<', 'start_ts', utils.timestamp_to_local),
+			('deadline', 19, '<', 'deadline_ts', utils.timestamp_to_local),
 			('priority', 8, '>', 'priority', None)
 		]
 	struct += [
@@ -915,3 +1224,12 @@ def get_history_struct(gid):
 
 def clr(component):
 	return CONFIG.get('Colors', component)
+
+
+def cstr(string, color):
+	""" Return `string` in `color` with the configured palette, or as is if
+	colors are off."""
+	if not COLORED:
+		return string
+	from .rainbow import ColoredStr
+	return ColoredStr(string, color, PALETTE)
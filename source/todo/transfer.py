@@ -0,0 +1,290 @@
+""" Readers of the file formats of `todo import` and writers of the file
+formats of `todo export`. Each reader takes a text file and lazily yields the
+tasks of the file as records: dictionaries with the keys described by
+`data_access.get_task_values`, as well as `id` and `depends_on` (see
+`DataAccess.import_tasks`). Each writer takes an iterable of records and a
+text file, and writes the records one at a time, so that exports of any size
+are written in constant memory. """
+
+import csv, json, re
+import os.path as op
+
+
+FORMATS_BY_EXTENSION = {
+	'.jsonl': 'jsonl',
+	'.ndjson': 'jsonl',
+	'.json': 'json',
+	'.csv': 'csv',
+	'.txt': 'todotxt',
+}
+
+# Number of characters read at once by `iter_json_members`
+CHUNK_SIZE = 1 << 16
+
+TRUE_VALUES = {'x', 'true', 'yes', '1'}
+FALSE_VALUES = {'false', 'no', '0'}
+
+# Columns of exported CSV files, in the order of `DataAccess.export_tasks`
+CSV_FIELDS = [
+	'id', 'title', 'content', 'context', 'created', 'start', 'deadline',
+	'done', 'priority', 'period', 'front', 'depends_on', 'done_history',
+]
+
+TODOTXT_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}$')
+TODOTXT_PRIORITY_RE = re.compile(r'\(([A-Z])\)$')
+
+
+def get_format(filename):
+	""" Return the format of the file named `filename` according to its
+	extension, or None if the extension is unknown."""
+	_, extension = op.splitext(filename)
+	return FORMATS_BY_EXTENSION.get(extension.lower())
+
+
+def read_jsonl(file):
+	""" Tasks are JSON objects, one per line."""
+	for number, line in enumerate(file, 1):
+		if line.strip() == '':
+			continue
+		try:
+			record = json.loads(line)
+		except ValueError as error:
+			raise ValueError('Line {}: {}'.format(number, error))
+		if not isinstance(record, dict):
+			raise ValueError('Line {}: not a JSON object'.format(number))
+		yield record
+
+
+def iter_json_members(file, arrays=(), chunk_size=CHUNK_SIZE):
+	""" Lazily yield the (key, value) members of the JSON object of `file`,
+	reading the file by chunks of `chunk_size` characters. The values of the
+	keys of `arrays` must be arrays, whose elements are yielded one at a time
+	as (key, element) pairs, so that the memory used doesn't depend on the
+	length of these arrays.
+
+	Raise ValueError if the file isn't a JSON object."""
+	scanner = _JsonScanner(file, chunk_size)
+	scanner.expect('{')
+	if scanner.peek() == '}':
+		return
+	while True:
+		key = scanner.decode()
+		if not isinstance(key, str):
+			raise ValueError('Expecting a key')
+		scanner.expect(':')
+		if key in arrays:
+			for element in scanner.iter_array():
+				yield key, element
+		else:
+			yield key, scanner.decode()
+		if scanner.expect(',', '}') == '}':
+			return
+
+
+def iter_json_elements(file, chunk_size=CHUNK_SIZE):
+	""" Lazily yield the elements of the JSON array of `file` one at a time,
+	reading the file by chunks of `chunk_size` characters.
+
+	Raise ValueError if the file isn't a JSON array."""
+	scanner = _JsonScanner(file, chunk_size)
+	if scanner.peek() != '[':
+		raise ValueError('not a JSON array')
+	yield from scanner.iter_array()
+	if scanner.peek() != '':
+		raise ValueError('Extra data after the array')
+
+
+class _JsonScanner:
+	""" The text of a file, decoded value by value by `json`, keeping in
+	memory the text that is left to decode from the chunks read so far."""
+
+	def __init__(self, file, chunk_size):
+		self.file = file
+		self.chunk_size = chunk_size
+		self.text = ''
+		self.position = 0
+		self.eof = False
+		self.decoder = json.JSONDecoder()
+
+	def read(self):
+		""" Append the next chunk of the file to the text left to decode.
+		Return False at the end of the file."""
+		chunk = self.file.read(self.chunk_size)
+		self.text = self.text[self.position:] + chunk
+		self.position = 0
+		self.eof = chunk == ''
+		return not self.eof
+
+	def peek(self):
+		""" Skip whitespace and return the next character, or an empty string
+		at the end of the file."""
+		while True:
+			while self.position < len(self.text) \
+			and self.text[self.position] in ' \t\n\r':
+				self.position += 1
+			if self.position < len(self.text) or not self.read():
+				return self.text[self.position:self.position+1]
+
+	def expect(self, *characters):
+		""" Consume the next character, which must be one of `characters`,
+		and return it."""
+		character = self.peek()
+		if character == '' or character not in characters:
+			raise ValueError('Expecting {}'.format(
+				' or '.join('"{}"'.format(c) for c in characters)
+			))
+		self.position += 1
+		return character
+
+	def iter_array(self):
+		""" Consume the next JSON value, which must be an array, yielding
+		its elements one at a time."""
+		self.expect('[')
+		if self.peek() == ']':
+			self.expect(']')
+			return
+		while True:
+			yield self.decode()
+			if self.expect(',', ']') == ']':
+				return
+
+	def decode(self):
+		""" Consume and return the next JSON value."""
+		self.peek()
+		while True:
+			try:
+				value, end = self.decoder.raw_decode(self.text, self.position)
+			except json.JSONDecodeError as error:
+				if not self.read():
+					raise ValueError(str(error))
+				continue
+			# A value ending with the text read so far might go on (numbers)
+			if end < len(self.text) or not self.read():
+				self.position = end
+				return value
+
+
+def read_json(file):
+	""" Tasks are the JSON objects of a JSON array."""
+	for number, record in enumerate(iter_json_elements(file), 1):
+		if not isinstance(record, dict):
+			raise ValueError('Task {}: not a JSON object'.format(number))
+		yield record
+
+
+def read_csv(file):
+	""" Tasks are rows of a CSV file whose header names the keys of the
+	records. Empty cells are left out, `depends_on` and `done_history` are
+	space-separated lists and the booleans `done` and `front` are `x`,
+	`true`, `yes`, `1` or their negations (`done` may also be a datetime)."""
+	reader = csv.DictReader(file)
+	for row in reader:
+		record = {
+			key: value for key, value in row.items()
+			if key is not None and value not in (None, '')
+		}
+		for key in ['depends_on', 'done_history']:
+			if key in record:
+				record[key] = record[key].split()
+		for key in ['done', 'front']:
+			value = record.get(key, '').lower()
+			if value in TRUE_VALUES:
+				record[key] = True
+			elif value in FALSE_VALUES:
+				del record[key]
+		for key in ['priority', 'period']:
+			if key in record:
+				try:
+					record[key] = int(record[key])
+				except ValueError:
+					raise ValueError('Line {}: {} must be an integer'.format(
+						reader.line_num, key
+					))
+		yield record
+
+
+def read_todotxt(file):
+	""" Tasks are lines in the todo.txt format: an optional `x` marking the
+	task as done followed by its completion date, an optional priority from
+	`(A)` to `(Z)`, an optional creation date, and the title. The first
+	`+project` of the title is the context of the task, and `due:` and `t:`
+	give its deadline and start."""
+	for line in file:
+		words = line.split()
+		if not words:
+			continue
+		record = {}
+		if words[0] == 'x':
+			record['done'] = True
+			words = words[1:]
+			if words and TODOTXT_DATE_RE.match(words[0]):
+				record['done'] = words[0]
+				words = words[1:]
+		if words:
+			match = TODOTXT_PRIORITY_RE.match(words[0])
+			if match is not None:
+				# (A) is the highest priority, (Z) is still above the default
+				record['priority'] = 27 - (ord(match.group(1)) - ord('A'))
+				words = words[1:]
+		if words and TODOTXT_DATE_RE.match(words[0]):
+			record['created'] = words[0]
+			words = words[1:]
+
+		title = []
+		for word in words:
+			if word.startswith('+') and len(word) > 1 \
+			and 'context' not in record:
+				record['context'] = word[1:]
+			elif word.startswith('due:') and len(word) > 4:
+				record['deadline'] = word[4:]
+			elif word.startswith('t:') and len(word) > 2:
+				record['start'] = word[2:]
+			else:
+				title.append(word)
+		record['title'] = ' '.join(title)
+		yield record
+
+
+READERS = {
+	'jsonl': read_jsonl,
+	'json': read_json,
+	'csv': read_csv,
+	'todotxt': read_todotxt,
+}
+
+
+def write_jsonl(records, file):
+	""" Tasks are JSON objects, one per line."""
+	for record in records:
+		file.write(json.dumps(record))
+		file.write('\n')
+
+
+def write_json(records, file):
+	""" Tasks are the JSON objects of a JSON array, one per line."""
+	separator = '[\n'
+	for record in records:
+		file.write(separator)
+		file.write(json.dumps(record))
+		separator = ',\n'
+	file.write('[]\n' if separator == '[\n' else '\n]\n')
+
+
+def write_csv(records, file):
+	""" Tasks are rows of a CSV file with the CSV_FIELDS columns, in the
+	format read by `read_csv`."""
+	writer = csv.DictWriter(file, CSV_FIELDS, lineterminator='\n')
+	writer.writeheader()
+	for record in records:
+		row = dict(record)
+		row['front'] = 'true' if record['front'] else ''
+		row['depends_on'] = ' '.join(record['depends_on'])
+		row['done_history'] = ' '.join(record['done_history'])
+		writer.writerow(row)
+
+
+WRITERS = {
+	'jsonl': write_jsonl,
+	'json': write_json,
+	'csv': write_csv,
+}
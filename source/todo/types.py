@@ -1,5 +1,6 @@
+from datetime import datetime
 from enum import Enum
-from typing import Optional, TypedDict
+from typing import NamedTuple, Optional, TypedDict
 
 
 class DoTaskReportType(Enum):
@@ -13,3 +14,8 @@ class DoTasksReport(TypedDict):
     task_id: str
     report_type: DoTaskReportType
     next_occurrence_datetime: Optional[str]
+
+
+class Occurrences(NamedTuple):
+    last: datetime
+    next: datetime
@@ -2,14 +2,13 @@ import re, os
 import os.path as op
 from datetime import datetime, timedelta, timezone
 
-from . import rainbow
-
 
 DATA_DIR_NAME = '.toduh'
 DATAFILE_NAME = 'data.json'
 DATABASE_NAME = 'data.sqlite'
 DATA_CTX_NAME = 'contexts'
 VER_FILE_NAME = 'version'
+SOCKET_NAME = 'daemon.sock'
 
 # If a .toduh exists in the current working directory, it's used by the
 # program. Otherwise the one in the home is used.
@@ -21,11 +20,16 @@ else:
 DB_PATH = op.join(DATA_DIR, DATABASE_NAME)
 VERSION_PATH = op.join(DATA_DIR, VER_FILE_NAME)
 DATAFILE_PATH = op.join(DATA_DIR, DATAFILE_NAME)
+SOCKET_PATH = op.join(DATA_DIR, SOCKET_NAME)
 
 ISO_SHORT = '%Y-%m-%d'
 SQLITE_DT_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATETIME_MIN = '0001-01-01 00:00:00'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
+# Both are reset by the daemon for each command it runs
 NOW = datetime.utcnow().replace(tzinfo=timezone.utc)
+TERMINAL_WIDTH = None
 
 
 def print_table(struct, iterable, is_default=lambda obj, p: False):
@@ -68,8 +72,9 @@ def print_table(struct, iterable, is_default=lambda obj, p: False):
 		separator = ' '.join([separator, '-'*w])
 	template, separator = template[1:], separator[1:] # Starting space
 
-	table = template.format(*(t[0] for t in struct))
-	table = '\n'.join([table, separator])
+	# Lines are printed as they come so that long tables don't pile up
+	print(template.format(*(t[0] for t in struct)))
+	print(separator)
 	for obj in iterable:
 		values = []
 		for h, _, _, a, f in struct:
@@ -87,9 +92,7 @@ def print_table(struct, iterable, is_default=lambda obj, p: False):
 			value = str(value).split('\n')[0]
 			value = limit_str(str(value), widths[h])
 			values.append(value)
-		line = template.format(*values)
-		table = '\n'.join([table, line])
-	print(table)
+		print(template.format(*values))
 
 
 def limit_str(string, length):
@@ -163,6 +166,8 @@ def to_hex(integer):
 
 
 def get_terminal_width():
+	if TERMINAL_WIDTH is not None:
+		return TERMINAL_WIDTH
 	try:
 		size = os.get_terminal_size()[0]
 	except OSError:
@@ -170,24 +175,34 @@ def get_terminal_width():
 	return size
 
 
-def sqlite_date_to_local(sqlite_date):
-	if sqlite_date is None:
+def sqlite_date_to_timestamp(sqlite_date):
+	""" Convert a datetime string in the database format (UTC) into an integer
+	Unix timestamp, the format of the `*_ts` columns of tasks."""
+	dt = datetime\
+		.strptime(sqlite_date, SQLITE_DT_FORMAT)\
+		.replace(tzinfo=timezone.utc)
+	return (dt - EPOCH) // timedelta(seconds=1)
+
+
+def timestamp_to_local(timestamp):
+	""" Convert a Unix timestamp from the database into a datetime string in
+	the local timezone. Dates too exotic to be converted are left in UTC."""
+	if timestamp is None:
 		return ''
 	try:
-		dt = datetime.strptime(sqlite_date, SQLITE_DT_FORMAT)
-	except ValueError:
+		dt = EPOCH + timedelta(seconds=timestamp)
+	except OverflowError:
 		return ''
-	dt = dt.replace(tzinfo=timezone.utc)
 	try:
 		local_dt = dt.astimezone(tz=None)
-	except ValueError:
-		# Some exotic dates such as '0001-01-01 00:00:00' don't work well
-		return sqlite_date
+	except (ValueError, OverflowError):
+		local_dt = dt
 	return local_dt.strftime(SQLITE_DT_FORMAT)
 
 
 def get_highlights_term(string, term, str_color, case=False):
 	if str_color is not None:
+		from . import rainbow
 		escape = rainbow.get_escape(*str_color)
 		if escape is None:
 			str_color = None